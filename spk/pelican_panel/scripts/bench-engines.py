@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Compare the loading-proxy serving engines (threaded vs asyncio).
+
+Starts a fake Panel upstream, runs loading-proxy.py with each engine in a
+child process (panel marked ready, no monitor thread) and drives it with
+concurrent keep-alive clients.
+
+Usage: ./scripts/bench-engines.py [--clients N] [--requests N] [--path /html]
+"""
+
+import argparse
+import http.client
+import http.server
+import importlib.util
+import os
+import socketserver
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+PROXY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "bin", "loading-proxy.py")
+UPSTREAM_PORT = 18090
+PROXY_PORT = 18080
+
+HTML_BODY = (b'<html><head><title>Pelican</title></head><body>'
+             + b'<a href="http://127.0.0.1:8090/admin">admin</a>' * 200
+             + b'</body></html>')
+
+
+class UpstreamHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith('/html'):
+            body, content_type = HTML_BODY, 'text/html; charset=utf-8'
+        else:
+            body, content_type = b'ok', 'text/plain'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class UpstreamServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve_proxy(engine):
+    """Child process: run loading-proxy.py with the Panel marked ready."""
+    spec = importlib.util.spec_from_file_location("loading_proxy", PROXY_PATH)
+    proxy = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(proxy)
+    proxy.PANEL_INTERNAL_PORT = UPSTREAM_PORT
+    proxy.state["panel_ready"] = True
+    proxy.INSTALL_COMPLETE_FLAG = __file__  # Any existing file skips the instructions page
+    # Per-request lines are DEBUG: keep them out of the numbers
+    proxy.log_manager.start("WARNING")
+
+    if engine == 'asyncio':
+        proxy.upstream_pool = proxy.AsyncUpstreamPool("127.0.0.1", UPSTREAM_PORT)
+        proxy.AsyncProxyServer("127.0.0.1", PROXY_PORT).serve_forever()
+    else:
+        proxy.upstream_pool = proxy.UpstreamPool("127.0.0.1", UPSTREAM_PORT)
+        with proxy.ThreadedTCPServer(("127.0.0.1", PROXY_PORT), proxy.ProxyHandler) as server:
+            server.serve_forever()
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request('GET', '/api/loading-status')
+            conn.getresponse().read()
+            conn.close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def proc_status(pid):
+    """Return (threads, rss_kb) of a process from /proc (Linux only)."""
+    threads = rss = None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    threads = int(line.split()[1])
+                elif line.startswith('VmRSS:'):
+                    rss = int(line.split()[1])
+    except OSError:
+        pass
+    return threads, rss
+
+
+def run_client(path, count, latencies, errors):
+    conn = http.client.HTTPConnection("127.0.0.1", PROXY_PORT, timeout=30)
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", PROXY_PORT, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def bench(engine, clients, requests, path):
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', engine])
+    try:
+        if not wait_for_port(PROXY_PORT):
+            print(f"{engine}: proxy did not start")
+            return
+
+        latencies, errors = [], []
+        peak_threads = 0
+        workers = [threading.Thread(target=run_client, args=(path, requests, latencies, errors))
+                   for _ in range(clients)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        while any(worker.is_alive() for worker in workers):
+            threads, _ = proc_status(child.pid)
+            peak_threads = max(peak_threads, threads or 0)
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        _, rss = proc_status(child.pid)
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        print(f"{engine:>9}: {len(latencies) / elapsed:8.0f} req/s  "
+              f"p50 {statistics.median(latencies) * 1000 if latencies else 0:6.2f} ms  "
+              f"p95 {p95 * 1000:6.2f} ms  "
+              f"errors {len(errors)}  peak threads {peak_threads}  rss {rss or 0} kB")
+    finally:
+        child.terminate()
+        child.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the loading-proxy serving engines")
+    parser.add_argument('--clients', type=int, default=50, help="concurrent keep-alive clients")
+    parser.add_argument('--requests', type=int, default=200, help="requests per client")
+    parser.add_argument('--path', default='/html', help="/html (rewritten) or /plain (passthrough)")
+    parser.add_argument('--engine', action='append', choices=('threaded', 'asyncio'),
+                        help="engine to benchmark (default: both)")
+    parser.add_argument('--serve', choices=('threaded', 'asyncio'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_proxy(args.serve)
+        return
+
+    upstream = UpstreamServer(("127.0.0.1", UPSTREAM_PORT), UpstreamHandler)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+
+    print(f"{args.clients} clients x {args.requests} requests, GET {args.path}")
+    for engine in args.engine or ('threaded', 'asyncio'):
+        bench(engine, args.clients, args.requests, args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the loading-proxy migration log parser.
+
+Generates a synthetic Laravel/Pelican container log (supervisord and
+php-fpm noise, artisan RUNNING/DONE lines) and times the previous
+per-call regex parsing against parse_migration_line(), on a whole dump
+(parse_migrations + detect_phase) and line by line (LogProgressTracker).
+
+Usage: ./scripts/bench-migration-parser.py [--lines 10000] [--repeat 5]
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import re
+import threading
+import time
+
+PROXY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "bin", "loading-proxy.py")
+
+NOISE = (
+    "[{ts}] production.INFO: Filament panel booted",
+    '{{"level":"info","ts":1700000000.1,"logger":"http.log.access","msg":"handled request","status":200}}',
+    '{{"level":"info","ts":1700000000.2,"logger":"http.log.access","msg":"handled request","status":302}}',
+    "[{ts}] NOTICE: fpm is running, pid 7",
+    "[{ts}] NOTICE: ready to handle connections",
+)
+# Phase markers: a few occurrences each in a real log
+MARKER_LINES = (
+    "{ts} INFO success: php-fpm entered RUNNING state, process has stayed up for > than 1 seconds (startsecs)",
+    "{ts} INFO success: caddy entered RUNNING state, process has stayed up for > than 1 seconds (startsecs)",
+    "   INFO  Preparing database.",
+    "   INFO  Running migrations.",
+    "External vars exist.",
+    "Generating key.",
+)
+
+
+def synthetic_log(lines, seed=1):
+    """Return `lines` log lines: about 1/3 artisan migration output, 1% phase markers, the rest noise."""
+    rng = random.Random(seed)
+    out = []
+    migration = 0
+    while len(out) < lines:
+        ts = f"2024-05-0{rng.randint(1, 9)} 12:{rng.randint(10, 59)}:{rng.randint(10, 59)}"
+        if rng.random() < 0.2:
+            migration += 1
+            name = f"20{16 + migration % 8}_0{1 + migration % 9}_1{migration % 9}_{100000 + migration}_create_table_{migration}"
+            dots = '.' * rng.randint(8, 60)
+            out.append(f"  {name} {dots} RUNNING")
+            out.append(f"  {name} {dots} {rng.uniform(1, 900):.2f}ms DONE")
+        elif rng.random() < 0.01:
+            out.append(rng.choice(MARKER_LINES).format(ts=ts))
+        else:
+            out.append(rng.choice(NOISE).format(ts=ts))
+    return out[:lines]
+
+
+# Previous implementation, kept here as the baseline
+LEGACY_MARKERS = (
+    "optimizing filament", "caching filament", "running migrations", "nothing to migrate",
+    "preparing database", "creating migration table", "migrating database",
+    "generating key", "generated app key", "external vars",
+)
+
+
+def legacy_parse_migrations(logs, seen, seen_list):
+    for m in re.findall(r'(\d{4}_\d{2}_\d{2}_\d+_[\w]+)\s+\.+\s+[\d.]+\s*(?:ms|s)\s+DONE', logs):
+        if m not in seen:
+            seen.add(m)
+            name_match = re.match(r'\d{4}_\d{2}_\d{2}_\d+_(.*)', m)
+            if name_match:
+                seen_list.append(name_match.group(1))
+    current = None
+    for line in reversed(logs.split('\n')):
+        line = line.strip()
+        if not line or 'DONE' in line:
+            continue
+        match = re.match(r'(\d{4}_\d{2}_\d{2}_\d+_[\w]+)', line)
+        if match:
+            if match.group(1) not in seen:
+                name_match = re.match(r'\d{4}_\d{2}_\d{2}_\d+_(.*)', match.group(1))
+                if name_match:
+                    current = name_match.group(1)
+            break
+    return len(seen), current
+
+
+class LegacyTracker:
+    """LogProgressTracker.feed_line() before the shared parser."""
+
+    MIGRATION_RE = re.compile(r'\d{4}_\d{2}_\d{2}_\d+_(\w+)')
+    MIGRATION_LINE_RE = re.compile(r'\d{4}_\d{2}_\d{2}_\d+_\w+.*DONE')
+    MIGRATION_DONE_RE = re.compile(r'(\d{4}_\d{2}_\d{2}_\d+_([\w]+))\s+\.+\s+([\d.]+)\s*(ms|s)\s+DONE')
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.lock = threading.Lock()
+        self.markers = set()
+        self.running_lines = set()
+        self.migration_lines = False
+        self.seen = set()
+        self.completed = []
+        self.current = None
+
+    def feed_line(self, line):
+        lower = line.lower()
+        with self.lock:
+            if "entered running state" in lower:
+                self.running_lines.add(line.strip())
+            for marker in LEGACY_MARKERS:
+                if marker in lower:
+                    self.markers.add(marker)
+            if 'DONE' in line:
+                if not self.migration_lines and self.MIGRATION_LINE_RE.search(line):
+                    self.migration_lines = True
+                match = self.MIGRATION_DONE_RE.search(line)
+                if match and match.group(1) not in self.seen:
+                    self.seen.add(match.group(1))
+                    self.completed.append(match.group(2))
+                    duration = self.proxy.migration_seconds(match.group(3), match.group(4))
+                    if duration is not None:
+                        self.proxy.metrics.observe("migration_duration_seconds", duration)
+                    self.current = None
+                    return True
+            else:
+                match = self.MIGRATION_RE.match(line.strip())
+                if match and match.group(0) not in self.seen:
+                    self.current = match.group(1)
+                    return True
+        return False
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the migration log parser")
+    parser.add_argument('--lines', type=int, default=10000, help="synthetic log lines")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    spec = importlib.util.spec_from_file_location("loading_proxy", PROXY_PATH)
+    proxy = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(proxy)
+
+    lines = synthetic_log(args.lines)
+    logs = '\n'.join(lines)
+
+    def legacy_dump():
+        completed, current = legacy_parse_migrations(logs, set(), [])
+        tracker = LegacyTracker(proxy)
+        for line in logs.split('\n'):
+            tracker.feed_line(line)
+        return completed, current
+
+    def new_dump():
+        proxy.seen_migrations, proxy.seen_migrations_list = set(), []
+        completed, _, current, _ = proxy.parse_migrations(logs)
+        proxy.detect_phase(logs)
+        return completed, current
+
+    def legacy_lines():
+        tracker = LegacyTracker(proxy)
+        for line in lines:
+            tracker.feed_line(line)
+        return len(tracker.completed)
+
+    def new_lines():
+        tracker = proxy.LogProgressTracker()
+        for line in lines:
+            tracker.feed_line(line)
+        return len(tracker.completed)
+
+    def classify_only():
+        return sum(1 for line in lines if proxy.parse_migration_line(line).kind == proxy.LINE_MIGRATION_DONE)
+
+    print(f"{len(lines)} lines, {sum(1 for line in lines if 'DONE' in line)} migrations, best of {args.repeat}")
+    for label, func in (("dump, previous", legacy_dump), ("dump, shared parser", new_dump),
+                        ("tracker, previous", legacy_lines), ("tracker, shared parser", new_lines),
+                        ("parse_migration_line", classify_only)):
+        elapsed, result = best_of(args.repeat, func)
+        print(f"{label:>24}: {elapsed * 1000:8.2f} ms  {elapsed / len(lines) * 1e6:6.2f} us/line  -> {result}")
+
+
+if __name__ == "__main__":
+    main()
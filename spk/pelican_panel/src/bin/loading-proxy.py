@@ -6,73 +6,339 @@ Provides real-time status via API by monitoring Docker logs.
 Executes database migrations if tables are missing.
 """
 
+import argparse
+import asyncio
+import atexit
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import email.utils
+import http.client
 import http.server
+import logging
+import logging.handlers
 import socketserver
-import urllib.request
-import urllib.error
 import subprocess
 import sys
 import os
+import queue
 import threading
 import time
 import signal
+import socket
+import io
 import json
 import re
 import select
+import urllib.parse
+import gzip
+import zlib
+import hashlib
+
+try:
+    import brotli  # Optional: serve br variants of local pages when available
+except ImportError:
+    brotli = None
+
+try:
+    import sqlite3  # Optional: direct migration check of SQLite installs
+except ImportError:
+    sqlite3 = None
 
 # Configuration
 LISTEN_PORT = 8080
 PANEL_INTERNAL_PORT = 8090
-PANEL_CHECK_INTERVAL = 2  # Check every 2 seconds for faster updates
+PANEL_CHECK_INTERVAL = 2  # Monitor interval once a phase stops changing (then backs off)
+MONITOR_FAST_INTERVAL = 0.5  # Monitor interval while the state changes or readiness is confirmed
+MONITOR_MAX_INTERVAL = 10  # Backoff limit of the monitor during long stable phases
+MONITOR_IDLE_INTERVAL = 60  # Monitor heartbeat once the Panel is ready (re-armed on proxy errors)
+UPSTREAM_TIMEOUT = 30  # Socket timeout for requests proxied to the Panel
+UPSTREAM_CONNECT_TIMEOUT = 5  # Timeout for opening a connection to the Panel
+BREAKER_FAILURE_THRESHOLD = 5  # Consecutive failed connects to the Panel opening the circuit
+BREAKER_PROBE_INTERVAL = 5  # Seconds between Panel probes while the circuit is open
+UPSTREAM_POOL_SIZE = 16  # Max idle keep-alive connections kept open to Caddy
+UPSTREAM_POOL_IDLE_TIMEOUT = 20  # Drop idle upstream connections after N seconds
+PROXY_CHUNK_SIZE = 64 * 1024  # Read/write size when streaming proxied bodies
+COALESCE_MAX_BODY_SIZE = 2 * 1024 * 1024  # Largest upstream body shared by coalesced GETs
+ASSET_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Memory budget of the static asset cache (0 = disabled)
+ASSET_CACHE_MAX_ENTRY_SIZE = 4 * 1024 * 1024  # Larger assets are relayed without being cached
+PROXY_COMPRESS_LEVEL = 6  # gzip level of rewritten HTML/JSON sent to clients (0 = uncompressed)
+PROXY_BROTLI_QUALITY = 4  # brotli quality of rewritten HTML/JSON, when the module is available
+PROXY_COMPRESS_MIN_SIZE = 1024  # Rewritten bodies known to be smaller are sent uncompressed
+ASSET_CACHE_HEURISTIC_TTL = 3600  # Freshness of versioned assets sent without Cache-Control/Expires
+KEEPALIVE_IDLE_TIMEOUT = 15  # Close idle client connections after N seconds
+KEEPALIVE_MAX_REQUESTS = 100  # Close client connections after N requests
+MAX_DRAIN_BODY_SIZE = 1024 * 1024  # Larger unused request bodies close the connection
+MAX_REQUEST_BODY_SIZE = 0  # Reject proxied request bodies above N bytes with 413 (0 = no limit)
+MAX_HEADER_SIZE = 64 * 1024  # Request/response header block limit (asyncio engine)
+ASYNC_MAX_CONCURRENCY = 64  # Requests processed at once by the asyncio engine
+WORKER_POOL_SIZE = 16  # Worker threads serving client connections (threaded engine)
+WORKER_QUEUE_SIZE = 64  # Accepted connections waiting for a worker before 503
+WORKER_QUEUE_WAIT_LIMIT = 5  # Shed connections that waited more than N seconds in the queue for a worker
+RETRY_AFTER_SECONDS = 2  # Retry-After sent with 503 when shedding load
+STATUS_LONG_POLL_TIMEOUT = 25  # Max wait of /api/loading-status?since=N (panel.cgi allows 60s)
+STATUS_FEED_HISTORY = 64  # Versions remembered to answer ?since=N with a delta
+PAGE_COMPRESS_MIN_SIZE = 1024  # Local pages smaller than this are only served uncompressed
+APP_URL_REVALIDATE_INTERVAL = 2  # Seconds between stat() checks of the .env files for APP_URL
+MONITOR_PROBE_DEADLINE = 5  # A monitor tick stops waiting for a probe after N seconds
+PANEL_PROBE_TIMEOUT = 3  # Socket timeout of the in-process Panel readiness probe
 LOADING_HTML_PATH = "/var/packages/pelican_panel/target/share/loading.html"
 INSTRUCTIONS_HTML_PATH = "/var/packages/pelican_panel/target/app/instructions.html"
 CONTAINER_NAME = "pelican_panel-panel-1"
+MARIADB_CONTAINER_NAME = "pelican_panel-mariadb-1"
+WINGS_CONTAINER_NAME = "pelican_panel-wings-1"
+DOCKER_SOCKET = "/var/run/docker.sock"  # Overridden by DOCKER_HOST=unix://...
+DOCKER_API_VERSION = "v1.41"  # Docker 20.10, as shipped by DSM 7 Container Manager
+LOG_FOLLOW_TAIL = 1000  # Container log lines replayed when the log follower starts
 VAR_DIR = "/var/packages/pelican_panel/var"
 WINGS_CONFIG_PATH = f"{VAR_DIR}/data/wings/config.yml"
-WINGS_PID_FILE = f"{VAR_DIR}/wings.pid"
+WINGS_RESTART_DEBOUNCE = 2  # Seconds without a new save before Wings is restarted
+WINGS_RESTART_TIMEOUT = 120  # Seconds allowed to `docker compose restart wings`
 INSTALL_COMPLETE_FLAG = f"{VAR_DIR}/install_complete"
 DATA_ROOT = f"{VAR_DIR}/data"  # Host path for Docker bind mounts
 INIT_STATUS_FILE = f"{VAR_DIR}/init_status.json"  # Status file from migration-watcher
 PANEL_ENV_FILE = f"{VAR_DIR}/panel.env"  # Environment file with APP_URL
+INIT_STATUS_MAX_AGE = 60  # Seconds; older init_status.json data means the watcher stopped
+WATCHER_MIGRATIONS_OVER_PROGRESS = 95  # init_status.json progress once the watcher saw migrations end
 MIGRATIONS_FLAG = f"{VAR_DIR}/migrations_complete"  # Flag to track migrations
+PANEL_MIGRATIONS_DIR = "/var/www/html/database/migrations"  # Migration files in the Panel image
+PANEL_SQLITE_PATH = f"{DATA_ROOT}/pelican-data/database/database.sqlite"  # Host path of a SQLite install
+MIGRATION_CHECK_TIMEOUT = 10  # Timeout of the direct migrations table queries
+MIGRATION_HISTORY_FILE = f"{VAR_DIR}/migration_history.json"  # Per-migration durations kept across installs
+MIGRATION_HISTORY_SAVE_INTERVAL = 10  # Seconds between history writes while migrations run
+MIGRATION_SLOWEST_COUNT = 10  # Slowest migrations listed in /api/loading-status
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # Histogram bounds (s)
+LOG_LEVEL = "INFO"  # Default log level, changed at runtime with POST /api/log-level
+LOG_MAX_BYTES = 1024 * 1024  # Rotate the --log-file at this size
+LOG_BACKUP_COUNT = 3  # Rotated log files kept next to the --log-file
+LOG_QUEUE_SIZE = 10000  # Records waiting for the log writer thread; further records are dropped
+LOG_RATE_LIMIT = 20  # Records per message key and window; the rest are dropped and counted
+LOG_RATE_WINDOW = 60  # Seconds of a rate limit window
+
+
+# ===========================================
+# Logging
+# ===========================================
+
+# Records are formatted in the calling thread and handed to a queue; a
+# QueueListener thread does all the writing, so a slow disk or a full pipe
+# never delays a request. Per-request lines are DEBUG (off by default, see
+# /api/log-level) and every message key is rate limited.
+log = logging.getLogger("proxy")
+migration_log = logging.getLogger("migration")
+
+LOG_FORMAT = "%(asctime)s [%(name)s] %(levelname)s %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S%z"  # Same timestamps as dsm-control.sh log()
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most `limit` records per message key through in each window.
+
+    The key is the unformatted message, i.e. the format string of calls
+    like log.debug("Proxying %s", path), or `extra={"key": ...}` for
+    messages whose text varies. The first record let through after a
+    window with drops tells how many similar records were dropped.
+    """
+
+    MAX_KEYS = 1024  # Expired windows are pruned when more keys are tracked
+
+    def __init__(self, limit=LOG_RATE_LIMIT, window=LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.suppressed = 0
+        self._lock = threading.Lock()
+        self._windows = {}  # key -> [window start, records let through, records dropped]
+
+    def filter(self, record):
+        key = (record.name, getattr(record, 'key', None) or record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and now - window[0] < self.window:
+                if window[1] < self.limit:
+                    window[1] += 1
+                    return True
+                window[2] += 1
+                self.suppressed += 1
+                return False
+            if window is None and len(self._windows) >= self.MAX_KEYS:
+                self._windows = {k: w for k, w in self._windows.items() if now - w[0] < self.window}
+            self._windows[key] = [now, 1, 0]
+        if window is not None and window[2]:
+            record.msg = f"{record.msg} ({window[2]} similar messages suppressed)"
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the writer lags."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogManager:
+    """Owns the log queue, its writer thread and the runtime log level."""
+
+    def __init__(self):
+        self.rate_limit = RateLimitFilter()
+        self.handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        self.handler.addFilter(self.rate_limit)
+        self.listener = None
+        self.log_file = None
+
+    def start(self, level=LOG_LEVEL, log_file=None):
+        """Route the proxy's loggers through the queue to stdout or `log_file`."""
+        if log_file:
+            output = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        else:
+            output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+        self.log_file = log_file
+        self.listener = logging.handlers.QueueListener(self.handler.queue, output)
+        self.listener.start()
+        atexit.register(self.stop)
+        root = logging.getLogger()
+        root.addHandler(self.handler)
+        self.set_level(level)
+
+    def stop(self):
+        """Write out the queued records (called on shutdown)."""
+        if self.listener is not None:
+            logging.getLogger().removeHandler(self.handler)
+            self.listener.stop()
+            self.listener = None
+
+    def set_level(self, name):
+        """Set the level of every logger; raises ValueError on unknown names."""
+        name = str(name).upper()
+        if name not in LOG_LEVELS:
+            raise ValueError(f"Unknown log level: {name}")
+        logging.getLogger().setLevel(name)
+        return name
+
+    def level(self):
+        return logging.getLevelName(logging.getLogger().getEffectiveLevel())
+
+    def snapshot(self):
+        return {
+            "level": self.level(),
+            "file": self.log_file,
+            "queued": self.handler.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "suppressed": self.rate_limit.suppressed,
+        }
+
+
+log_manager = LogManager()
+
+
+class AppUrlResolver:
+    """APP_URL from the Panel .env files, parsed once and cached.
+
+    The files are stat()ed at most every `revalidate_interval` seconds and
+    parsed again only when one of them appeared, disappeared or changed
+    (mtime/size). Shared by get_app_url_parts() and get_app_url_host().
+    """
+
+    def __init__(self, env_files, revalidate_interval=APP_URL_REVALIDATE_INTERVAL):
+        self.env_files = list(dict.fromkeys(env_files))  # Drop duplicate paths, keep order
+        self.revalidate_interval = revalidate_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = None
+        self._urls = []  # (env_file, APP_URL) for each file defining it, in priority order
+        self._stats = {"hits": 0, "misses": 0, "revalidations": 0}
+
+    def _file_signature(self):
+        signature = []
+        for env_file in self.env_files:
+            try:
+                st = os.stat(env_file)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _parse(self):
+        urls = []
+        for env_file in self.env_files:
+            try:
+                if os.path.exists(env_file):
+                    with open(env_file, 'r') as f:
+                        for line in f:
+                            if line.startswith('APP_URL='):
+                                urls.append((env_file, line.strip().split('=', 1)[1].strip('"\'')))
+                                break
+            except Exception as e:
+                log.warning(f"Error reading {env_file}: {e}")
+        if urls:
+            log.info(f"Found APP_URL: {urls[0][1]} (from {urls[0][0]})")
+        else:
+            log.warning("APP_URL not found in any .env file")
+        return urls
+
+    def urls(self):
+        """Return [(env_file, APP_URL)], re-reading the files if they changed."""
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.revalidate_interval:
+                self._stats["hits"] += 1
+                return self._urls
+            self._checked_at = now
+            self._stats["revalidations"] += 1
+            signature = self._file_signature()
+            if signature == self._signature:
+                self._stats["hits"] += 1
+                return self._urls
+            self._stats["misses"] += 1
+            self._signature = signature
+            self._urls = self._parse()
+            return self._urls
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+app_url_resolver = AppUrlResolver([
+    f"{VAR_DIR}/data/pelican-data/.env",  # Container persistent data
+    f"{DATA_ROOT}/pelican-data/.env",      # Alternative path
+    PANEL_ENV_FILE,                        # Legacy location
+])
 
 
 def get_app_url_parts():
-    """Read APP_URL from .env file and extract host, port, proto.
+    """Return APP_URL's host, port and proto from the .env files.
 
     Checks multiple locations where the .env file might be.
     """
-    # Possible locations for the .env file
-    env_files = [
-        f"{VAR_DIR}/data/pelican-data/.env",  # Container persistent data
-        f"{DATA_ROOT}/pelican-data/.env",      # Alternative path
-        PANEL_ENV_FILE,                        # Legacy location
-    ]
-
-    for env_file in env_files:
-        try:
-            if os.path.exists(env_file):
-                with open(env_file, 'r') as f:
-                    for line in f:
-                        if line.startswith('APP_URL='):
-                            url = line.strip().split('=', 1)[1].strip('"\'')
-                            # Parse URL: http://192.168.1.47:8080
-                            if '://' in url:
-                                proto, rest = url.split('://', 1)
-                                if '/' in rest:
-                                    rest = rest.split('/')[0]
-                                if ':' in rest:
-                                    host, port = rest.rsplit(':', 1)
-                                else:
-                                    host = rest
-                                    port = '443' if proto == 'https' else '80'
-                                return {'host': host, 'port': port, 'proto': proto}
-        except Exception as e:
-            print(f"[proxy] Error reading {env_file}: {e}")
+    for _, url in app_url_resolver.urls():
+        # Parse URL: http://192.168.1.47:8080
+        if '://' in url:
+            proto, rest = url.split('://', 1)
+            if '/' in rest:
+                rest = rest.split('/')[0]
+            if ':' in rest:
+                host, port = rest.rsplit(':', 1)
+            else:
+                host = rest
+                port = '443' if proto == 'https' else '80'
+            return {'host': host, 'port': port, 'proto': proto}
     return None
 
 # Total migrations in Pelican Panel (222 tables based on actual install)
-# This is updated dynamically if we discover more migrations
+# Only used until inspect_migrations() or the migration history know better
 TOTAL_MIGRATIONS = 222
 
 # Global state
@@ -97,130 +363,1015 @@ state_lock = threading.Lock()
 seen_migrations = set()
 seen_migrations_list = []  # Liste ordonnée des migrations (noms courts)
 migration_start_time = None
-dynamic_total = TOTAL_MIGRATIONS  # Will be adjusted if we see more migrations
 
 # Migration execution state
-migration_process = None
 migration_running = False
 migrations_executed = False  # Flag to avoid re-running migrations
 
 
-def check_tables_exist():
-    """Check if database tables exist by querying the migration status.
+# ===========================================
+# Metrics (/api/metrics)
+# ===========================================
+
+METRIC_DESCRIPTIONS = {
+    "requests_total": ("counter", "Requests served, by route, method and status"),
+    "request_duration_seconds": ("histogram", "Time to serve a request, by route"),
+    "bytes_received_total": ("counter", "Bytes read from clients (headers and bodies)"),
+    "bytes_sent_total": ("counter", "Bytes written to clients (headers and bodies)"),
+    "upstream_connect_seconds": ("histogram", "Time to open a connection to the Panel"),
+    "upstream_ttfb_seconds": ("histogram", "Time from sending a request to the Panel to its response headers"),
+    "upstream_transfer_seconds": ("histogram", "Time to relay a Panel response body to the client"),
+    "rewrite_seconds": ("histogram", "CPU time spent decoding, rewriting and encoding bodies, by type"),
+    "monitor_tick_seconds": ("histogram", "Duration of a monitor iteration"),
+    "monitor_probe_seconds": ("histogram", "Duration of a monitor probe, by probe"),
+    "docker_request_seconds": ("histogram", "Docker Engine API calls, by method"),
+    "subprocess_spawns_total": ("counter", "Processes started, by command"),
+    "migration_duration_seconds": ("histogram", "Migration durations reported by artisan (DONE column)"),
+    "wings_apply_seconds": ("histogram", "Time from a Wings config save to its application, by outcome"),
+}
+
+
+def _format_labels(labels):
+    """Render ((name, value), ...) as a Prometheus label set."""
+    if not labels:
+        return ''
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metrics:
+    """Counters, histograms and gauges exported in the Prometheus text format.
+
+    Series are created on first use, so instrumenting a new code path is a
+    single call: metrics.inc("requests_total", route="status"), or
+    metrics.observe() with a duration in seconds. timer() and timed() wrap
+    a block or a function. Gauges are callables sampled by render().
+    """
+
+    PREFIX = "pelican_proxy_"
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [count per bucket..., +Inf count, sum]
+        self._gauges = {}  # name -> (description, callable returning a value or {labels: value})
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        with self._lock:
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            values[index] += 1
+            values[-1] += seconds
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of a `with` block, even when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of timer()."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def gauge(self, name, func, description):
+        self._gauges[name] = (description, func)
+
+    def render(self):
+        """Return every series in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+        lines = []
+        described = set()
+
+        def header(name, kind, description):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {self.PREFIX}{name} {description}")
+                lines.append(f"# TYPE {self.PREFIX}{name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, *METRIC_DESCRIPTIONS.get(name, ("counter", name)))
+            lines.append(f"{self.PREFIX}{name}{_format_labels(labels)} {value}")
+        for (name, labels), values in sorted(histograms.items()):
+            header(name, *METRIC_DESCRIPTIONS.get(name, ("histogram", name)))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f"{self.PREFIX}{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.PREFIX}{name}_sum{_format_labels(labels)} {round(values[-1], 6)}")
+            lines.append(f"{self.PREFIX}{name}_count{_format_labels(labels)} {cumulative}")
+        for name, (description, func) in sorted(self._gauges.items()):
+            try:
+                value = func()
+            except Exception:
+                continue  # A gauge whose source isn't available yet is left out
+            header(name, "gauge", description)
+            for labels, sample in (value.items() if isinstance(value, dict) else [((), value)]):
+                lines.append(f"{self.PREFIX}{name}{_format_labels(labels)} {float(sample)}")
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+metrics = Metrics()
+
+# Request methods kept as label values, others are reported as "other"
+METRIC_METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+
+def record_request(route, method, status, seconds):
+    """Count a served request and its duration under its route."""
+    method = method if method in METRIC_METHODS else 'other'
+    metrics.inc("requests_total", route=route, method=method, status=status)
+    metrics.observe("request_duration_seconds", seconds, route=route)
+
+
+class CountingFile:
+    """A handler's rfile/wfile counting the bytes read or written in `counter`."""
+
+    def __init__(self, file, counter):
+        self._file = file
+        self._counter = counter
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def _count(self, data):
+        if data:
+            metrics.inc(self._counter, len(data))
+        return data
+
+    def read(self, *args):
+        return self._count(self._file.read(*args))
+
+    def read1(self, *args):
+        return self._count(self._file.read1(*args))
+
+    def readline(self, *args):
+        return self._count(self._file.readline(*args))
+
+    def readinto(self, buffer):
+        count = self._file.readinto(buffer)
+        if count:
+            metrics.inc(self._counter, count)
+        return count
+
+    def write(self, data):
+        metrics.inc(self._counter, len(data))
+        return self._file.write(data)
+
+
+class CountingStreamReader:
+    """asyncio StreamReader counting the bytes read in bytes_received_total."""
+
+    def __init__(self, reader):
+        self._reader = reader
+
+    def __getattr__(self, name):
+        return getattr(self._reader, name)
+
+    @staticmethod
+    def _count(data):
+        if data:
+            metrics.inc("bytes_received_total", len(data))
+        return data
+
+    async def read(self, n=-1):
+        return self._count(await self._reader.read(n))
+
+    async def readline(self):
+        return self._count(await self._reader.readline())
+
+    async def readexactly(self, n):
+        return self._count(await self._reader.readexactly(n))
+
+    async def readuntil(self, separator=b'\n'):
+        return self._count(await self._reader.readuntil(separator))
+
+
+class CountingStreamWriter:
+    """asyncio StreamWriter counting the bytes written in bytes_sent_total."""
+
+    def __init__(self, writer):
+        self._writer = writer
+
+    def __getattr__(self, name):
+        return getattr(self._writer, name)
+
+    def write(self, data):
+        metrics.inc("bytes_sent_total", len(data))
+        self._writer.write(data)
+
+
+def _asyncio_task_count():
+    # Only answerable from the event loop thread, where the asyncio engine
+    # serves /api/metrics; the gauge is left out with the threaded engine
+    return len(asyncio.all_tasks(asyncio.get_running_loop()))
+
+
+metrics.gauge("threads", threading.active_count, "Live threads in the proxy process")
+metrics.gauge("asyncio_tasks", _asyncio_task_count, "Pending asyncio tasks (asyncio engine)")
+metrics.gauge("panel_ready", lambda: state["panel_ready"], "1 once the Panel answers requests")
+metrics.gauge("migrations_done", lambda: state["migrations_done"], "Migrations completed")
+metrics.gauge("server", lambda: {(("stat", name),): value for name, value in http_server.snapshot().items()
+                                 if isinstance(value, (int, float)) and not isinstance(value, bool)},
+              "Serving engine counters (workers, busy, queue depth, connections...)")
+metrics.gauge("upstream_idle_connections", lambda: upstream_pool.snapshot()["idle"],
+              "Idle keep-alive connections to the Panel")
+metrics.gauge("asset_cache_bytes", lambda: asset_cache.snapshot()["bytes"],
+              "Memory used by the static asset cache")
+
+
+def spawn(cmd, **kwargs):
+    """subprocess.Popen counted in subprocess_spawns_total by command."""
+    command = os.path.basename(cmd[0])
+    if len(cmd) > 1 and not cmd[1].startswith('-'):
+        command += ' ' + cmd[1]  # "docker compose"
+    metrics.inc("subprocess_spawns_total", command=command)
+    return subprocess.Popen(cmd, **kwargs)
+
+
+def migration_seconds(value, unit):
+    """Duration of artisan's timing column ("308.07ms", "1 s") in seconds."""
+    try:
+        seconds = float(value)
+    except ValueError:
+        return None
+    return seconds / 1000 if unit == 'ms' else seconds
+
+
+# ===========================================
+# Docker Engine API client
+# ===========================================
+
+class DockerError(Exception):
+    """Error response from the Docker Engine API."""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a unix domain socket."""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class DockerExec:
+    """Output of a command started by DockerClient.exec_stream().
+
+    Iterating yields output lines (stdout and stderr interleaved, without
+    line endings). wait() returns the exit code once the output is consumed.
+    """
+
+    def __init__(self, client, exec_id, connection, response):
+        self._client = client
+        self.exec_id = exec_id
+        self._connection = connection
+        self._response = response
+
+    def __iter__(self):
+        try:
+            for line in iter_lines(demux_stream(self._response)):
+                yield line
+        finally:
+            self.close()
+
+    def wait(self):
+        self.close()
+        return self._client.exec_inspect(self.exec_id).get('ExitCode')
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def demux_stream(response):
+    """Yield the payload of a Docker attach/logs/exec stream.
+
+    Containers without a TTY multiplex stdout and stderr in frames made of
+    an 8 byte header (stream type, 3 zero bytes, big-endian length); TTY
+    streams are raw. The format is detected from the first bytes.
+    """
+    buffer = b''
+    multiplexed = None
+    while True:
+        data = response.read1(PROXY_CHUNK_SIZE)
+        if not data:
+            break
+        buffer += data
+        if multiplexed is None:
+            if len(buffer) < 8:
+                continue
+            multiplexed = buffer[0] in (0, 1, 2) and buffer[1:4] == b'\x00\x00\x00'
+        if not multiplexed:
+            yield buffer
+            buffer = b''
+            continue
+        while len(buffer) >= 8:
+            size = int.from_bytes(buffer[4:8], 'big')
+            if len(buffer) < 8 + size:
+                break
+            yield buffer[8:8 + size]
+            buffer = buffer[8 + size:]
+    if buffer and not multiplexed:
+        yield buffer
+
+
+def iter_lines(chunks):
+    """Split a stream of byte chunks into decoded lines."""
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            yield line.rstrip(b'\r').decode('utf-8', errors='replace')
+    if pending:
+        yield pending.rstrip(b'\r').decode('utf-8', errors='replace')
+
+
+class DockerClient:
+    """Minimal Docker Engine API client over the unix socket.
+
+    Replaces the docker CLI (a heavy binary to fork every couple of seconds
+    on a NAS). Short requests share one persistent connection; log
+    following and exec output get a dedicated connection each.
+    """
+
+    # Errors meaning the shared connection was closed by dockerd while idle
+    STALE_ERRORS = (ConnectionError, http.client.BadStatusLine)
+
+    def __init__(self, socket_path=DOCKER_SOCKET, api_version=DOCKER_API_VERSION, timeout=10):
+        self.socket_path = socket_path
+        self.prefix = f"/{api_version}" if api_version else ""
+        self.timeout = timeout
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _url(self, path, **params):
+        query = urllib.parse.urlencode({k: v for k, v in params.items() if v is not None})
+        return f"{self.prefix}{path}?{query}" if query else f"{self.prefix}{path}"
+
+    @staticmethod
+    def _encode(body):
+        if body is None:
+            return None, {}
+        return json.dumps(body).encode('utf-8'), {'Content-Type': 'application/json'}
+
+    @staticmethod
+    def _check(response, data):
+        if response.status >= 400:
+            try:
+                message = json.loads(data).get('message', '')
+            except ValueError:
+                message = data.decode('utf-8', errors='replace')
+            raise DockerError(response.status, message.strip())
+
+    def request(self, method, path, body=None, timeout=None):
+        """Send a request on the shared connection; return the decoded JSON (or None)."""
+        payload, headers = self._encode(body)
+        with self._lock, metrics.timer("docker_request_seconds", method=method):
+            for attempt in (1, 2):
+                reused = self._connection is not None
+                if not reused:
+                    self._connection = UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+                conn = self._connection
+                conn.timeout = timeout or self.timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(conn.timeout)
+                try:
+                    conn.request(method, path, body=payload, headers=headers)
+                    response = conn.getresponse()
+                    data = response.read()
+                except self.STALE_ERRORS:
+                    conn.close()
+                    self._connection = None
+                    if reused and attempt == 1:
+                        continue  # Retry once on a fresh connection
+                    raise
+                except BaseException:
+                    conn.close()
+                    self._connection = None
+                    raise
+                if response.will_close:
+                    conn.close()
+                    self._connection = None
+                break
+        self._check(response, data)
+        if not data or 'json' not in (response.getheader('Content-Type') or ''):
+            return data or None
+        return json.loads(data)
+
+    def _open_stream(self, method, path, body=None, timeout=None):
+        """Send a request on a dedicated connection; return (connection, response)."""
+        payload, headers = self._encode(body)
+        conn = UnixHTTPConnection(self.socket_path, timeout=timeout)
+        try:
+            with metrics.timer("docker_request_seconds", method=method):
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+            if response.status >= 400:
+                self._check(response, response.read())
+        except BaseException:
+            conn.close()
+            raise
+        return conn, response
+
+    def inspect_container(self, name):
+        """Return the container's inspect data, or None if it doesn't exist."""
+        try:
+            return self.request('GET', self._url(f"/containers/{name}/json"))
+        except DockerError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def is_running(self, name):
+        info = self.inspect_container(name)
+        return bool(info and info.get('State', {}).get('Running'))
+
+    def list_containers(self, name=None, all=False):
+        """List containers like `docker ps [--all] --filter name=<name>`."""
+        filters = json.dumps({"name": [name]}) if name else None
+        return self.request('GET', self._url("/containers/json", all=int(all), filters=filters)) or []
+
+    def container_started_at(self, name):
+        """State.StartedAt of a running container, '' if not running."""
+        info = self.inspect_container(name)
+        state = info.get('State', {}) if info else {}
+        return state.get('StartedAt', '') if state.get('Running') else ''
+
+    def container_status(self, name):
+        """Status text of a running container ("Up 2 minutes"), '' if not running."""
+        for container in self.list_containers(name):
+            return container.get('Status', '')
+        return ''
+
+    def logs(self, name, tail=500, since=None):
+        """Return the container's recent stdout and stderr as text."""
+        conn, response = self._open_stream(
+            'GET', self._url(f"/containers/{name}/logs", stdout=1, stderr=1, tail=tail, since=since),
+            timeout=self.timeout)
+        try:
+            return b''.join(demux_stream(response)).decode('utf-8', errors='replace')
+        finally:
+            conn.close()
+
+    def stream_logs(self, name, tail=0, since=None, follow=True, timeout=None):
+        """Yield log lines as the container writes them.
+
+        With `follow`, the generator only ends when the container stops or
+        the connection is closed; `timeout` bounds the wait for a new line.
+        """
+        conn, response = self._open_stream(
+            'GET', self._url(f"/containers/{name}/logs", stdout=1, stderr=1, tail=tail,
+                             since=since, follow=int(follow)),
+            timeout=timeout)
+        try:
+            for line in iter_lines(demux_stream(response)):
+                yield line
+        finally:
+            conn.close()
+
+    def exec_create(self, name, cmd, env=None):
+        config = {"Cmd": cmd, "AttachStdout": True, "AttachStderr": True, "Tty": False}
+        if env:
+            config["Env"] = list(env)  # ["NAME=value"], kept off the command line
+        result = self.request('POST', self._url(f"/containers/{name}/exec"), config)
+        return result['Id']
+
+    def exec_inspect(self, exec_id):
+        return self.request('GET', self._url(f"/exec/{exec_id}/json"))
+
+    def exec_stream(self, name, cmd, timeout=None, env=None):
+        """Start `cmd` in the container and return a DockerExec streaming its output."""
+        exec_id = self.exec_create(name, cmd, env)
+        conn, response = self._open_stream(
+            'POST', self._url(f"/exec/{exec_id}/start"), {"Detach": False, "Tty": False},
+            timeout=timeout)
+        return DockerExec(self, exec_id, conn, response)
+
+    def exec_run(self, name, cmd, timeout=30, env=None):
+        """Run `cmd` in the container; return (exit_code, output)."""
+        execution = self.exec_stream(name, cmd, timeout=timeout, env=env)
+        output = '\n'.join(execution)
+        return execution.wait(), output
+
+
+def docker_socket_path():
+    """Socket from DOCKER_HOST when it points at a unix socket, else the default."""
+    docker_host = os.environ.get('DOCKER_HOST', '')
+    if docker_host.startswith('unix://'):
+        return docker_host[len('unix://'):]
+    return DOCKER_SOCKET
+
+
+docker_client = DockerClient(docker_socket_path())
+
+
+# ===========================================
+# Migration state inspection
+# ===========================================
+
+class MigrationCheckError(Exception):
+    """The migrations table or the shipped migration files could not be listed."""
+
+
+class MigrationInventory(collections.namedtuple('MigrationInventory', 'shipped ran source')):
+    """Migrations shipped in the Panel image vs. recorded in the database."""
+
+    __slots__ = ()
+
+    @property
+    def pending(self):
+        return sorted(set(self.shipped) - set(self.ran))
+
 
-    Returns True if tables exist, False if they don't.
-    Uses 'artisan migrate:status' which is more reliable than tinker.
+def read_env_file(path):
+    """Parse the KEY=value lines of a .env file ({} when unreadable)."""
+    values = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    values[key.strip()] = value.strip().strip('"\'')
+    except OSError:
+        pass
+    return values
+
+
+def sqlite_database_path(database):
+    """Host path of the Panel's SQLite database from DB_DATABASE (a container path)."""
+    if database.startswith('/pelican-data/'):
+        return os.path.join(DATA_ROOT, 'pelican-data', database[len('/pelican-data/'):])
+    if os.path.isabs(database) and os.path.exists(database):
+        return database
+    return PANEL_SQLITE_PATH
+
+
+def sqlite_ran_migrations(path):
+    """Migration names recorded in a SQLite database, opened read-only."""
+    try:
+        conn = sqlite3.connect(f"file:{urllib.parse.quote(path)}?mode=ro", uri=True,
+                               timeout=MIGRATION_CHECK_TIMEOUT)
+    except sqlite3.Error as e:
+        raise MigrationCheckError(f"{path}: {e}")
+    try:
+        return [row[0] for row in conn.execute("SELECT migration FROM migrations")]
+    except sqlite3.OperationalError as e:
+        if "no such table" in str(e):
+            return []
+        raise MigrationCheckError(str(e))
+    finally:
+        conn.close()
+
+
+def mariadb_ran_migrations(env):
+    """Migration names recorded in MariaDB, queried through the server's unix
+    socket by the client shipped in its container (no Laravel boot)."""
+    returncode, output = docker_client.exec_run(
+        MARIADB_CONTAINER_NAME,
+        ["mariadb", "--batch", "--skip-column-names", "-u", env.get('DB_USERNAME', 'pelican'),
+         env.get('DB_DATABASE', 'pelican'), "-e", "SELECT migration FROM migrations"],
+        timeout=MIGRATION_CHECK_TIMEOUT,
+        env=[f"MYSQL_PWD={env.get('DB_PASSWORD', '')}"])
+    if returncode == 0:
+        return [line.strip() for line in output.splitlines() if line.strip()]
+    if "ERROR 1146" in output:  # Table 'pelican.migrations' doesn't exist
+        return []
+    raise MigrationCheckError(f"mariadb exited with {returncode}: {output[:200]}")
+
+
+def shipped_migrations():
+    """Names of the migration files shipped in the Panel image."""
+    returncode, output = docker_client.exec_run(
+        CONTAINER_NAME, ["ls", "-1", PANEL_MIGRATIONS_DIR], timeout=MIGRATION_CHECK_TIMEOUT)
+    names = [line[:-len('.php')] for line in output.splitlines() if line.endswith('.php')]
+    if returncode != 0 or not names:
+        raise MigrationCheckError(f"no migration files in {PANEL_MIGRATIONS_DIR}: {output[:200]}")
+    return names
+
+
+def inspect_migrations(env=None, shipped=None):
+    """Read the migration state straight from the database.
+
+    Counts the rows of Laravel's `migrations` table through the configured
+    driver (the SQLite file on the bind mount, or the MariaDB container) and
+    compares them with `shipped` (default: the files in the Panel image).
+    Returns a MigrationInventory, or None when the database can't be read
+    this way and check_tables_exist() has to ask artisan.
+    """
+    if env is None:
+        env = read_env_file(PANEL_ENV_FILE)
+    connection = env.get('DB_CONNECTION', 'mysql')
+    started = time.perf_counter()
+    try:
+        if connection == 'sqlite':
+            if sqlite3 is None:
+                log.info("Direct migration check unavailable: no sqlite3 module")
+                return None
+            ran = sqlite_ran_migrations(sqlite_database_path(env.get('DB_DATABASE', '')))
+        elif connection in ('mysql', 'mariadb') and env.get('DB_HOST', 'mariadb') == 'mariadb':
+            ran = mariadb_ran_migrations(env)
+        else:
+            log.info(f"Direct migration check unavailable for {connection} on {env.get('DB_HOST')}")
+            return None
+        if shipped is None:
+            shipped = shipped_migrations()
+    except (MigrationCheckError, DockerError, OSError) as e:
+        log.info(f"Direct migration check failed, falling back to artisan: {e}")
+        return None
+    inventory = MigrationInventory(shipped, ran, connection)
+    log.info(f"Migrations table read in {time.perf_counter() - started:.2f}s ({connection}): "
+             f"{len(ran)} ran, {len(inventory.pending)} pending")
+    return inventory
+
+
+def check_tables_exist(inventory=None):
+    """Check if database tables exist.
+
+    Returns True if tables exist, False if they don't. With an `inventory`
+    from inspect_migrations(), every shipped migration must have run;
+    without one, falls back to 'artisan migrate:status', which boots the
+    whole Laravel app.
     """
+    if inventory is not None:
+        return not inventory.pending
+
     try:
         # Use migrate:status to check if migrations have been run
         # This command lists all migrations and their status
-        result = subprocess.run(
-            ["docker", "exec", CONTAINER_NAME, "php", "/var/www/html/artisan",
-             "migrate:status", "--no-interaction"],
-            capture_output=True,
-            text=True,
+        returncode, output = docker_client.exec_run(
+            CONTAINER_NAME,
+            ["php", "/var/www/html/artisan", "migrate:status", "--no-interaction"],
             timeout=30
         )
-
-        output = result.stdout + result.stderr
         output_lower = output.lower()
 
         # Check for error indicators
         if "no such table" in output_lower or "doesn't exist" in output_lower:
-            print("[proxy] Tables don't exist - migrations needed")
+            log.info("Tables don't exist - migrations needed")
             return False
 
         if "migration table not found" in output_lower:
-            print("[proxy] Migration table not found - migrations needed")
+            log.info("Migration table not found - migrations needed")
             return False
 
         # If the command succeeded and shows "Ran" migrations, tables exist
-        if result.returncode == 0 and "ran" in output_lower:
+        if returncode == 0 and "ran" in output_lower:
             # Count how many migrations have run
             ran_count = output_lower.count("ran")
             if ran_count > 10:  # Expect at least 10 migrations to have run
-                print(f"[proxy] Tables exist - {ran_count} migrations already ran")
+                log.info(f"Tables exist - {ran_count} migrations already ran")
                 return True
             else:
-                print(f"[proxy] Only {ran_count} migrations ran - running more")
+                log.info(f"Only {ran_count} migrations ran - running more")
                 return False
 
         # If command succeeded but no "Ran" status, migrations haven't run
-        if result.returncode == 0:
-            print(f"[proxy] migrate:status succeeded but no migrations ran yet")
+        if returncode == 0:
+            log.info("migrate:status succeeded but no migrations ran yet")
             return False
 
-        print(f"[proxy] Table check failed: returncode={result.returncode}")
-        print(f"[proxy] stdout: {result.stdout[:200]}")
-        print(f"[proxy] stderr: {result.stderr[:200]}")
+        log.warning(f"Table check failed: returncode={returncode}, output: {output[:200]}")
         return False
 
-    except subprocess.TimeoutExpired:
-        print("[proxy] Table check timed out")
+    except socket.timeout:
+        log.warning("Table check timed out")
         return False
     except Exception as e:
-        print(f"[proxy] Error checking tables: {e}")
+        log.warning(f"Error checking tables: {e}")
         return False
 
 
-def wait_for_container_ready(timeout=120):
+def wait_for_container_ready(timeout=120, check_php=True):
     """Wait for the Panel container to be running and accepting commands.
 
-    Returns True when container is ready, False on timeout.
+    Returns True when container is ready, False on timeout. Without
+    `check_php`, a running container is enough (no `php -v` exec).
     """
-    print("[proxy] Waiting for container to be ready...")
+    log.info("Waiting for container to be ready...")
     start = time.time()
     while time.time() - start < timeout:
         try:
-            result = subprocess.run(
-                ["docker", "inspect", "-f", "{{.State.Running}}", CONTAINER_NAME],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            if result.stdout.strip().lower() == "true":
+            if docker_client.is_running(CONTAINER_NAME):
+                if not check_php:
+                    log.info("Container is running")
+                    return True
                 # Container is running, check if PHP is ready
-                result = subprocess.run(
-                    ["docker", "exec", CONTAINER_NAME, "php", "-v"],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
-                if result.returncode == 0 and "PHP" in result.stdout:
-                    print("[proxy] Container is ready")
+                returncode, output = docker_client.exec_run(CONTAINER_NAME, ["php", "-v"], timeout=10)
+                if returncode == 0 and "PHP" in output:
+                    log.info("Container is ready")
                     return True
         except Exception as e:
-            print(f"[proxy] Container not ready yet: {e}")
+            log.debug("Container not ready yet: %s", e)
         time.sleep(2)
-    print("[proxy] Container ready timeout")
+    log.warning("Container ready timeout")
     return False
 
 
+# ===========================================
+# Migration output parsing
+# ===========================================
+
+# Kinds of lines told apart by parse_migration_line()
+LINE_OTHER = 0
+LINE_MIGRATION_DONE = 1  # "2016_01_23_195851_add_api_keys .......... 308.07ms DONE"
+LINE_MIGRATION_RUNNING = 2  # A migration line without DONE yet: the one in progress
+LINE_MIGRATION_OUTPUT = 3  # Another line naming a migration and ending in DONE
+
+# Phase markers of the Panel's startup log; LogProgressTracker keeps them as a bitmask
+LOG_MARKERS = (
+    "optimizing filament", "caching filament", "running migrations", "nothing to migrate",
+    "preparing database", "creating migration table", "migrating database",
+    "generating key", "generated app key", "external vars", "entered running state",
+)
+LOG_MARKER_BITS = {marker: 1 << index for index, marker in enumerate(LOG_MARKERS)}
+_LOG_MARKER_ITEMS = tuple(LOG_MARKER_BITS.items())  # Substring tests beat a regex alternation here
+
+MIGRATION_LINE_RE = re.compile(r'\s*(\d{4}_\d{2}_\d{2}_\d+_(\w+))(?:\s+\.+\s+([\d.]+)\s*(ms|s)\s+DONE)?')
+RUNNING_PROGRAM_RE = re.compile(r'(\S+) entered running state')
+
+ParsedLine = collections.namedtuple('ParsedLine', 'kind name short_name seconds markers program')
+OTHER_LINE = ParsedLine(LINE_OTHER, None, None, None, 0, None)  # Shared by the lines without news
+
+
+def parse_migration_line(line):
+    """Classify one line of artisan or container log output.
+
+    Returns a ParsedLine: its kind, the migration's full and short names,
+    the duration artisan reported (seconds, or None), the bitmask of
+    LOG_MARKERS found and the supervisord program that "entered RUNNING
+    state". Most lines only cost an anchored match and substring tests.
+    """
+    done = 'DONE' in line
+    match = MIGRATION_LINE_RE.match(line)
+    if match is None and done:
+        match = MIGRATION_LINE_RE.search(line)  # Prefixed line (timestamps...)
+    if match is not None:
+        name, short_name, value, unit = match.groups()
+        if value is not None:
+            return ParsedLine(LINE_MIGRATION_DONE, name, short_name, migration_seconds(value, unit), 0, None)
+        if not done:
+            return ParsedLine(LINE_MIGRATION_RUNNING, name, short_name, None, 0, None)
+        if 'DONE' in line[match.end():]:
+            return ParsedLine(LINE_MIGRATION_OUTPUT, name, short_name, None, 0, None)
+    lower = line.lower()
+    markers = 0
+    for marker, bit in _LOG_MARKER_ITEMS:
+        if marker in lower:
+            markers |= bit
+    if not markers:
+        return OTHER_LINE
+    program = None
+    if markers & LOG_MARKER_BITS["entered running state"]:
+        running = RUNNING_PROGRAM_RE.search(lower)
+        program = running.group(1) if running else lower.strip()
+    return ParsedLine(LINE_OTHER, None, None, None, markers, program)
+
+
+def short_migration_name(name):
+    """"add_api_keys" for "2016_01_23_195851_add_api_keys"; other names are returned as is."""
+    match = MIGRATION_LINE_RE.match(name) if name else None
+    return match.group(2) if match else name
+
+
+# ===========================================
+# Migration timing history
+# ===========================================
+
+# Migrations left in this run and their expected duration. `fraction` is
+# the share of the run's expected time already done (0..1).
+MigrationEstimate = collections.namedtuple('MigrationEstimate', 'total remaining eta_seconds fraction')
+
+
+class MigrationHistory:
+    """Per-migration durations, persisted across installs and upgrades.
+
+    record() is called with the duration artisan prints on each DONE line
+    (migration output or container log). The history file keeps, per
+    migration, the mean duration and the number of runs. estimate() uses
+    it to weight what is left, so the ETA and the progress bar follow the
+    slow migrations instead of a plain count.
+    """
+
+    def __init__(self, path=MIGRATION_HISTORY_FILE, save_interval=MIGRATION_HISTORY_SAVE_INTERVAL):
+        self.path = path
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._durations = None  # name -> [mean seconds, runs], read on first use
+        self._known = set()  # Migrations of previous runs, as read from the file
+        self._dirty = False
+        self._saved_at = 0.0
+        self._shipped = None  # Migrations in the Panel image, from inspect_migrations()
+        self._ran_before = set()  # Migrations already in the database when this run started
+        self._done = {}  # Migrations completed during this run -> reported seconds (or None)
+        self._started = None  # time.monotonic() of the start of this run
+
+    def _load(self):
+        if self._durations is not None:
+            return
+        self._durations = {}
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            for name, entry in data.get("migrations", {}).items():
+                self._durations[name] = [float(entry["seconds"]), int(entry["runs"])]
+            self._known = set(self._durations)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            log.warning(f"Ignoring unreadable migration history {self.path}: {e}")
+
+    def set_inventory(self, inventory):
+        """Scope the run to the migrations the database is missing."""
+        with self._lock:
+            self._shipped = list(inventory.shipped)
+            self._ran_before = set(inventory.ran)
+
+    def record(self, name, seconds):
+        """Record a completed migration (full name) and its reported duration."""
+        with self._lock:
+            self._load()
+            if name in self._done:
+                return
+            if self._started is None:
+                self._started = time.monotonic() - (seconds or 0)
+            self._done[name] = seconds
+            if seconds is not None:
+                mean, runs = self._durations.get(name, (0.0, 0))
+                self._durations[name] = [(mean * runs + seconds) / (runs + 1), runs + 1]
+                self._dirty = True
+            save_due = self._dirty and time.monotonic() - self._saved_at >= self.save_interval
+        if save_due:
+            self.save()
+
+    def save(self):
+        """Write the history if it changed (atomically, next to the old file)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._saved_at = time.monotonic()
+            data = {"updated": int(time.time()),
+                    "migrations": {name: {"seconds": round(mean, 4), "runs": runs}
+                                   for name, (mean, runs) in sorted(self._durations.items())}}
+            try:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f, indent=1)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                log.warning(f"Could not save migration history: {e}")
+
+    def estimate(self, done_count=None):
+        """Return the MigrationEstimate of this run.
+
+        The total is the number of migrations the database was missing
+        when inspect_migrations() could list them, else the migrations in
+        the history (TOTAL_MIGRATIONS without history). Migrations without
+        history are expected to take the median duration, and the ETA is
+        scaled by the wall time of this run over the durations artisan
+        reported (the PHP work between migrations).
+        """
+        with self._lock:
+            self._load()
+            done = self._done
+            if done_count is None:
+                done_count = len(done)
+            if self._shipped is not None:
+                scope = [name for name in self._shipped if name not in self._ran_before]
+            elif self._known:
+                scope = list(self._known.union(done))
+            else:
+                scope = [None] * TOTAL_MIGRATIONS
+            total = max(len(scope), done_count)
+            remaining = [name for name in scope if name is None or name not in done]
+            remaining_count = max(total - done_count, 0)
+
+            means = sorted(mean for mean, _ in self._durations.values())
+            reported = [seconds for seconds in done.values() if seconds is not None]
+            if means:
+                default = means[len(means) // 2]
+            elif reported:
+                default = sum(reported) / len(reported)
+            else:
+                fraction = done_count / total if total else 1.0
+                return MigrationEstimate(total, remaining_count, None, fraction)
+
+            def expected(name):
+                entry = self._durations.get(name) if name is not None else None
+                return entry[0] if entry else default
+
+            remaining_time = sum(expected(name) for name in remaining[:remaining_count])
+            remaining_time += max(remaining_count - len(remaining), 0) * default
+            done_time = sum(reported) + (done_count - len(reported)) * default
+            scale = 1.0
+            if self._started is not None and len(reported) >= 5 and sum(reported) > 0:
+                scale = max(1.0, (time.monotonic() - self._started) / sum(reported))
+        fraction = done_time / (done_time + remaining_time) if done_time + remaining_time else 1.0
+        return MigrationEstimate(total, remaining_count, int(round(remaining_time * scale)), fraction)
+
+    def slowest(self, count=MIGRATION_SLOWEST_COUNT):
+        with self._lock:
+            self._load()
+            ranked = sorted(self._durations.items(), key=lambda item: item[1][0], reverse=True)
+        return [{"name": name, "seconds": round(mean, 3), "runs": runs}
+                for name, (mean, runs) in ranked[:count]]
+
+    def snapshot(self):
+        estimate = self.estimate()
+        with self._lock:
+            known, done = len(self._durations), len(self._done)
+        return {
+            "known": known,
+            "done": done,
+            "total": estimate.total,
+            "remaining": estimate.remaining,
+            "eta_seconds": estimate.eta_seconds,
+            "slowest": self.slowest(),
+        }
+
+
+migration_history = MigrationHistory()
+
+
+def apply_migration_estimate(completed_count):
+    """Copy the migration total, ETA and progress (10-90%) into state (state_lock held)."""
+    estimate = migration_history.estimate(completed_count)
+    state["migrations_total"] = estimate.total
+    state["estimated_remaining_seconds"] = estimate.eta_seconds
+    state["detail"] = f"Table {completed_count}/{estimate.total}"
+    return min(10 + int(estimate.fraction * 80), 90)
+
+
 def run_migrations():
     """Run database migrations and capture output in real-time.
 
     Updates the global state with migration progress.
     """
     global state, migration_running, migrations_executed, seen_migrations, seen_migrations_list
-    global migration_start_time, dynamic_total
+    global migration_start_time
 
     if migrations_executed or migration_running:
         return
 
     # Check if migrations were already done
     if os.path.exists(MIGRATIONS_FLAG):
-        print("[proxy] Migrations already completed (flag exists)")
+        log.info("Migrations already completed (flag exists)")
         migrations_executed = True
         return
 
-    # Wait for container
-    if not wait_for_container_ready():
-        print("[proxy] Cannot run migrations - container not ready")
+    # Wait for container; PHP only matters to the artisan fallback
+    if not wait_for_container_ready(check_php=False):
+        log.warning("Cannot run migrations - container not ready")
+        return
+    inventory = inspect_migrations()
+    if inventory is not None:
+        migration_history.set_inventory(inventory)
+    if inventory is None and not wait_for_container_ready():
+        log.warning("Cannot run migrations - container not ready")
         return
 
     # Check if tables already exist
-    if check_tables_exist():
-        print("[proxy] Tables already exist - skipping migrations")
+    if check_tables_exist(inventory):
+        log.info("Tables already exist - skipping migrations")
         migrations_executed = True
         # Create flag to avoid checking again
         try:
@@ -239,85 +1390,68 @@ def run_migrations():
         state["detail"] = "Démarrage des migrations"
         state["progress"] = 5
 
-    print("[proxy] Starting database migrations...")
+    log.info("Starting database migrations...")
 
     try:
-        # Run migrations with --force flag and capture output
-        process = subprocess.Popen(
-            ["docker", "exec", CONTAINER_NAME, "php", "/var/www/html/artisan",
-             "migrate", "--force", "--no-interaction"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
+        # Run migrations with --force flag and stream their output
+        process = docker_client.exec_stream(
+            CONTAINER_NAME,
+            ["php", "/var/www/html/artisan", "migrate", "--force", "--no-interaction"]
         )
 
         completed_count = 0
-        total_estimated = TOTAL_MIGRATIONS
 
         # Read output line by line
-        for line in iter(process.stdout.readline, ''):
+        for line in process:
             line = line.strip()
             if not line:
                 continue
 
-            print(f"[migration] {line}")
+            migration_log.debug("%s", line)
 
-            # Parse migration progress from output
             # Example: "2016_01_23_195641_add_allocations_table ........................... 1 s DONE"
-            match = re.match(r'(\d{4}_\d{2}_\d{2}_\d+_[\w]+)\s+\.+\s+[\d.]+\s*(?:ms|s)\s+DONE', line)
-            if match:
-                migration_name = match.group(1)
+            parsed = parse_migration_line(line)
+            if parsed.kind == LINE_MIGRATION_DONE:
+                migration_name = parsed.name
                 if migration_name not in seen_migrations:
                     seen_migrations.add(migration_name)
-                    # Extract short name
-                    name_match = re.match(r'\d{4}_\d{2}_\d{2}_\d+_(.*)', migration_name)
-                    if name_match:
-                        short_name = name_match.group(1)
-                        seen_migrations_list.append(short_name)
+                    if parsed.seconds is not None:
+                        metrics.observe("migration_duration_seconds", parsed.seconds)
+                    migration_history.record(migration_name, parsed.seconds)
+                    seen_migrations_list.append(parsed.short_name)
                     completed_count = len(seen_migrations)
 
-                    # Update dynamic total if we're getting close
-                    if completed_count > total_estimated - 10:
-                        total_estimated = completed_count + 20
-                        dynamic_total = total_estimated
-
-                    # Calculate progress (10-90% for migrations)
-                    progress = 10 + int((completed_count / total_estimated) * 80)
-                    progress = min(progress, 90)
-
                     with state_lock:
                         state["migrations_done"] = completed_count
-                        state["migrations_total"] = total_estimated
-                        state["current_migration"] = short_name if name_match else migration_name
+                        state["current_migration"] = parsed.short_name
                         state["completed_migrations"] = list(seen_migrations_list)
-                        state["progress"] = progress
+                        state["progress"] = apply_migration_estimate(completed_count)
                         state["message"] = "Création des tables..."
-                        state["detail"] = f"Table {completed_count}/{total_estimated}"
+                    status_feed.publish()
 
             # Check for "Running migrations" start message
-            elif "running migrations" in line.lower():
+            elif parsed.markers & LOG_MARKER_BITS["running migrations"]:
                 with state_lock:
                     state["message"] = "Exécution des migrations..."
                     state["detail"] = "Démarrage"
                     state["progress"] = 8
 
             # Check for "Nothing to migrate"
-            elif "nothing to migrate" in line.lower():
+            elif parsed.markers & LOG_MARKER_BITS["nothing to migrate"]:
                 with state_lock:
                     state["message"] = "Base de données à jour"
                     state["progress"] = 90
 
-        process.wait()
+        returncode = process.wait()
 
-        if process.returncode == 0:
-            print(f"[proxy] Migrations completed successfully ({completed_count} tables)")
+        if returncode == 0:
+            log.info(f"Migrations completed successfully ({completed_count} tables)")
             # Create flag file
             try:
                 with open(MIGRATIONS_FLAG, 'w') as f:
                     f.write(str(int(time.time())))
             except Exception as e:
-                print(f"[proxy] Could not create migrations flag: {e}")
+                log.warning(f"Could not create migrations flag: {e}")
 
             with state_lock:
                 state["status"] = "optimization"
@@ -327,34 +1461,99 @@ def run_migrations():
                 state["migrations_done"] = completed_count
                 state["current_migration"] = None
         else:
-            print(f"[proxy] Migration failed with code {process.returncode}")
+            log.error(f"Migration failed with code {returncode}")
             with state_lock:
                 state["message"] = "Erreur de migration"
                 state["detail"] = "Vérifiez les logs Docker"
 
     except Exception as e:
-        print(f"[proxy] Migration error: {e}")
+        log.error(f"Migration error: {e}")
         with state_lock:
             state["message"] = "Erreur de migration"
             state["detail"] = str(e)[:50]
     finally:
+        migration_history.save()
         migration_running = False
         migrations_executed = True
+        status_feed.publish()
 
 
-def get_docker_logs(tail=500):
-    """Get Docker logs. Use larger tail to capture all migrations."""
-    try:
-        result = subprocess.run(
-            ["docker", "logs", "--tail", str(tail), CONTAINER_NAME],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        return result.stdout + result.stderr
-    except Exception as e:
-        print(f"[proxy] Error getting logs: {e}")
-        return ""
+class InitStatusReader:
+    """init_status.json from migration-watcher.sh, parsed once per update.
+
+    Each read() costs one stat(): the file is opened and parsed again only
+    when its mtime or size changed, and "missing", "stale" or "invalid"
+    are logged when the file enters that state, not on every tick.
+    """
+
+    def __init__(self, path, max_age=INIT_STATUS_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._signature = None
+        self._data = None
+        self._state = None  # "ok", "missing", "stale" or "invalid", as last logged
+        self._stats = {"reads": 0, "unchanged": 0, "errors": 0}
+
+    def _enter(self, state, message, *args):
+        if state != self._state:
+            self._state = state
+            if state == "invalid":
+                log.warning(message, *args)
+            else:
+                log.debug(message, *args)
+
+    def read(self):
+        """Return the watcher's status dict, or None if missing, stale or invalid."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+                signature = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                self._signature = self._data = None
+                self._enter("missing", "init_status file not found: %s", self.path)
+                return None
+
+            if signature != self._signature:
+                self._signature = signature
+                self._data = None
+                self._stats["reads"] += 1
+                try:
+                    with open(self.path, 'r') as f:
+                        data = json.load(f)
+                    if not isinstance(data, dict):
+                        raise ValueError("not a JSON object")
+                    if data.get('timestamp') is not None:
+                        float(data['timestamp'])
+                except (OSError, TypeError, ValueError) as e:
+                    self._signature = None  # Retry on the next tick
+                    self._stats["errors"] += 1
+                    self._enter("invalid", "Error reading init_status: %s", e)
+                    return None
+                self._data = data
+            else:
+                self._stats["unchanged"] += 1
+
+            if self._data is None:
+                return None
+            # No timestamp: accept anyway
+            timestamp = self._data.get('timestamp')
+            if timestamp is not None:
+                age = time.time() - float(timestamp)
+                if age >= self.max_age:
+                    self._enter("stale", "init_status too old: %.0fs", age)
+                    return None
+            self._enter("ok", "init_status updated by migration-watcher")
+            return self._data
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["state"] = self._state
+            return snapshot
+
+
+init_status_reader = InitStatusReader(INIT_STATUS_FILE)
 
 
 def read_init_status():
@@ -362,26 +1561,7 @@ def read_init_status():
 
     Returns dict with status or None if file doesn't exist or is invalid.
     """
-    try:
-        if os.path.exists(INIT_STATUS_FILE):
-            with open(INIT_STATUS_FILE, 'r') as f:
-                data = json.load(f)
-                # Check if data is recent (within last 60 seconds)
-                # Give more slack since watcher may be slow
-                if 'timestamp' in data:
-                    age = time.time() - data['timestamp']
-                    if age < 60:  # Accept data up to 60 seconds old
-                        return data
-                    else:
-                        print(f"[proxy] init_status too old: {age:.0f}s")
-                else:
-                    # No timestamp, accept anyway
-                    return data
-        else:
-            print(f"[proxy] init_status file not found: {INIT_STATUS_FILE}")
-    except Exception as e:
-        print(f"[proxy] Error reading init_status: {e}")
-    return None
+    return init_status_reader.read()
 
 
 def parse_migrations(logs):
@@ -391,64 +1571,40 @@ def parse_migrations(logs):
       2016_01_23_195641_add_allocations_table ........................... 1 s DONE
       2016_01_23_195851_add_api_keys ............................... 308.07ms DONE
     """
-    global seen_migrations, seen_migrations_list, migration_start_time, dynamic_total
-
-    # Find all completed migrations (lines ending with "DONE")
-    # Pattern: timestamp_name followed by dots and timing, ending with DONE
-    completed_migrations = re.findall(
-        r'(\d{4}_\d{2}_\d{2}_\d+_[\w]+)\s+\.+\s+[\d.]+\s*(?:ms|s)\s+DONE',
-        logs
-    )
+    global seen_migrations, seen_migrations_list, migration_start_time
+
+    # Single pass: completed migrations, and the last one still in progress
+    running = None
+    for line in logs.split('\n'):
+        parsed = parse_migration_line(line)
+        if parsed.kind == LINE_MIGRATION_DONE:
+            if parsed.name not in seen_migrations:
+                seen_migrations.add(parsed.name)
+                seen_migrations_list.append(parsed.short_name)
+                # Start timer on first migration
+                if migration_start_time is None:
+                    migration_start_time = time.time()
+        elif parsed.kind == LINE_MIGRATION_RUNNING:
+            running = parsed
 
-    # Add to our persistent set and list
-    for m in completed_migrations:
-        if m not in seen_migrations:
-            seen_migrations.add(m)
-            # Extract just the name part after the timestamp for the list
-            name_match = re.match(r'\d{4}_\d{2}_\d{2}_\d+_(.*)', m)
-            if name_match:
-                short_name = name_match.group(1)
-                seen_migrations_list.append(short_name)
-            # Start timer on first migration
-            if migration_start_time is None:
-                migration_start_time = time.time()
-
-    # Dynamically adjust total if we've seen more migrations than expected
     completed = len(seen_migrations)
-    if completed > dynamic_total - 10:
-        # We're close to or past the limit, increase estimate
-        dynamic_total = completed + 20
-
-    # Find migration currently in progress (line without DONE yet)
-    # Look for lines that start with a migration pattern but don't have DONE
-    lines = logs.split('\n')
     current = None
-
-    for line in reversed(lines):
-        line = line.strip()
-        # Skip empty lines and completed migrations
-        if not line or 'DONE' in line:
-            continue
-        # Check if it looks like a migration in progress
-        match = re.match(r'(\d{4}_\d{2}_\d{2}_\d+_[\w]+)', line)
-        if match:
-            migration_name = match.group(1)
-            if migration_name not in seen_migrations:
-                # Extract just the name part after the timestamp
-                name_match = re.match(r'\d{4}_\d{2}_\d{2}_\d+_(.*)', migration_name)
-                if name_match:
-                    current = name_match.group(1)
-                break
-
+    if running is not None and running.name not in seen_migrations:
+        current = running.short_name
     # If no in-progress migration, show the last completed one
     if current is None and seen_migrations_list:
         current = seen_migrations_list[-1]
 
-    return completed, dynamic_total, current, list(seen_migrations_list)
+    return completed, migration_history.estimate(completed).total, current, list(seen_migrations_list)
 
 
-def detect_phase(logs):
-    """Detect current startup phase from logs.
+class LogProgressTracker:
+    """Incremental parser for the Panel container log.
+
+    Fed one line at a time by follow_container_logs(), it keeps the phase
+    markers and migration progress that detect_phase() and
+    parse_migrations() derive from a whole log dump, so a monitor tick only
+    costs the lines written since the previous one.
 
     Log patterns from Pelican:
     - "Generating key" -> key generation
@@ -457,47 +1613,209 @@ def detect_phase(logs):
     - "Optimizing Filament" -> filament optimization
     - "entered RUNNING state" -> services started
     """
-    logs_lower = logs.lower()
 
-    # Check for completion indicators (in order of priority)
-    # Supervisord shows services as RUNNING when fully started
-    if "entered running state" in logs_lower:
-        running_count = logs_lower.count("entered running state")
-        if running_count >= 2:  # Both php-fpm and caddy running
-            return "ready", "Services démarrés", 99
+    def __init__(self, on_migration=None):
+        self.on_migration = on_migration  # Called with (name, seconds) for each completed migration
+        self.lock = threading.Lock()
+        self.lines = 0
+        self.markers = 0  # Bitmask of the LOG_MARKERS seen
+        self._programs = set()  # supervisord programs that entered RUNNING state
+        self._migration_lines = False
+        self._seen = set()
+        self.completed = []  # Short names of completed migrations, in order
+        self._current = None
+
+    def feed(self, logs):
+        for line in logs.split('\n'):
+            self.feed_line(line)
+
+    def feed_line(self, line, replayed=False):
+        """Parse one log line; return True when migration progress changed.
+
+        `replayed` lines (the tail read at startup, possibly from an earlier
+        run) count for progress but are not passed to on_migration.
+        """
+        parsed = parse_migration_line(line)
+        self.lines += 1  # Only the log follower feeds log_tracker
+        if parsed is OTHER_LINE:
+            return False
+        with self.lock:
+            self.markers |= parsed.markers
+            if parsed.program is not None:
+                self._programs.add(parsed.program)
+            if parsed.kind in (LINE_MIGRATION_DONE, LINE_MIGRATION_OUTPUT):
+                self._migration_lines = True
+            if parsed.name is None or parsed.name in self._seen:
+                return False
+            if parsed.kind == LINE_MIGRATION_DONE:
+                self._seen.add(parsed.name)
+                self.completed.append(parsed.short_name)
+                if not replayed:
+                    if parsed.seconds is not None:
+                        metrics.observe("migration_duration_seconds", parsed.seconds)
+                    if self.on_migration is not None:
+                        self.on_migration(parsed.name, parsed.seconds)
+                self._current = None
+                return True
+            if parsed.kind == LINE_MIGRATION_RUNNING:
+                self._current = parsed.short_name
+                return True
+        return False
+
+    def phase(self):
+        """Return (phase, message, progress) like detect_phase()."""
+        with self.lock:
+            markers = self.markers
+            # Check for completion indicators (in order of priority)
+            # Supervisord shows services as RUNNING when fully started
+            if len(self._programs) >= 2:  # Both php-fpm and caddy running
+                return "ready", "Services démarrés", 99
+
+            # Filament optimization comes after migrations
+            if markers & LOG_MARKER_BITS["optimizing filament"]:
+                return "optimization", "Optimisation de Filament...", 92
+
+            # Caching
+            if markers & LOG_MARKER_BITS["caching filament"]:
+                return "optimization", "Mise en cache Filament...", 94
+
+            # Check for migrations (look for DONE pattern or "Running migrations")
+            if markers & LOG_MARKER_BITS["running migrations"] or self._migration_lines:
+                return "migrations", None, None  # Progress calculated from migration count
+
+            if markers & LOG_MARKER_BITS["nothing to migrate"]:
+                return "migrations_done", "Tables à jour", 85
+
+            # Preparing database
+            if markers & LOG_MARKER_BITS["preparing database"] or markers & LOG_MARKER_BITS["creating migration table"]:
+                return "migrations", "Préparation de la base...", 8
+
+            # Migrating database header
+            if markers & LOG_MARKER_BITS["migrating database"]:
+                return "migrations", "Démarrage des migrations...", 10
+
+            # Key generation
+            if markers & LOG_MARKER_BITS["generating key"] or markers & LOG_MARKER_BITS["generated app key"]:
+                return "startup", "Génération de la clé...", 5
+
+            # Very early startup
+            if markers & LOG_MARKER_BITS["external vars"]:
+                return "startup", "Initialisation...", 2
+
+            return "startup", "Démarrage du conteneur...", 3
+
+    def migrations(self):
+        """Return (completed_count, completed_names, current_migration)."""
+        with self.lock:
+            current = self._current or (self.completed[-1] if self.completed else None)
+            return len(self.completed), list(self.completed), current
+
 
-    # Filament optimization comes after migrations
-    if "optimizing filament" in logs_lower:
-        return "optimization", "Optimisation de Filament...", 92
+def detect_phase(logs):
+    """Detect current startup phase from a log dump (see LogProgressTracker)."""
+    tracker = LogProgressTracker()
+    tracker.feed(logs)
+    return tracker.phase()
+
+
+# Fallback progress source when migration-watcher.sh writes no init_status.json
+log_tracker = LogProgressTracker(on_migration=migration_history.record)
+log_follower_started = False
+log_fallback_active = False  # Set by monitor_status while the log is the progress source
+
+
+def follow_container_logs():
+    """Feed the Panel container log to log_tracker as it is written.
+
+    Starts by replaying the last LOG_FOLLOW_TAIL lines, then follows from
+    the time the replay started. Replayed DONE lines may come from an
+    earlier run, so they count for progress but stay out of
+    migration_history. When the stream ends (container restarted, dockerd
+    closed it) it resumes from the time of the last line received.
+    """
+    since = None
+    while not shutdown_flag:
+        try:
+            if since is None:
+                started = int(time.time())
+                for line in docker_client.stream_logs(CONTAINER_NAME, tail=LOG_FOLLOW_TAIL, follow=False):
+                    log_tracker.feed_line(line, replayed=True)
+                since = started
+                with state_lock:
+                    if log_fallback_active:
+                        apply_log_migrations()
+                status_feed.publish()
+            lines = docker_client.stream_logs(CONTAINER_NAME, tail='all', since=since)
+            for line in lines:
+                since = int(time.time())
+                if log_tracker.feed_line(line):
+                    with state_lock:
+                        if log_fallback_active:
+                            apply_log_migrations()
+                    status_feed.publish()
+        except Exception as e:
+            log.warning(f"Log follow interrupted: {e}")
+        time.sleep(PANEL_CHECK_INTERVAL)
 
-    # Caching
-    if "caching filament" in logs_lower:
-        return "optimization", "Mise en cache Filament...", 94
 
-    # Check for migrations (look for DONE pattern or "Running migrations")
-    if "running migrations" in logs_lower or re.search(r'\d{4}_\d{2}_\d{2}_\d+_\w+.*DONE', logs):
-        return "migrations", None, None  # Progress calculated from migration count
+def start_log_follower():
+    global log_follower_started
+    if not log_follower_started:
+        log_follower_started = True
+        threading.Thread(target=follow_container_logs, daemon=True).start()
+        log.info("Following container logs")
 
-    if "nothing to migrate" in logs_lower:
-        return "migrations_done", "Tables à jour", 85
 
-    # Preparing database
-    if "preparing database" in logs_lower or "creating migration table" in logs_lower:
-        return "migrations", "Préparation de la base...", 8
+def apply_log_migrations():
+    """Copy migration progress from log_tracker into state (state_lock held).
 
-    # Migrating database header
-    if "migrating database" in logs_lower:
-        return "migrations", "Démarrage des migrations...", 10
+    Returns False when no migration has completed yet.
+    """
+    completed_count, completed_list, current = log_tracker.migrations()
+    if not completed_count:
+        return False
+    progress = apply_migration_estimate(completed_count)
+    state["progress"] = max(progress, state["progress"])
+    state["message"] = "Création des tables..."
+    state["migrations_done"] = completed_count
+    state["current_migration"] = current
+    state["completed_migrations"] = completed_list
+    return True
 
-    # Key generation
-    if "generating key" in logs_lower or "generated app key" in logs_lower:
-        return "startup", "Génération de la clé...", 5
 
-    # Very early startup
-    if "external vars" in logs_lower:
-        return "startup", "Initialisation...", 2
+def apply_init_status(init_status, last_progress):
+    """Copy migration-watcher.sh's status into state (state_lock held).
 
-    return "startup", "Démarrage du conteneur...", 3
+    While migrations run, the total, ETA and progress come from
+    migration_history, as on the other migration sources; the watcher's
+    own (a fixed total of 222) is kept for the other phases.
+    """
+    progress = init_status.get('progress', 0)
+    done = init_status.get('migrations_done', 0)
+    state["message"] = init_status.get('message', 'Initialisation...')
+    state["migrations_done"] = done
+    state["current_migration"] = short_migration_name(init_status.get('current_migration'))
+    if done and progress < WATCHER_MIGRATIONS_OVER_PROGRESS:
+        progress = apply_migration_estimate(done)
+    else:
+        state["migrations_total"] = init_status.get('migrations_total', 0)
+    state["progress"] = max(progress, last_progress)
+
+    # Get completed migrations list from JSON file
+    completed_list = init_status.get('completed_migrations', [])
+    if completed_list:
+        state["completed_migrations"] = completed_list
+    else:
+        # Fallback: build placeholder list from count
+        if done > len(seen_migrations_list):
+            for i in range(len(seen_migrations_list), done):
+                seen_migrations_list.append(f"table_{i+1}")
+        state["completed_migrations"] = list(seen_migrations_list)
+
+    if state["current_migration"]:
+        state["detail"] = f"Table {done}/{state['migrations_total']}"
+    else:
+        state["detail"] = init_status.get('message', '')
 
 
 def get_app_url_host():
@@ -507,34 +1825,27 @@ def get_app_url_host():
     1. Container's pelican-data/.env (persistent data)
     2. panel.env in VAR_DIR (legacy location)
     """
-    # Possible locations for the .env file
-    env_files = [
-        f"{VAR_DIR}/data/pelican-data/.env",  # Container persistent data
-        f"{DATA_ROOT}/pelican-data/.env",      # Alternative path
-        f"{VAR_DIR}/panel.env",                # Legacy location
-    ]
-
-    for env_file in env_files:
-        try:
-            if os.path.exists(env_file):
-                with open(env_file, 'r') as f:
-                    for line in f:
-                        if line.startswith('APP_URL='):
-                            url = line.strip().split('=', 1)[1].strip('"\'')
-                            # Extract host:port from URL like http://192.168.1.47:8080
-                            if '://' in url:
-                                url = url.split('://', 1)[1]
-                            # Remove trailing path
-                            url = url.split('/')[0]
-                            print(f"[proxy] Found APP_URL host: {url} (from {env_file})")
-                            return url
-        except Exception as e:
-            print(f"[proxy] Error reading {env_file}: {e}")
-
-    print("[proxy] Warning: APP_URL not found in any .env file")
+    for _, url in app_url_resolver.urls():
+        # Extract host:port from URL like http://192.168.1.47:8080
+        if '://' in url:
+            url = url.split('://', 1)[1]
+        # Remove trailing path
+        return url.split('/')[0]
     return None
 
 
+def probe_panel_http(path, timeout=PANEL_PROBE_TIMEOUT):
+    """GET `path` on the Panel's internal port; return the HTTP status or None."""
+    conn = http.client.HTTPConnection("127.0.0.1", PANEL_INTERNAL_PORT, timeout=timeout)
+    try:
+        conn.request('GET', path)
+        return conn.getresponse().status
+    except (OSError, http.client.HTTPException):
+        return None
+    finally:
+        conn.close()
+
+
 def check_panel_ready():
     """
     Check if panel is truly ready by verifying HTTP response on internal port.
@@ -542,62 +1853,178 @@ def check_panel_ready():
     Caddy listens on :8080 without host restriction, so no special Host header needed.
     """
     try:
-        # Method 1: Simple socket connection + HTTP request using subprocess
-        # This is more reliable than urllib which can have issues with empty responses
-        cmd = ["curl", "-s", "-o", "/dev/null", "-w", "%{http_code}",
-               "--connect-timeout", "3", "--max-time", "5",
-               f"http://127.0.0.1:{PANEL_INTERNAL_PORT}/"]
-
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        http_code = result.stdout.strip()
-        if http_code in ("200", "301", "302", "303", "307", "308"):
-            print(f"[proxy] Panel ready check: HTTP {http_code}")
+        # Method 1: Root page answers (directly or with a redirect)
+        http_code = probe_panel_http("/")
+        if http_code in (200, 301, 302, 303, 307, 308):
+            log.debug("Panel ready check: HTTP %s", http_code)
             return True
 
         # Method 2: Check health endpoint
-        cmd = ["curl", "-s", "-o", "/dev/null", "-w", "%{http_code}",
-               "--connect-timeout", "3", "--max-time", "5",
-               f"http://127.0.0.1:{PANEL_INTERNAL_PORT}/api/health"]
-
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        http_code = result.stdout.strip()
-        if http_code == "200":
-            print(f"[proxy] Panel health check: HTTP {http_code}")
+        http_code = probe_panel_http("/api/health")
+        if http_code == 200:
+            log.debug("Panel health check: HTTP %s", http_code)
             return True
 
         return False
 
     except Exception as e:
-        print(f"[proxy] Health check error: {e}")
+        log.debug("Health check error: %s", e)
         return False
 
 
-def monitor_status():
-    """Monitor Docker container status and update state.
+class ProbeRunner:
+    """Runs the monitor's independent probes concurrently, each with a deadline.
 
-    Priority:
-    1. Run migrations if tables don't exist (executed once at startup)
-    2. Read init_status.json from migration-watcher.sh (most accurate for migrations)
-    3. Fallback to Docker logs parsing
-    4. Check panel health for final ready state
+    A probe still running when its deadline passes counts as a timeout and
+    yields its default for that tick. It is not started again until it
+    finishes, so a hung probe never piles up threads.
     """
-    global state, shutdown_flag, seen_migrations, seen_migrations_list, migration_start_time
-    global migrations_executed, migration_running
 
-    consecutive_ready = 0  # Need multiple checks to confirm ready
+    def __init__(self, workers=3):
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="monitor-probe")
+        self._running = {}  # name -> future that overran its deadline
+        self._lock = threading.Lock()
+        self._stats = {"ticks": 0, "last_tick_ms": 0.0, "max_tick_ms": 0.0,
+                       "avg_tick_ms": 0.0, "probe_timeouts": {}, "probe_skips": {}}
+
+    def run(self, probes, deadline=None):
+        """Run {name: (func, default)}; return {name: result or default}."""
+        if deadline is None:
+            deadline = MONITOR_PROBE_DEADLINE
+        started = time.monotonic()
+        futures, results = {}, {}
+        for name, (func, default) in probes.items():
+            overrunning = self._running.get(name)
+            if overrunning is not None and not overrunning.done():
+                self._count("probe_skips", name)
+                results[name] = default
+                continue
+            self._running.pop(name, None)
+            futures[name] = self._executor.submit(metrics.timed("monitor_probe_seconds", probe=name)(func))
+        for name, future in futures.items():
+            default = probes[name][1]
+            try:
+                results[name] = future.result(timeout=max(0, started + deadline - time.monotonic()))
+            except concurrent.futures.TimeoutError:
+                log.warning(f"Monitor probe {name} exceeded {deadline}s")
+                self._count("probe_timeouts", name)
+                self._running[name] = future
+                results[name] = default
+            except Exception as e:
+                log.warning(f"Monitor probe {name} failed: {e}")
+                results[name] = default
+        return results
+
+    def _count(self, key, name):
+        with self._lock:
+            self._stats[key][name] = self._stats[key].get(name, 0) + 1
+
+    def record_tick(self, seconds):
+        """Record the duration of one monitor iteration (probes and state update)."""
+        metrics.observe("monitor_tick_seconds", seconds)
+        ms = seconds * 1000
+        with self._lock:
+            stats = self._stats
+            stats["ticks"] += 1
+            stats["last_tick_ms"] = round(ms, 1)
+            stats["max_tick_ms"] = round(max(stats["max_tick_ms"], ms), 1)
+            # Exponential moving average over roughly the last 10 ticks
+            stats["avg_tick_ms"] = round(ms if stats["ticks"] == 1 else stats["avg_tick_ms"] * 0.9 + ms * 0.1, 1)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["probe_timeouts"] = dict(stats["probe_timeouts"])
+            stats["probe_skips"] = dict(stats["probe_skips"])
+        return stats
+
+
+monitor_probes = ProbeRunner()
+
+
+class MonitorSchedule:
+    """Delay between monitor ticks.
+
+    MONITOR_FAST_INTERVAL while the state changes or readiness is being
+    confirmed, then PANEL_CHECK_INTERVAL growing by half each stable tick
+    up to MONITOR_MAX_INTERVAL, and a MONITOR_IDLE_INTERVAL heartbeat once
+    the Panel is ready. rearm() (proxied requests failing) wakes the
+    monitor immediately and goes back to fast polling.
+    """
+
+    BACKOFF_FACTOR = 1.5
+
+    def __init__(self):
+        self.interval = MONITOR_FAST_INTERVAL
+        self._wakeup = threading.Event()
+        self._rearmed = False
+        self._rearms = 0
+
+    def next_interval(self, changed, confirming, ready):
+        """Pick the next interval from what the tick observed."""
+        if changed or confirming or self._rearmed:
+            self.interval = MONITOR_FAST_INTERVAL
+        elif ready:
+            self.interval = MONITOR_IDLE_INTERVAL
+        elif self.interval < PANEL_CHECK_INTERVAL:
+            self.interval = PANEL_CHECK_INTERVAL
+        else:
+            self.interval = min(self.interval * self.BACKOFF_FACTOR, MONITOR_MAX_INTERVAL)
+        self._rearmed = False
+        return self.interval
+
+    def wait(self):
+        """Sleep until the next tick is due or rearm() is called."""
+        self._wakeup.wait(self.interval)
+        self._wakeup.clear()
+
+    def rearm(self, reason):
+        if not self._wakeup.is_set():
+            log.info(f"Monitor re-armed: {reason}")
+            self._rearms += 1
+            self._rearmed = True
+            self._wakeup.set()
+
+    def snapshot(self):
+        return {"interval": self.interval, "rearms": self._rearms}
+
+
+monitor_schedule = MonitorSchedule()
+
+
+def monitor_status():
+    """Monitor Docker container status and update state.
+
+    Priority:
+    1. Run migrations if tables don't exist (executed once at startup)
+    2. Read init_status.json from migration-watcher.sh (most accurate for migrations)
+    3. Fallback to Docker logs parsing
+    4. Check panel health for final ready state
+    """
+    global state, shutdown_flag, seen_migrations, seen_migrations_list, migration_start_time
+    global migrations_executed, migration_running, log_fallback_active
+
+    consecutive_ready = 0  # Need multiple checks to confirm ready
     last_progress = 0
     migration_check_done = False
+    last_fingerprint = None
+    container_status = ""
 
     while not shutdown_flag:
+        tick_started = time.monotonic()
         try:
+            # Independent probes run concurrently, outside state_lock
+            probes = {"container": (lambda: docker_client.container_status(CONTAINER_NAME), ""),
+                      "started_at": (lambda: docker_client.container_started_at(CONTAINER_NAME), None)}
+            if not migration_running:
+                probes["init_status"] = (read_init_status, None)
+                probes["panel"] = (check_panel_ready, False)
+            results = monitor_probes.run(probes)
+
             # Check if container is running
-            result = subprocess.run(
-                ["docker", "ps", "--filter", f"name={CONTAINER_NAME}", "--format", "{{.Status}}"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            container_status = result.stdout.strip()
+            container_status = results["container"]
+            asset_cache.track_container(results["started_at"])
 
             # PRIORITY 0: Run migrations if not done yet (runs once in background thread)
             if container_status and not migration_check_done and not migration_running:
@@ -605,9 +2032,10 @@ def monitor_status():
                 # Run migrations in a separate thread to not block status updates
                 migration_thread = threading.Thread(target=run_migrations, daemon=True)
                 migration_thread.start()
-                print("[proxy] Started migration thread")
+                log.info("Started migration thread")
 
             with state_lock:
+                log_fallback_active = False
                 if not container_status:
                     state["status"] = "waiting"
                     state["message"] = "En attente du conteneur..."
@@ -622,32 +2050,11 @@ def monitor_status():
                     last_progress = state["progress"]
                 else:
                     # PRIORITY 1: Read init_status.json from migration-watcher.sh
-                    init_status = read_init_status()
+                    init_status = results.get("init_status")
 
                     if init_status:
                         # Use data from migration-watcher.sh
-                        progress = init_status.get('progress', 0)
-                        state["progress"] = max(progress, last_progress)
-                        state["message"] = init_status.get('message', 'Initialisation...')
-                        state["migrations_done"] = init_status.get('migrations_done', 0)
-                        state["migrations_total"] = init_status.get('migrations_total', 0)
-                        state["current_migration"] = init_status.get('current_migration')
-
-                        # Get completed migrations list from JSON file
-                        completed_list = init_status.get('completed_migrations', [])
-                        if completed_list:
-                            state["completed_migrations"] = completed_list
-                        else:
-                            # Fallback: build placeholder list from count
-                            if state["migrations_done"] > len(seen_migrations_list):
-                                for i in range(len(seen_migrations_list), state["migrations_done"]):
-                                    seen_migrations_list.append(f"table_{i+1}")
-                            state["completed_migrations"] = list(seen_migrations_list)
-
-                        if state["current_migration"]:
-                            state["detail"] = f"Table {state['migrations_done']}/{state['migrations_total']}"
-                        else:
-                            state["detail"] = init_status.get('message', '')
+                        apply_init_status(init_status, last_progress)
 
                         # Check if migration-watcher says panel is ready
                         if init_status.get('panel_ready'):
@@ -656,9 +2063,11 @@ def monitor_status():
                             consecutive_ready = 0
 
                     else:
-                        # FALLBACK: Parse Docker logs (less accurate)
-                        logs = get_docker_logs(tail=1000)
-                        phase, phase_message, phase_progress = detect_phase(logs)
+                        # FALLBACK: Follow Docker logs (less accurate)
+                        log_fallback_active = True
+                        start_log_follower()
+                        phase, phase_message, phase_progress = log_tracker.phase()
+                        state["current_migration"] = None
 
                         if phase == "optimization":
                             state["progress"] = max(phase_progress or 90, last_progress)
@@ -670,17 +2079,18 @@ def monitor_status():
                             state["message"] = phase_message
                             state["detail"] = "Vérification finale..."
 
+                        elif phase == "migrations" and log_tracker.completed:
+                            apply_log_migrations()  # Progress calculated from migration count
+
                         else:
                             state["progress"] = max(phase_progress or 5, last_progress)
                             state["message"] = phase_message or "Démarrage..."
                             state["detail"] = "Initialisation en cours"
 
-                        state["current_migration"] = None
-
                     last_progress = state["progress"]
 
                     # Final check: is panel actually ready?
-                    if check_panel_ready():
+                    if results.get("panel"):
                         consecutive_ready += 1
                         if consecutive_ready >= 3:  # 3 successful checks = truly ready
                             state["panel_ready"] = True
@@ -696,19 +2106,1666 @@ def monitor_status():
                         state["status"] = "initializing"
 
         except Exception as e:
-            print(f"[proxy] Monitor error: {e}")
+            log.error(f"Monitor error: {e}")
             with state_lock:
                 state["detail"] = f"Erreur: {str(e)[:40]}"
 
-        time.sleep(PANEL_CHECK_INTERVAL)
+        status_feed.publish()
+        monitor_probes.record_tick(time.monotonic() - tick_started)
+
+        # Poll fast while something moves, back off while it doesn't
+        with state_lock:
+            ready = state["panel_ready"]
+            fingerprint = (state["status"], state["progress"], state["message"],
+                           state["migrations_done"], ready, bool(container_status))
+        monitor_schedule.next_interval(fingerprint != last_fingerprint,
+                                       0 < consecutive_ready < 3, ready)
+        last_fingerprint = fingerprint
+        monitor_schedule.wait()
+
+
+class CircuitBreaker:
+    """Stops sending requests to a Panel that no longer accepts connections.
+
+    After `threshold` consecutive connect failures (connection refused,
+    or no connection within UPSTREAM_CONNECT_TIMEOUT) the circuit opens.
+    Errors once connected (a slow request timing out, a reset, a client
+    abort) say nothing about the Panel being down and are not counted.
+    panel_ready is cleared, so
+    requests get the loading page (503 for HEAD) at once instead of waiting
+    for UPSTREAM_TIMEOUT, and the monitor resumes progress reporting. A
+    background thread probes the Panel every `probe_interval` seconds
+    (half-open); a successful probe or proxied request closes the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold=BREAKER_FAILURE_THRESHOLD, probe_interval=BREAKER_PROBE_INTERVAL):
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._prober = None
+        self._lock = threading.Lock()
+        self._stats = {"failures": 0, "opens": 0, "closes": 0}
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self.state == self.CLOSED:
+                return
+        self._close("proxied request succeeded")
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._stats["failures"] += 1
+            if self.state != self.CLOSED or self._failures < self.threshold:
+                return
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._stats["opens"] += 1
+            if self._prober is None or not self._prober.is_alive():
+                self._prober = threading.Thread(target=self._probe_loop, daemon=True)
+                self._prober.start()
+        log.warning(f"Circuit open after {self.threshold} failed connects, serving the loading page")
+        with state_lock:
+            state["panel_ready"] = False
+            state["status"] = "initializing"
+            state["message"] = "Reconnexion au panel..."
+            state["detail"] = "Le panel ne répond plus, nouvelle tentative en cours"
+        status_feed.publish()
+        monitor_schedule.rearm("circuit open")
+
+    def _probe_loop(self):
+        while not shutdown_flag:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                if self.state == self.CLOSED:
+                    return
+                self.state = self.HALF_OPEN
+            if check_panel_ready():
+                self._close("probe succeeded")
+                return
+            with self._lock:
+                if self.state == self.HALF_OPEN:
+                    self.state = self.OPEN
+
+    def _close(self, reason):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            self.state = self.CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._stats["closes"] += 1
+        log.info(f"Circuit closed: {reason}")
+        with state_lock:
+            state["panel_ready"] = True
+            state["status"] = "ready"
+            state["message"] = "Panel prêt !"
+            state["detail"] = "Redirection..."
+            state["progress"] = 100
+        status_feed.publish()
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["state"] = self.state
+            stats["consecutive_failures"] = self._failures
+            if self._opened_at is not None:
+                stats["open_seconds"] = round(time.monotonic() - self._opened_at, 1)
+        return stats
+
+
+upstream_breaker = CircuitBreaker()
+
+
+class UpstreamConnection(http.client.HTTPConnection):
+    """HTTPConnection giving up on connect() after `connect_timeout` seconds."""
+
+    def __init__(self, host, port, timeout, connect_timeout=UPSTREAM_CONNECT_TIMEOUT):
+        super().__init__(host, port, timeout=timeout)
+        self.connect_timeout = connect_timeout
+
+    def connect(self):
+        timeout = self.timeout
+        self.timeout = min(self.connect_timeout, timeout)
+        try:
+            with metrics.timer("upstream_connect_seconds"):
+                super().connect()
+        finally:
+            self.timeout = timeout
+        self.sock.settimeout(timeout)
+
+
+class UpstreamPool:
+    """Bounded pool of persistent HTTP/1.1 connections to the Panel (Caddy).
+
+    A connection goes back to the pool once its response has been fully read
+    and is reused by the next request, whichever handler thread sends it.
+    Idle connections are evicted after `idle_timeout` seconds. Failures to
+    open a connection and successful responses are reported to `breaker`.
+    """
+
+    # Errors meaning a kept-alive connection was closed by Caddy while idle
+    STALE_ERRORS = (ConnectionError, http.client.BadStatusLine)
+
+    def __init__(self, host, port, max_size=UPSTREAM_POOL_SIZE,
+                 idle_timeout=UPSTREAM_POOL_IDLE_TIMEOUT, timeout=UPSTREAM_TIMEOUT, breaker=None):
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.breaker = breaker
+        self._idle = []  # (connection, last_used) - most recently used last
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "retries": 0, "evictions": 0}
+
+    def acquire(self):
+        """Return (connection, reused) - an idle pooled connection if possible."""
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if now - last_used < self.idle_timeout:
+                    self._stats["hits"] += 1
+                    return conn, True
+                self._stats["evictions"] += 1
+                conn.close()
+            self._stats["misses"] += 1
+        return self._connect(), False
+
+    def _connect(self):
+        return UpstreamConnection(self.host, self.port, self.timeout)
+
+    def release(self, conn, response):
+        """Give a connection back once `response` has been fully read."""
+        if not response.isclosed() and response.length == 0:
+            response.close()  # read1() leaves a fully read body open
+        if response.will_close or not response.isclosed() or conn.sock is None:
+            conn.close()
+            return
+        now = time.monotonic()
+        with self._lock:
+            # Oldest connections sit at the front of the list
+            while self._idle and now - self._idle[0][1] >= self.idle_timeout:
+                self._idle.pop(0)[0].close()
+                self._stats["evictions"] += 1
+            if len(self._idle) >= self.max_size:
+                self._stats["evictions"] += 1
+                conn.close()
+                return
+            self._idle.append((conn, now))
+
+    def clear(self):
+        """Close every idle connection (e.g. after Caddy restarted)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+    def request(self, method, path, headers, body=None, body_length=None):
+        """Send a request upstream and return (connection, response).
+
+        `headers` is a list of (name, value) tuples sent as-is. `body` is
+        either bytes or an iterable of chunks; an iterable is streamed with
+        `body_length` as Content-Length, or chunked when that is None.
+
+        If a reused connection turns out to be stale, the pool is flushed and
+        the request is retried once on a fresh connection. A streamed body
+        can't be replayed, so it always gets a fresh connection instead.
+        The caller must read the response and then call release().
+        """
+        streamed = body is not None and not isinstance(body, bytes)
+        retried = False
+        while True:
+            if retried or streamed:
+                conn, reused = self._connect(), False
+            else:
+                conn, reused = self.acquire()
+            if not reused:
+                try:
+                    conn.connect()
+                except OSError:
+                    conn.close()
+                    self._record_failure()
+                    raise
+            try:
+                started = time.perf_counter()
+                conn.putrequest(method, path, skip_host=True, skip_accept_encoding=True)
+                for name, value in headers:
+                    conn.putheader(name, value)
+                if not streamed and body is not None:
+                    conn.putheader('Content-Length', str(len(body)))
+                elif streamed and body_length is not None:
+                    conn.putheader('Content-Length', str(body_length))
+                elif streamed:
+                    conn.putheader('Transfer-Encoding', 'chunked')
+                conn.endheaders(body, encode_chunked=streamed and body_length is None)
+                response = conn.getresponse()
+                metrics.observe("upstream_ttfb_seconds", time.perf_counter() - started)
+            except self.STALE_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+                with self._lock:
+                    self._stats["retries"] += 1
+                self.clear()
+                retried = True
+                continue
+            except Exception:
+                conn.close()
+                raise
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return conn, response
+
+    def _record_failure(self):
+        if self.breaker is not None:
+            self.breaker.record_failure()
+
+    def snapshot(self):
+        """Return pool counters for the status API."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = len(self._idle)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+upstream_pool = None  # UpstreamPool, created in main() once ports are known
+http_server = None  # Serving engine (ThreadedTCPServer or AsyncProxyServer), set in main()
+
+
+class RequestBodyTooLarge(Exception):
+    """A client request body exceeds MAX_REQUEST_BODY_SIZE."""
+
+
+class ClientBodyError(Exception):
+    """A client request body is malformed, cut short or stalled.
+
+    Raised only while reading the body from the client: it is answered with
+    `status` and never counted as a Panel failure by the circuit breaker.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class StreamingRewriter:
+    r"""Single-pass rewriter for proxied HTML and JSON bodies.
+
+    Localhost URLs generated by the container (http://127.0.0.1:PORT/...),
+    plain or JSON-escaped as in Livewire payloads (http:\/\/127.0.0.1:PORT\/),
+    become relative paths. When `inject` is given, it is inserted before
+    the first </head>. The last HOLD bytes of each chunk are carried over
+    so matches spanning chunk boundaries are still rewritten.
+    """
+
+    # Longest possible match is https:\/\/127.0.0.1:65535\/ (29 bytes)
+    HOLD = 64
+    PATTERN = re.compile(
+        rb'https?://(?:127\.0\.0\.1|localhost)(?::\d{1,5})?/'
+        rb'|https?:\\/\\/(?:127\.0\.0\.1|localhost)(?::\d{1,5})?\\/'
+        rb'|</head>'
+    )
+
+    def __init__(self, inject=None):
+        self._inject = inject
+        self._carry = b''
+
+    def _replace(self, match):
+        text = match.group()
+        if text == b'</head>':
+            if self._inject is None:
+                return text
+            inject, self._inject = self._inject, None
+            return inject + text
+        # JSON-escaped URLs end with '\/', plain ones with '/'
+        return b'\\/' if text.endswith(b'\\/') else b'/'
+
+    def feed(self, data):
+        """Rewrite a chunk, returning the bytes that are safe to send."""
+        buf = self._carry + data
+        safe = len(buf) - self.HOLD
+        out = []
+        pos = 0
+        for match in self.PATTERN.finditer(buf):
+            if match.start() >= safe:
+                break
+            out.append(buf[pos:match.start()])
+            out.append(self._replace(match))
+            pos = match.end()
+        cut = max(pos, safe)
+        out.append(buf[pos:cut])
+        self._carry = buf[cut:]
+        return b''.join(out)
+
+    def flush(self):
+        """Rewrite and return whatever is still held back."""
+        buf, self._carry = self._carry, b''
+        return self.PATTERN.sub(self._replace, buf)
+
+# Headers that only apply to a single hop and must not be forwarded
+HOP_BY_HOP_HEADERS = ('connection', 'keep-alive', 'proxy-connection', 'te',
+                      'trailer', 'transfer-encoding', 'upgrade')
+
+
+# Built-in loading page served when LOADING_HTML_PATH is missing
+FALLBACK_LOADING_HTML = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Pelican Panel</title>
+<style>
+body{background:#1a1a2e;color:#fff;font-family:system-ui,sans-serif;
+display:flex;justify-content:center;align-items:center;height:100vh;margin:0}
+.c{text-align:center;max-width:500px;padding:40px}
+.logo{font-size:2.5rem;font-weight:600;margin-bottom:40px;color:#4fc3f7}
+.bar-bg{height:6px;background:rgba(255,255,255,0.1);border-radius:3px;margin-bottom:20px}
+.bar{height:100%;background:#4fc3f7;border-radius:3px;width:0%;transition:width 0.3s}
+.msg{font-size:1.1rem;margin:15px 0}
+.detail{color:rgba(255,255,255,0.6);font-size:0.9rem}
+.migration{color:#4fc3f7;font-size:0.85rem;margin-top:10px;font-family:monospace}
+</style></head>
+<body><div class="c">
+<div class="logo">PELICAN</div>
+<div class="bar-bg"><div class="bar" id="bar"></div></div>
+<div class="msg" id="msg">Chargement...</div>
+<div class="detail" id="detail"></div>
+<div class="migration" id="migration"></div>
+</div>
+<script>
+var v=0;
+async function update(){
+var t=Date.now(),changed=false;
+try{
+const r=await fetch('/api/loading-status?since='+v);
+const d=await r.json();
+v=d.version;
+if(!d.unchanged){
+changed=true;
+document.getElementById('bar').style.width=d.progress+'%';
+document.getElementById('msg').textContent=d.message||'Chargement...';
+document.getElementById('detail').textContent=d.detail||'';
+document.getElementById('migration').textContent=d.current_migration?'→ '+d.current_migration:'';
+if(d.panel_ready){location.reload();return;}
+}
+}catch(e){}
+setTimeout(update,changed||Date.now()-t>=1000?0:1500);}
+update();
+</script></body></html>'''.encode('utf-8')
+
+# JavaScript to inject into HTML pages for iframe navigation fix
+# Note: Use regular string + encode() to support non-ASCII characters
+IFRAME_FIX_SCRIPT = '''<script>
+(function(){
+    // Fix Livewire/Filament navigation in iframe for Pelican installer
+    var isInstaller = window.location.pathname.indexOf('/installer') !== -1;
+
+    if(isInstaller){
+        console.log('[Pelican] Installer page detected, watching for completion...');
+
+        // Watch for clicks on Finish/Terminer buttons
+        document.addEventListener('click', function(e){
+            var btn = e.target.closest('button');
+            if(!btn) return;
+
+            var text = btn.textContent || btn.innerText || '';
+            // Match: Finish, Terminé, Terminer, Complete, Done
+            if(text.match(/finish|termin|complete|done/i)){
+                console.log('[Pelican] Finish button clicked: ' + text);
+
+                // Force redirect after delay (give Livewire time to process)
+                setTimeout(function(){
+                    console.log('[Pelican] Forcing redirect to admin panel...');
+                    window.location.href = './';
+                }, 2500);
+            }
+        }, true);
+
+        // Also monitor for wizard disappearing (backup detection)
+        var wizardGone = false;
+        setInterval(function(){
+            var wizardForm = document.querySelector('.fi-wizard, [x-data*="wizard"], form[wire\\:submit]');
+            var successMsg = document.body.innerHTML.match(/success|completed|bienvenue|welcome/i);
+
+            if(!wizardGone && !wizardForm && successMsg){
+                wizardGone = true;
+                console.log('[Pelican] Wizard completed (form gone + success detected)');
+                setTimeout(function(){ window.location.href = './'; }, 1000);
+            }
+        }, 1000);
+    }
+
+    // Intercept absolute URL redirects and make them relative (for CGI proxy)
+    var origHref = Object.getOwnPropertyDescriptor(window.location.__proto__, 'href');
+    if(origHref && origHref.set){
+        Object.defineProperty(window.location, 'href', {
+            set: function(url){
+                if(typeof url === 'string' && url.charAt(0) === '/'){
+                    url = '.' + url;
+                    console.log('[Pelican] Rewriting redirect to: ' + url);
+                }
+                return origHref.set.call(this, url);
+            },
+            get: origHref.get
+        });
+    }
+})();
+</script>'''.encode('utf-8')
+
+
+# ===========================================
+# Routing shared by the serving engines
+# ===========================================
+
+# A complete response for a route answered by the proxy itself. `page` is
+# set for cacheable pages: the engines then call conditional_response()
+# to pick the ETag, encoding and 304 for the request.
+LocalResponse = collections.namedtuple(
+    'LocalResponse', ('status', 'content_type', 'body', 'cache_control', 'headers', 'page'),
+    defaults=(None,))
+
+# CORS headers allowing cross-origin requests from DSM
+CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type'),
+)
+
+
+# Local routes reading the request body (others drain it)
+BODY_ROUTES = ("wings_save", "log_level_set")
+
+
+def route_request(method, path, panel_ready):
+    """Name the route serving a request.
+
+    Both serving engines dispatch on this name so they expose the same
+    endpoints. "panel" goes to the Panel (or the instructions page), every
+    other route is answered locally by build_local_response().
+    """
+    path, _, query = path.partition('?')
+    if path == "/api/loading-status":
+        return "status_feed" if status_since(query) is not None else "status"
+    if path in ("/wings-config", "/wings-config/"):
+        return "wings_page"
+    if path == "/api/wings/status":
+        return "wings_status"
+    if path == "/api/metrics":
+        return "metrics"
+    if path == "/api/log-level":
+        return {"OPTIONS": "cors_preflight", "GET": "log_level",
+                "POST": "log_level_set"}.get(method, "method_not_allowed")
+    if path == "/api/wings/config":
+        return {"OPTIONS": "cors_preflight", "GET": "wings_config",
+                "POST": "wings_save"}.get(method, "method_not_allowed")
+    if panel_ready:
+        return "panel"
+    return "loading_head" if method == 'HEAD' else "loading"
+
+
+def build_local_response(route, body=None):
+    """Build the LocalResponse of a route answered by the proxy itself.
+
+    `body` is the request body, only read for BODY_ROUTES. Some routes call
+    docker or read files, so the asyncio engine runs this in an executor.
+    """
+    if route == "status":
+        return LocalResponse(200, 'application/json', get_status_json(), 'no-cache',
+                             (('Access-Control-Allow-Origin', '*'),))
+    if route == "metrics":
+        return LocalResponse(200, 'text/plain; version=0.0.4; charset=utf-8', metrics.render(),
+                             'no-cache', ())
+    if route == "wings_page":
+        page = page_cache.get('wings_config', lambda: get_wings_config_html().encode('utf-8'))
+        return LocalResponse(200, 'text/html; charset=utf-8', page.body, 'no-cache', (), page)
+    if route == "wings_status":
+        status = check_wings_status()
+        status["success"] = True
+        return _json_response(status, CORS_HEADERS)
+    if route == "wings_config":
+        return _json_response({"success": True, "config": get_wings_config()}, CORS_HEADERS)
+    if route == "wings_save":
+        return _json_response(handle_wings_config_save(body), CORS_HEADERS)
+    if route == "log_level":
+        return _json_response({"success": True, "level": log_manager.level()}, CORS_HEADERS)
+    if route == "log_level_set":
+        return _json_response(handle_log_level_set(body), CORS_HEADERS)
+    if route == "cors_preflight":
+        return LocalResponse(200, None, b'', None, CORS_HEADERS)
+    if route == "method_not_allowed":
+        return LocalResponse(405, 'application/json', b'{"error": "Method not allowed"}', None,
+                             (('Allow', 'GET, POST, OPTIONS'),) + CORS_HEADERS)
+    if route == "loading_head":
+        # HEAD health checks while the Panel is starting
+        return LocalResponse(503, 'text/html', b'', None, (('Retry-After', '5'),))
+    # no-cache (not no-store) so browsers revalidate with If-None-Match
+    page = load_loading_page()
+    return LocalResponse(200, 'text/html; charset=utf-8', page.body, 'no-cache', (), page)
+
+
+def _json_response(data, headers=()):
+    return LocalResponse(200, 'application/json', json.dumps(data).encode('utf-8'),
+                         'no-cache', headers)
+
+
+def get_status_json():
+    """Serialize the current state for /api/loading-status."""
+    with state_lock:
+        status_data = dict(state)
+        status_data["elapsed_seconds"] = int(time.time() - state["start_time"])
+    if upstream_pool is not None:
+        status_data["upstream_pool"] = upstream_pool.snapshot()
+    if http_server is not None:
+        status_data["server"] = http_server.snapshot()
+    status_data["status_feed"] = status_feed.snapshot()
+    status_data["page_cache"] = page_cache.snapshot()
+    status_data["app_url"] = app_url_resolver.snapshot()
+    status_data["upstream_breaker"] = upstream_breaker.snapshot()
+    status_data["coalescing"] = request_coalescer.snapshot()
+    status_data["asset_cache"] = asset_cache.snapshot()
+    status_data["monitor"] = monitor_probes.snapshot()
+    status_data["monitor"].update(monitor_schedule.snapshot())
+    status_data["migration_timing"] = migration_history.snapshot()
+    status_data["init_status"] = init_status_reader.snapshot()
+    status_data["wings_apply"] = wings_applier.snapshot()
+    status_data["logging"] = log_manager.snapshot()
+    return json.dumps(status_data).encode('utf-8')
+
+
+class StatusFeed:
+    """Versioned snapshots of `state` for long-polling loading pages.
+
+    publish() is called after state updates and only creates a new version
+    when something changed. Each version is serialized once and its bytes
+    are shared by every client. A client passing ?since=<version> waits
+    until a newer version exists and then only receives the migrations
+    completed since its version.
+    """
+
+    def __init__(self, history=STATUS_FEED_HISTORY):
+        self._cond = threading.Condition()
+        self.version = 0
+        self._snapshot = None
+        self._full = b''
+        self._deltas = {}  # completed_migrations offset -> delta bytes, current version only
+        self._history = collections.OrderedDict()  # version -> (completed count, last completed)
+        self._history_size = history
+        self._async_waiters = []  # (loop, future) of asyncio engine long-polls
+        self._stats = {"versions": 0, "full": 0, "deltas": 0, "unchanged": 0}
+
+    def publish(self):
+        """Snapshot `state`; start a new version and wake waiters if it changed."""
+        with state_lock:
+            snapshot = dict(state)
+            snapshot["completed_migrations"] = list(state["completed_migrations"])
+        with self._cond:
+            if snapshot == self._snapshot:
+                return
+            self._snapshot = snapshot
+            self.version += 1
+            self._stats["versions"] += 1
+            completed = snapshot["completed_migrations"]
+            self._history[self.version] = (len(completed), completed[-1] if completed else None)
+            while len(self._history) > self._history_size:
+                self._history.popitem(last=False)
+            self._full = self._serialize(snapshot)
+            self._deltas = {}
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve_future, future)
+
+    def _serialize(self, data):
+        data = dict(data)
+        data["version"] = self.version
+        data["elapsed_seconds"] = int(time.time() - data["start_time"])
+        return json.dumps(data).encode('utf-8')
+
+    def response(self, since):
+        """Body for a client at version `since`: delta, full snapshot or unchanged."""
+        with self._cond:
+            if since == self.version:
+                self._stats["unchanged"] += 1
+                return json.dumps({"version": self.version, "unchanged": True}).encode('utf-8')
+            completed = self._snapshot["completed_migrations"]
+            known = self._history.get(since)
+            # Deltas only apply while the list has grown from the client's version
+            if known is None or known[0] > len(completed) or (known[0] and completed[known[0] - 1] != known[1]):
+                self._stats["full"] += 1
+                return self._full
+            offset = known[0]
+            self._stats["deltas"] += 1
+            if offset not in self._deltas:
+                delta = dict(self._snapshot)
+                delta["delta"] = True
+                delta["completed_offset"] = offset
+                delta["completed_migrations"] = completed[offset:]
+                self._deltas[offset] = self._serialize(delta)
+            return self._deltas[offset]
+
+    def wait(self, since, timeout, give_up=None):
+        """Block until a version newer than `since` exists, `timeout` expires,
+        or `give_up()` returns True (checked twice a second)."""
+        if not self.version:
+            self.publish()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.version == since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (give_up is not None and give_up()):
+                    return
+                self._cond.wait(min(0.5, remaining))
+
+    async def wait_async(self, since, timeout):
+        """wait() for the asyncio engine, without blocking the event loop."""
+        if not self.version:
+            self.publish()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._cond:
+            if self.version != since:
+                return
+            self._async_waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self._cond:
+                if (loop, future) in self._async_waiters:
+                    self._async_waiters.remove((loop, future))
+
+    def snapshot(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["version"] = self.version
+            stats["async_waiters"] = len(self._async_waiters)
+        return stats
+
+
+def _resolve_future(future):
+    if not future.done():
+        future.set_result(None)
+
+
+status_feed = StatusFeed()
+
+
+def status_since(query):
+    """Version passed as ?since=N, None when absent or invalid."""
+    values = urllib.parse.parse_qs(query).get('since')
+    try:
+        return int(values[0]) if values else None
+    except ValueError:
+        return None
+
+
+def build_status_feed_response(since):
+    """LocalResponse for /api/loading-status?since=N, once waiting is done."""
+    return LocalResponse(200, 'application/json', status_feed.response(since), 'no-cache',
+                         (('Access-Control-Allow-Origin', '*'),))
+
+
+CachedPage = collections.namedtuple('CachedPage', ('body', 'etag', 'encoded'))
+
+
+class PageCache:
+    """Rendered local pages kept in memory with their ETag and compressed variants.
+
+    A page backed by a file is rendered again only when the file's mtime or
+    size changes; a page without file is rendered once.
+    """
+
+    def __init__(self, min_compress_size=PAGE_COMPRESS_MIN_SIZE):
+        self.min_compress_size = min_compress_size
+        self._lock = threading.Lock()
+        self._pages = {}  # name -> (file signature, CachedPage)
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def get(self, name, render, path=None):
+        """Return the CachedPage `name`, calling render() when it is stale.
+
+        OSError from stat()ing `path` or from render() propagates.
+        """
+        signature = None
+        if path is not None:
+            st = os.stat(path)
+            signature = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._pages.get(name)
+            if cached is not None and cached[0] == signature:
+                self._stats["hits"] += 1
+                return cached[1]
+        page = self._build(render())
+        with self._lock:
+            self._stats["misses"] += 1
+            self._pages[name] = (signature, page)
+        return page
+
+    def _build(self, body):
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        encoded = {}
+        if len(body) >= self.min_compress_size:
+            if brotli is not None:
+                encoded['br'] = brotli.compress(body)
+            encoded['gzip'] = gzip.compress(body, 9, mtime=0)
+        return CachedPage(body, etag, encoded)
+
+    def count_not_modified(self):
+        with self._lock:
+            self._stats["not_modified"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pages"] = len(self._pages)
+        stats["brotli"] = brotli is not None
+        return stats
+
+
+page_cache = PageCache()
+
+
+def accepted_encodings(accept_encoding):
+    """Encodings listed in an Accept-Encoding header, minus those with q=0."""
+    encodings = set()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            encodings.add(coding.lower())
+    return encodings
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against `etag`."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == etag:
+            return True
+    return False
+
+
+def conditional_response(response, request_headers):
+    """Resolve a cached page response for a request: 304, compressed or plain."""
+    page = response.page
+    if page is None:
+        return response
+    accepted = accepted_encodings(request_headers.get('Accept-Encoding', ''))
+    encoding = next((e for e in ('br', 'gzip') if e in page.encoded and e in accepted), None)
+    # Each encoding is a distinct representation and needs its own strong ETag
+    etag = f'{page.etag[:-1]}-{encoding}"' if encoding else page.etag
+    headers = response.headers + (('ETag', etag), ('Vary', 'Accept-Encoding'))
+    if etag_matches(request_headers.get('If-None-Match'), etag):
+        page_cache.count_not_modified()
+        return response._replace(status=304, body=b'', headers=headers, page=None)
+    if encoding:
+        headers += (('Content-Encoding', encoding),)
+        return response._replace(body=page.encoded[encoding], headers=headers, page=None)
+    return response._replace(headers=headers, page=None)
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def load_loading_page():
+    """Return the loading page CachedPage, or the built-in fallback page."""
+    page = None
+    try:
+        page = page_cache.get('loading', lambda: _read_file(LOADING_HTML_PATH), LOADING_HTML_PATH)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        log.error(f"Error reading HTML: {e}")
+    if page is None or not page.body:
+        page = page_cache.get('fallback', lambda: FALLBACK_LOADING_HTML)
+    return page
+
+
+def needs_instructions_page(path):
+    """First-time setup: show the instructions before the installer at the root."""
+    return (path == '/' or path == '') and not os.path.exists(INSTALL_COMPLETE_FLAG)
+
+
+def render_instructions_page():
+    """Return the instructions page HTML. Raises FileNotFoundError if missing."""
+    with open(INSTRUCTIONS_HTML_PATH, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    # Replace placeholder with actual internal port
+    content = content.replace('{{INTERNAL_PORT}}', str(PANEL_INTERNAL_PORT))
+    return content.encode('utf-8')
+
+
+def instructions_response():
+    """LocalResponse of the instructions page. Raises FileNotFoundError if missing."""
+    page = page_cache.get('instructions', render_instructions_page, INSTRUCTIONS_HTML_PATH)
+    return LocalResponse(200, 'text/html; charset=utf-8', page.body, 'no-cache', (), page)
+
+
+def mark_instructions_shown():
+    """Create the flag file so instructions are shown only once."""
+    try:
+        with open(INSTALL_COMPLETE_FLAG, 'w') as f:
+            f.write(str(int(time.time())))
+        log.info(f"Instructions shown, created flag: {INSTALL_COMPLETE_FLAG}")
+    except Exception as e:
+        log.warning(f"Could not create install flag: {e}")
+
+
+def handle_wings_config_save(body):
+    """Save a Wings configuration POSTed as {"config": "..."}; return the JSON reply."""
+    try:
+        data = json.loads(body.decode('utf-8'))
+        config_content = data.get('config', '')
+
+        if not config_content.strip():
+            return {"success": False, "error": "Configuration vide"}
+        success, message, restart = save_wings_config(config_content)
+        return {"success": success, "message": message if success else None, "error": message if not success else None,
+                "restart": restart}
+    except Exception as e:
+        log.error(f"Error saving wings config: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def handle_log_level_set(body):
+    """Change the log level POSTed as {"level": "debug"}; return the JSON reply."""
+    try:
+        level = log_manager.set_level(json.loads(body.decode('utf-8')).get('level', ''))
+    except (ValueError, AttributeError) as e:
+        return {"success": False, "error": str(e) or "Invalid log level"}
+    log.info(f"Log level set to {level}")
+    return {"success": True, "level": level}
+
+
+def request_body_framing(headers):
+    """Return (chunked, length) describing a client request body.
+
+    Raises RequestBodyTooLarge for an invalid Content-Length or one above
+    MAX_REQUEST_BODY_SIZE.
+    """
+    if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+        return True, None
+    try:
+        length = int(headers.get('Content-Length') or 0)
+    except ValueError:
+        raise RequestBodyTooLarge("invalid Content-Length")
+    if MAX_REQUEST_BODY_SIZE and length > MAX_REQUEST_BODY_SIZE:
+        raise RequestBodyTooLarge(f"{length} bytes > {MAX_REQUEST_BODY_SIZE}")
+    return False, max(length, 0)
+
+
+def build_upstream_headers(headers, client_ip):
+    """Build the header list sent to Caddy for a proxied client request."""
+    # Add Host header for internal request
+    # Use localhost since Caddy listens on :8080 without host restriction
+    # Using APP_URL host would cause DSM nginx to intercept the request
+    upstream_headers = [('Host', f'127.0.0.1:{PANEL_INTERNAL_PORT}')]
+
+    # Forward client headers, except the ones rebuilt below and
+    # hop-by-hop headers (the upstream connection is kept alive)
+    skipped = ('host', 'content-length', 'expect', 'accept-encoding', 'x-forwarded-host',
+               'x-forwarded-port', 'x-forwarded-proto', 'x-forwarded-for',
+               'x-real-ip') + HOP_BY_HOP_HEADERS
+    for header, value in headers.items():
+        if header.lower() not in skipped:
+            upstream_headers.append((header, value))
+    upstream_headers.append(('Accept-Encoding', upstream_accept_encoding(headers)))
+
+    # Add proxy headers so Laravel knows the original request details
+    fwd_host = headers.get('X-Forwarded-Host')
+    fwd_port = headers.get('X-Forwarded-Port')
+    fwd_proto = headers.get('X-Forwarded-Proto')
+
+    if fwd_host:
+        upstream_headers.append(('X-Forwarded-Host', fwd_host))
+        upstream_headers.append(('X-Forwarded-Port', fwd_port or str(LISTEN_PORT)))
+        upstream_headers.append(('X-Forwarded-Proto', fwd_proto or 'http'))
+    else:
+        app_url = get_app_url_parts()
+        if app_url:
+            upstream_headers.append(('X-Forwarded-Host', app_url['host']))
+            upstream_headers.append(('X-Forwarded-Port', app_url['port']))
+            upstream_headers.append(('X-Forwarded-Proto', app_url['proto']))
+        else:
+            original_host = headers.get('Host', f'localhost:{LISTEN_PORT}')
+            upstream_headers.append(('X-Forwarded-Host', original_host.split(':')[0]))
+            upstream_headers.append(('X-Forwarded-Port', str(LISTEN_PORT)))
+            upstream_headers.append(('X-Forwarded-Proto', 'http'))
+
+    upstream_headers.append(('X-Forwarded-For', headers.get('X-Forwarded-For', client_ip)))
+    upstream_headers.append(('X-Real-IP', headers.get('X-Real-IP', client_ip)))
+    return upstream_headers
+
+
+# Content codings the proxy can decode before rewriting a body
+DECODABLE_ENCODINGS = (('br',) if brotli is not None else ()) + ('gzip', 'deflate')
+
+
+def expects_rewritable(headers):
+    """True for requests whose response will most likely be rewritten (pages, Livewire)."""
+    accept = headers.get('Accept', '').lower()
+    return ('text/html' in accept or 'application/json' in accept
+            or headers.get('X-Livewire') is not None)
+
+
+def upstream_accept_encoding(headers):
+    """Accept-Encoding sent to Caddy for a client request.
+
+    Pages and Livewire responses are rewritten: they are asked uncompressed,
+    which spares compressing and decoding them on the loopback. Other
+    requests only offer the codings the proxy could decode, should their
+    response turn out to be rewritable anyway; it is relayed compressed.
+    """
+    if expects_rewritable(headers):
+        return 'identity'
+    accepted = accepted_encodings(headers.get('Accept-Encoding', ''))
+    return ', '.join(coding for coding in DECODABLE_ENCODINGS if coding in accepted) or 'identity'
+
+
+def _decoder(coding):
+    """Return (decompress, flush) callables for a Content-Encoding, None if unsupported."""
+    if coding in ('', 'identity'):
+        return None
+    if coding in ('gzip', 'x-gzip', 'deflate'):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS if coding != 'deflate' else zlib.MAX_WBITS)
+        return decompressor.decompress, decompressor.flush
+    if coding == 'br' and brotli is not None:
+        decompressor = brotli.Decompressor()
+        return decompressor.process, bytes
+    raise ValueError(coding)
+
+
+def _encoder(coding):
+    """Return (compress, finish) callables for a client Content-Encoding.
+
+    Each compressed chunk is flushed so the browser can start parsing a
+    page before the upstream has sent all of it.
+    """
+    if coding == 'br':
+        compressor = brotli.Compressor(quality=PROXY_BROTLI_QUALITY)
+        return lambda data: compressor.process(data) + compressor.flush(), compressor.finish
+    compressor = zlib.compressobj(PROXY_COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+class BodyPipeline:
+    """Decode, rewrite and re-encode a proxied HTML/JSON body, chunk by chunk.
+
+    Same feed()/flush() interface as StreamingRewriter. `content_encoding`
+    is the coding of the output (None when sent uncompressed).
+    """
+
+    def __init__(self, rewriter, upstream_encoding='', content_encoding=None, kind='html'):
+        self._rewriter = rewriter
+        self._kind = kind
+        self._elapsed = 0.0  # Time spent in feed()/flush(), reported by flush()
+        self._decoder = _decoder(upstream_encoding)
+        self._encoder = _encoder(content_encoding) if content_encoding else None
+        self.content_encoding = content_encoding
+
+    def feed(self, data):
+        started = time.perf_counter()
+        if self._decoder is not None:
+            data = self._decoder[0](data)
+        data = self._rewriter.feed(data)
+        if self._encoder is not None and data:
+            data = self._encoder[0](data)
+        self._elapsed += time.perf_counter() - started
+        return data
+
+    def flush(self):
+        started = time.perf_counter()
+        data = b''
+        if self._decoder is not None:
+            data = self._rewriter.feed(self._decoder[1]())
+        data += self._rewriter.flush()
+        if self._encoder is not None:
+            data = (self._encoder[0](data) if data else b'') + self._encoder[1]()
+        self._elapsed += time.perf_counter() - started
+        metrics.observe("rewrite_seconds", self._elapsed, type=self._kind)
+        return data
+
+    def headers(self, response_headers):
+        """Client headers of the rewritten body, from the upstream (name, value) list."""
+        skipped = HOP_BY_HOP_HEADERS + ('content-length', 'content-encoding')
+        headers = []
+        vary = False
+        for name, value in response_headers:
+            lower = name.lower()
+            if lower in skipped:
+                continue
+            if lower == 'etag' and not value.startswith('W/'):
+                value = 'W/' + value  # Rewritten: no longer byte-identical to the upstream
+            elif lower == 'vary':
+                vary = True
+                if 'accept-encoding' not in value.lower():
+                    value += ', Accept-Encoding'
+            headers.append((name, value))
+        if not vary:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if self.content_encoding:
+            headers.append(('Content-Encoding', self.content_encoding))
+        return headers
+
+
+def make_rewriter(status, response_headers, request_headers):
+    """Return the BodyPipeline for a proxied body, or None to relay it untouched.
+
+    Rewrite absolute URLs to relative paths for CGI proxy compatibility:
+    the container generates URLs like http://127.0.0.1:PORT/... which need
+    to be converted to relative paths so they work through the CGI proxy.
+    Partial content (206) is never rewritten, it would shift the byte ranges.
+    A compressed body is decoded first, and the result is compressed again
+    with PROXY_COMPRESS_LEVEL for clients accepting gzip (or br).
+    """
+    if status == 206:
+        return None
+    content_type = response_headers.get('Content-Type', '')
+    if 'text/html' in content_type:
+        rewriter, kind = StreamingRewriter(IFRAME_FIX_SCRIPT), 'html'
+    elif 'application/json' in content_type:
+        rewriter, kind = StreamingRewriter(), 'json'
+    else:
+        return None
+
+    upstream_encoding = response_headers.get('Content-Encoding', '').strip().lower()
+    content_encoding = None
+    length = response_headers.get('Content-Length')
+    small = (not upstream_encoding and length is not None and length.isdigit()
+             and int(length) < PROXY_COMPRESS_MIN_SIZE)
+    if PROXY_COMPRESS_LEVEL and not small:
+        accepted = accepted_encodings(request_headers.get('Accept-Encoding', ''))
+        content_encoding = next((coding for coding in ('br', 'gzip') if coding in accepted
+                                 and (coding != 'br' or brotli is not None)), None)
+    try:
+        return BodyPipeline(rewriter, upstream_encoding, content_encoding, kind)
+    except ValueError:
+        log.warning("Unsupported Content-Encoding %r: relayed without rewriting", upstream_encoding)
+        return None
+
+
+# ===========================================
+# Coalescing of identical concurrent GETs
+# ===========================================
+
+# Request headers a coalesced response may depend on: requests only share a
+# fetch when all of them match, which keeps sessions (Cookie, Authorization)
+# apart. A response whose Vary names any other header is not shared.
+COALESCE_KEY_HEADERS = ('host', 'cookie', 'authorization', 'accept', 'accept-encoding',
+                        'accept-language', 'x-requested-with', 'x-forwarded-host',
+                        'x-forwarded-port', 'x-forwarded-proto', 'if-none-match',
+                        'if-modified-since')
+
+# Livewire updates and session/authentication endpoints are never coalesced
+COALESCE_EXCLUDED_PREFIXES = ('/livewire', '/api/', '/sanctum', '/login', '/logout',
+                              '/auth', '/password', '/two-factor', '/installer')
+
+# Upstream statuses whose response can be shared between waiters
+COALESCE_STATUSES = (200, 203, 301, 304, 308, 404, 410)
+
+SharedResponse = collections.namedtuple('SharedResponse', ('status', 'headers', 'body'))
+
+
+def coalesce_key(method, path, headers):
+    """Return the coalescing key of a client request, None if it must be sent alone.
+
+    Only bodiless GETs of resources (not page navigations, Range requests
+    or excluded paths) are coalesced.
+    """
+    if method != 'GET' or headers.get('Range') or headers.get('Transfer-Encoding'):
+        return None
+    if headers.get('Content-Length', '0') not in ('', '0'):
+        return None
+    if path.lower().startswith(COALESCE_EXCLUDED_PREFIXES):
+        return None
+    if (headers.get('Sec-Fetch-Mode', '').lower() == 'navigate'
+            or headers.get('Accept', '').lower().startswith('text/html')
+            or 'no-store' in headers.get('Cache-Control', '').lower()):
+        return None
+    return (path,) + tuple(', '.join(headers.get_all(name) or ()) for name in COALESCE_KEY_HEADERS)
+
+
+def coalescable_response(status, headers, length):
+    """True if an upstream response may be shared by the requests of its key."""
+    if status not in COALESCE_STATUSES or headers.get('Set-Cookie') is not None:
+        return False
+    if length is not None and length > COALESCE_MAX_BODY_SIZE:
+        return False
+    if 'no-store' in headers.get('Cache-Control', '').lower():
+        return False
+    vary = [name.strip().lower() for name in headers.get('Vary', '').split(',') if name.strip()]
+    return all(name in COALESCE_KEY_HEADERS for name in vary)
+
+
+class Flight:
+    """An upstream fetch in progress, shared by the requests of one key."""
+
+    __slots__ = ('key', 'done', 'result', 'async_waiters', 'followers')
+
+    def __init__(self, key):
+        self.key = key
+        self.done = threading.Event()
+        self.result = None  # SharedResponse, None when followers must fetch themselves
+        self.async_waiters = []  # (loop, future) of asyncio engine followers
+        self.followers = 0
+
+
+class RequestCoalescer:
+    """Single-flight for identical concurrent GETs.
+
+    During a cold start the browser asks for the same assets from several
+    frames at once while PHP-FPM has few workers. The first request of a
+    key (the leader) goes upstream; the others wait for it and are served
+    the buffered response instead of queueing at the FPM pool. When the
+    response can't be shared (Set-Cookie, Vary, too large, error), the
+    followers send their own request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> Flight
+        self._stats = {"flights": 0, "coalesced": 0, "unshared": 0, "fallbacks": 0}
+
+    def join(self, key):
+        """Return (flight, leader): leaders fetch and complete(), followers wait."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                return flight, False
+            flight = self._flights[key] = Flight(key)
+            self._stats["flights"] += 1
+            return flight, True
+
+    def complete(self, flight, shared):
+        """Publish the leader's SharedResponse (or None) and wake the followers."""
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            if shared is None and flight.followers:
+                self._stats["unshared"] += 1
+            flight.result = shared
+            flight.done.set()
+            waiters, flight.async_waiters = flight.async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve_future, future)
+
+    def wait(self, flight, timeout):
+        """Follower side: the shared response, or None to fetch it yourself."""
+        flight.done.wait(timeout)
+        return self._count_result(flight)
+
+    async def wait_async(self, flight, timeout):
+        """wait() for the asyncio engine, without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if not flight.done.is_set():
+                flight.async_waiters.append((loop, future))
+        if not future.done() and not flight.done.is_set():
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._count_result(flight)
+
+    def _count_result(self, flight):
+        shared = flight.result if flight.done.is_set() else None
+        with self._lock:
+            self._stats["coalesced" if shared is not None else "fallbacks"] += 1
+        return shared
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._flights)
+        return stats
+
+
+request_coalescer = RequestCoalescer()
+
+
+class BufferedResponse:
+    """Stand-in for an http.client.HTTPResponse whose body was read ahead.
+
+    Serves `body` first, then what is left of `response` (None when `body`
+    is complete), so buffered and shared responses go through the same
+    relay code as live ones.
+    """
+
+    def __init__(self, status, headers, body, response=None):
+        self.status = status
+        self.msg = headers
+        self._buffer = io.BytesIO(body)
+        self._response = response
+        if response is not None:
+            self.length = None if response.length is None else len(body) + response.length
+        elif headers.get('Content-Length') is not None and 'chunked' not in headers.get('Transfer-Encoding', ''):
+            self.length = len(body)
+        else:
+            self.length = None  # Relayed chunked, as the upstream sent it
+
+    def getheader(self, name, default=None):
+        return self.msg.get(name, default)
+
+    def getheaders(self):
+        return list(self.msg.items())
+
+    def read(self, amt=None):
+        data = self._buffer.read(amt)
+        if self._response is not None and (amt is None or len(data) < amt):
+            data += self._response.read(None if amt is None else amt - len(data))
+        return data
+
+    def read1(self, amt):
+        data = self._buffer.read1(amt)
+        if not data and self._response is not None:
+            return self._response.read1(amt)
+        return data
+
+    def readinto(self, buffer):
+        count = self._buffer.readinto(buffer)
+        if not count and self._response is not None:
+            return self._response.readinto(buffer)
+        return count
+
+
+def buffer_shared_response(response):
+    """Read ahead the upstream response of a coalescing leader.
+
+    Returns (response to relay, SharedResponse or None when the followers
+    can't reuse it).
+    """
+    if not coalescable_response(response.status, response.msg, response.length):
+        return response, None
+    body = response.read(COALESCE_MAX_BODY_SIZE + 1)
+    if len(body) > COALESCE_MAX_BODY_SIZE:
+        return BufferedResponse(response.status, response.msg, body, response), None
+    shared = SharedResponse(response.status, response.msg, body)
+    return BufferedResponse(*shared), shared
+
+
+# ===========================================
+# Static asset cache
+# ===========================================
+
+# Vite builds (/build/) and Filament assets (/js/, /css/, ?v=<version>) are
+# versioned: their content only changes when the Panel image is updated
+ASSET_PATH_PREFIXES = ('/build/', '/js/', '/css/', '/fonts/', '/vendor/')
+ASSET_FONT_EXTENSIONS = ('.woff2', '.woff', '.ttf', '.otf', '.eot')
+
+# Headers of a stored asset refreshed by a 304 revalidation
+ASSET_REFRESHED_HEADERS = ('cache-control', 'date', 'etag', 'expires', 'last-modified')
+
+# Headers sent with a 304 answered from the cache
+ASSET_NOT_MODIFIED_HEADERS = ('cache-control', 'date', 'etag', 'expires', 'last-modified', 'vary')
+
+
+def asset_cache_key(method, path, headers):
+    """Return the asset cache key of a client request, None if it isn't cacheable."""
+    if method != 'GET' or not ASSET_CACHE_MAX_BYTES:
+        return None
+    if headers.get('Range') or headers.get('Authorization'):
+        return None
+    path_only = path.partition('?')[0].lower()
+    if not (path_only.startswith(ASSET_PATH_PREFIXES) or path_only.endswith(ASSET_FONT_EXTENSIONS)):
+        return None
+    # Caddy compresses per Accept-Encoding (Vary: Accept-Encoding)
+    return (path, headers.get('Accept-Encoding', ''))
+
+
+def parse_cache_control(value):
+    """Return the directives of a Cache-Control header as {name: argument}."""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, argument = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"')
+    return directives
+
+
+def request_wants_revalidation(headers):
+    """True for reloads (no-cache, max-age=0) that must not be answered from a fresh entry."""
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    return ('no-cache' in directives or directives.get('max-age') == '0'
+            or 'no-cache' in headers.get('Pragma', '').lower())
+
+
+def _http_date(value):
+    """Parse an HTTP date into a timestamp, None when missing or invalid."""
+    parsed = email.utils.parsedate_tz(value) if value else None
+    return email.utils.mktime_tz(parsed) if parsed else None
+
+
+def freshness_lifetime(path, headers):
+    """Seconds an asset response stays fresh, 0 when it must be revalidated."""
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    for name in ('s-maxage', 'max-age'):
+        if name in directives:
+            try:
+                return max(int(directives[name]), 0)
+            except ValueError:
+                return 0
+    if 'no-cache' in directives:
+        return 0
+    expires = _http_date(headers.get('Expires'))
+    if expires is not None:
+        return max(expires - (_http_date(headers.get('Date')) or time.time()), 0)
+    # No explicit freshness: trust versioned URLs, the cache is cleared when
+    # the container restarts (i.e. when the Panel can have been updated)
+    if path.startswith('/build/') or '?' in path:
+        return ASSET_CACHE_HEURISTIC_TTL
+    return 0
+
+
+class CachedAsset:
+    """A stored upstream asset response."""
+
+    __slots__ = ('path', 'status', 'headers', 'body', 'etag', 'lifetime', 'validated_at', 'size')
+
+    def __init__(self, path, status, headers, body):
+        self.path = path
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = headers.get('ETag')
+        self.lifetime = freshness_lifetime(path, headers)
+        self.validated_at = time.monotonic()
+        self.size = len(body) + sum(len(name) + len(value) for name, value in headers.items())
+
+    def is_fresh(self):
+        return time.monotonic() - self.validated_at < self.lifetime
+
+
+class AssetCache:
+    """Bounded LRU cache of the Panel's static assets.
+
+    Filament/Vite assets are requested on every page view; serving them from
+    memory spares Caddy and the CGI round trip. Upstream Cache-Control,
+    Expires and ETag decide what is stored and for how long. Stale entries
+    are revalidated with If-None-Match/If-Modified-Since, and the whole
+    cache is dropped when the Panel container restarts. Least recently used
+    entries are evicted to stay within `max_bytes`.
+    """
+
+    def __init__(self, max_bytes=ASSET_CACHE_MAX_BYTES, max_entry_size=ASSET_CACHE_MAX_ENTRY_SIZE):
+        self.max_bytes = max_bytes
+        self.max_entry_size = max_entry_size
+        self._entries = collections.OrderedDict()  # key -> CachedAsset, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._container_started_at = None
+        self._stats = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0,
+                       "evictions": 0, "invalidations": 0, "bytes_saved": 0}
+
+    def lookup(self, key):
+        """Return the CachedAsset of `key` (fresh or stale), None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def storable(self, status, headers, length):
+        """True if an upstream response to an asset request may be stored."""
+        if status != 200 or headers.get('Set-Cookie') is not None:
+            return False
+        if length is not None and length > self.max_entry_size:
+            return False
+        directives = parse_cache_control(headers.get('Cache-Control'))
+        if 'no-store' in directives or 'private' in directives:
+            return False
+        vary = [name.strip().lower() for name in headers.get('Vary', '').split(',') if name.strip()]
+        return all(name == 'accept-encoding' for name in vary)
+
+    def store(self, key, status, headers, body):
+        """Store a response read by storable() callers; return its CachedAsset."""
+        entry = CachedAsset(key[0], status, headers, body)
+        if not entry.lifetime and not entry.etag and headers.get('Last-Modified') is None:
+            return entry  # Neither fresh nor revalidatable: not worth keeping
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._stats["stores"] += 1
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._stats["evictions"] += 1
+        return entry
+
+    def refresh(self, entry, headers):
+        """Apply the headers of a 304 revalidation to `entry`."""
+        refreshed = http.client.HTTPMessage()
+        for name, value in entry.headers.items():
+            if name.lower() not in ASSET_REFRESHED_HEADERS or headers.get(name) is None:
+                refreshed[name] = value
+        for name in ASSET_REFRESHED_HEADERS:
+            value = headers.get(name)
+            if value is not None:
+                refreshed[name] = value
+        with self._lock:
+            entry.headers = refreshed  # Swapped, not mutated: readers may be iterating
+            entry.etag = refreshed.get('ETag')
+            entry.lifetime = freshness_lifetime(entry.path, refreshed)
+            entry.validated_at = time.monotonic()
+            self._stats["revalidated"] += 1
+            self._stats["bytes_saved"] += len(entry.body)
+        return entry
+
+    def count_hit(self, entry):
+        with self._lock:
+            self._stats["hits"] += 1
+            self._stats["bytes_saved"] += len(entry.body)
+
+    def track_container(self, started_at):
+        """Drop every entry when the Panel container's start time changes."""
+        if not started_at:
+            return
+        with self._lock:
+            previous, self._container_started_at = self._container_started_at, started_at
+            if previous is None or previous == started_at or not self._entries:
+                return
+            self._entries.clear()
+            self._bytes = 0
+            self._stats["invalidations"] += 1
+        log.info("Panel container restarted: asset cache cleared")
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            stats["max_bytes"] = self.max_bytes
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["revalidated"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+asset_cache = AssetCache()
+
+
+def asset_request_headers(upstream_headers, entry):
+    """Upstream headers for an asset request: the client's own validators are
+    replaced by the stored entry's, so a full response can be stored."""
+    headers = [(name, value) for name, value in upstream_headers
+               if name.lower() not in ('if-none-match', 'if-modified-since')]
+    if entry is not None:
+        if entry.etag:
+            headers.append(('If-None-Match', entry.etag))
+        last_modified = entry.headers.get('Last-Modified')
+        if last_modified:
+            headers.append(('If-Modified-Since', last_modified))
+    return headers
+
+
+def cached_asset_response(entry, request_headers, cache_status):
+    """SharedResponse answering a request from `entry`: 304 or the stored 200."""
+    etag = entry.etag[2:] if entry.etag and entry.etag.startswith('W/') else entry.etag
+    not_modified = etag_matches(request_headers.get('If-None-Match'), etag)
+    headers = http.client.HTTPMessage()
+    for name, value in entry.headers.items():
+        if name.lower() in ('age', 'x-cache'):
+            continue
+        if not not_modified or name.lower() in ASSET_NOT_MODIFIED_HEADERS:
+            headers[name] = value
+    headers['Age'] = str(int(time.monotonic() - entry.validated_at))
+    headers['X-Cache'] = cache_status
+    if cache_status == 'HIT':
+        asset_cache.count_hit(entry)
+    if not_modified:
+        return SharedResponse(304, headers, b'')
+    return SharedResponse(entry.status, headers, entry.body)
+
+
+def cache_asset_response(key, entry, response, request_headers):
+    """Store or revalidate an asset from its upstream response (asset_request_headers()).
+
+    Returns the response to relay to the client.
+    """
+    if entry is not None and response.status == 304:
+        response.read()
+        asset_cache.refresh(entry, response.msg)
+        return BufferedResponse(*cached_asset_response(entry, request_headers, 'REVALIDATED'))
+    if not asset_cache.storable(response.status, response.msg, response.length):
+        return response
+    body = response.read(asset_cache.max_entry_size + 1)
+    if len(body) > asset_cache.max_entry_size:
+        return BufferedResponse(response.status, response.msg, body, response)
+    entry = asset_cache.store(key, response.status, response.msg, body)
+    return BufferedResponse(*cached_asset_response(entry, request_headers, 'MISS'))
 
 
 class ProxyHandler(http.server.BaseHTTPRequestHandler):
-    """HTTP handler that serves loading page or proxies to Panel."""
+    """HTTP handler that serves loading page or proxies to Panel.
+
+    Speaks HTTP/1.1 so browsers keep their connection (and its handler
+    thread) open across requests. Every response must therefore be framed
+    with Content-Length, and idle connections are closed after
+    KEEPALIVE_IDLE_TIMEOUT seconds or KEEPALIVE_MAX_REQUESTS requests.
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_IDLE_TIMEOUT
 
     def log_message(self, format, *args):
         pass  # Suppress default logging
 
+    def setup(self):
+        super().setup()
+        self.rfile = CountingFile(self.rfile, "bytes_received_total")
+        self.wfile = CountingFile(self.wfile, "bytes_sent_total")
+        self.requests_on_connection = 0
+        self.response_started = False
+        self.response_status = 0
+
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self._wait_for_next_request():
+            self.handle_one_request()
+
+    def _wait_for_next_request(self):
+        """Wait for the next keep-alive request on this connection.
+
+        Returns False once the connection has been idle for
+        KEEPALIVE_IDLE_TIMEOUT seconds, or as soon as other connections are
+        queued for a worker, so idle browsers don't starve the pool.
+        """
+        # A pipelined request may already sit in the read buffer
+        self.connection.settimeout(0)
+        try:
+            if self.rfile.peek(1):
+                return True
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+        deadline = time.monotonic() + KEEPALIVE_IDLE_TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self.connection], [], [], min(0.5, remaining))
+            if readable:
+                return True
+            if self.server.is_saturated():
+                return False
+
+    def end_headers(self):
+        """Announce the keep-alive policy before finishing the headers."""
+        self.response_started = True
+        if (self.close_connection or self.requests_on_connection >= KEEPALIVE_MAX_REQUESTS
+                or self.server.is_saturated()):
+            self.send_header('Connection', 'close')
+        else:
+            if self.request_version == 'HTTP/1.0':
+                self.send_header('Connection', 'keep-alive')
+            self.send_header('Keep-Alive',
+                             f'timeout={KEEPALIVE_IDLE_TIMEOUT}, max={KEEPALIVE_MAX_REQUESTS}')
+        super().end_headers()
+
+    def _drain_request_body(self):
+        """Consume a request body the route does not use.
+
+        Leftover body bytes would otherwise be parsed as the next request on
+        a kept-alive connection. Bodies that are chunked or too large to be
+        worth reading just close the connection instead.
+        """
+        if self.headers.get('Transfer-Encoding'):
+            self.close_connection = True
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            self.close_connection = True
+            return
+        if length > MAX_DRAIN_BODY_SIZE:
+            self.close_connection = True
+        elif length > 0:
+            self.rfile.read(length)
+
+    def _send_content(self, status, content_type, content, cache_control='no-cache', headers=()):
+        """Send a complete response with a Content-Length framed body."""
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        if status != 304:
+            self.send_header('Content-Length', len(content))
+        if cache_control:
+            self.send_header('Cache-Control', cache_control)
+        for header, value in headers:
+            self.send_header(header, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+    def _send_local(self, response):
+        """Send a LocalResponse built by build_local_response()."""
+        response = conditional_response(response, self.headers)
+        self._send_content(response.status, response.content_type, response.body,
+                           response.cache_control, response.headers)
+
     def do_GET(self):
         self._handle_request('GET')
 
@@ -728,49 +3785,54 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
         self._handle_request('OPTIONS')
 
     def _handle_request(self, method):
-        # API endpoint for loading status
-        if self.path == "/api/loading-status":
-            self._serve_status_api()
-            return
-
-        # Wings configuration page
-        if self.path == "/wings-config" or self.path == "/wings-config/":
-            self._serve_wings_config_page()
-            return
-
-        # Wings API endpoints
-        if self.path == "/api/wings/status":
-            self._serve_wings_status_api()
-            return
-
-        if self.path == "/api/wings/config":
-            if method == 'OPTIONS':
-                self._serve_cors_preflight()
-            elif method == 'GET':
-                self._serve_wings_config_api()
-            elif method == 'POST':
-                self._handle_wings_config_save()
-            return
-
+        self.requests_on_connection += 1
+        self.response_started = False
+        self.response_status = 0
+        started = time.perf_counter()
         with state_lock:
             panel_ready = state["panel_ready"]
+        route = route_request(method, self.path, panel_ready)
+        try:
+            self._serve_route(method, route)
+        finally:
+            record_request(route, method, self.response_status, time.perf_counter() - started)
 
-        if panel_ready:
+    def _serve_route(self, method, route):
+        if route == "panel":
             self._redirect_to_panel()
+            return
+
+        body = None
+        if route in BODY_ROUTES:
+            try:
+                body = self._read_local_body()
+            except RequestBodyTooLarge as e:
+                log.info("Rejecting %s %s: %s", method, self.path, e)
+                self._send_request_too_large()
+                return
+            except ClientBodyError as e:
+                log.info("Dropping %s %s: %s", method, self.path, e)
+                self._send_client_body_error(e)
+                return
         else:
-            if method == 'HEAD':
-                self._serve_head_response()
+            self._drain_request_body()
+        try:
+            if route == "status_feed":
+                # Long-poll, handing the worker back early if others are queued
+                since = status_since(self.path.partition('?')[2])
+                status_feed.wait(since, STATUS_LONG_POLL_TIMEOUT, self.server.is_saturated)
+                self._send_local(build_status_feed_response(since))
             else:
-                self._serve_loading_page()
+                self._send_local(build_local_response(route, body))
+        except BrokenPipeError:
+            self.close_connection = True
 
     def _redirect_to_panel(self):
         """Proxy request to the Panel (don't redirect - stay in CGI proxy context)."""
         try:
-            path = self.path
-
             # Check if this is first-time setup (install not complete)
             # and user is accessing root
-            if (path == '/' or path == '') and not os.path.exists(INSTALL_COMPLETE_FLAG):
+            if needs_instructions_page(self.path):
                 # Show instructions page before redirecting to installer
                 self._serve_instructions_page()
                 return
@@ -781,413 +3843,1047 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
             self._proxy_to_panel(self.command)
 
         except Exception as e:
-            print(f"[proxy] Redirect error: {e}")
-            self._serve_loading_page()
+            log.warning(f"Redirect error: {e}")
+            if self.response_started:
+                # Part of a response is already out, the connection can't be reused
+                self.close_connection = True
+            else:
+                self._send_local(build_local_response("loading"))
 
     def _serve_instructions_page(self):
         """Serve the installation instructions page."""
         try:
-            with open(INSTRUCTIONS_HTML_PATH, 'r', encoding='utf-8') as f:
-                content = f.read()
+            self._send_local(instructions_response())
+            mark_instructions_shown()
+        except FileNotFoundError:
+            log.warning(f"Instructions file not found: {INSTRUCTIONS_HTML_PATH}")
+            # Fallback: proxy to installer instead of redirecting (avoid CSP issues)
+            self.path = '/installer'
+            self._proxy_to_panel('GET')
+        except Exception as e:
+            log.error(f"Error serving instructions: {e}")
+            if self.response_started:
+                self.close_connection = True
+            else:
+                self._send_local(build_local_response("loading"))
+
+    def _proxy_to_panel(self, method):
+        """Proxy request to the Panel, preserving all headers including Content-Type.
+
+        IMPORTANT: Caddy requires the Host header to match APP_URL configuration.
+        Without the correct Host header, Caddy may return errors or wrong responses.
+        """
+        flight = None
+        try:
+            target_url = f"http://127.0.0.1:{PANEL_INTERNAL_PORT}{self.path}"
+
+            asset_key = asset_cache_key(method, self.path, self.headers)
+            entry = asset_cache.lookup(asset_key) if asset_key is not None else None
+            if entry is not None and entry.is_fresh() and not request_wants_revalidation(self.headers):
+                self._relay_response(method, BufferedResponse(
+                    *cached_asset_response(entry, self.headers, 'HIT')))
+                return
+
+            key = coalesce_key(method, self.path, self.headers)
+            if key is not None:
+                flight, leader = request_coalescer.join(key)
+                if not leader:
+                    shared = request_coalescer.wait(flight, UPSTREAM_TIMEOUT)
+                    flight = None
+                    if shared is not None:
+                        log.debug("Coalesced %s %s", method, self.path)
+                        self._relay_response(method, BufferedResponse(*shared))
+                        return
+
+            content_type = self.headers.get('Content-Type', '')
+            try:
+                body, body_length = self._request_body()
+            except RequestBodyTooLarge as e:
+                log.info("Rejecting %s %s: %s", method, self.path, e)
+                self._send_request_too_large()
+                return
+
+            if body is None:
+                log.debug("Proxying %s %s -> %s (no body)", method, self.path, target_url)
+            else:
+                size = 'chunked' if body_length is None else f'{body_length} bytes'
+                log.debug("Proxying %s %s -> %s (Content-Type: %s, body: %s)",
+                          method, self.path, target_url, content_type, size)
+
+            client_ip = self.client_address[0] if self.client_address else '127.0.0.1'
+            upstream_headers = build_upstream_headers(self.headers, client_ip)
+            if asset_key is not None:
+                upstream_headers = asset_request_headers(upstream_headers, entry)
+
+            # http.client never follows redirects: Laravel generates redirects with
+            # APP_URL (https://...) which must be returned to the client as-is so
+            # panel.cgi can handle URL rewriting.
+            try:
+                conn, response = upstream_pool.request(method, self.path, upstream_headers,
+                                                       body, body_length)
+            except RequestBodyTooLarge as e:
+                log.info("Rejecting %s %s: %s", method, self.path, e)
+                self._send_request_too_large()
+                return
+            try:
+                relayed = response
+                if asset_key is not None:
+                    relayed = cache_asset_response(asset_key, entry, response, self.headers)
+                if flight is not None:
+                    # Release the waiting followers before relaying to this client
+                    relayed, shared = buffer_shared_response(relayed)
+                    request_coalescer.complete(flight, shared)
+                    flight = None
+                with metrics.timer("upstream_transfer_seconds"):
+                    self._relay_response(method, relayed)
+            finally:
+                upstream_pool.release(conn, response)
+
+        except ClientBodyError as e:
+            # The client's fault, not the Panel's: no rearm, no 502
+            log.info("Dropping %s %s: %s", method, self.path, e)
+            self._send_client_body_error(e)
+        except Exception as e:
+            log.warning("Proxy error: %s: %s", type(e).__name__, e)
+            if self.response_started:
+                # Headers already went out: close rather than send a second response
+                self.close_connection = True
+                return
+            monitor_schedule.rearm("proxy error")
+            error_msg = json.dumps({"error": f"Proxy error: {e}"}).encode('utf-8')
+            self._send_content(502, 'application/json', error_msg, cache_control=None)
+        finally:
+            if flight is not None:
+                request_coalescer.complete(flight, None)
+
+    def _relay_response(self, method, response):
+        """Send an upstream response (live or BufferedResponse) to the client."""
+        content_type = response.getheader('Content-Type', '')
+        log.debug("Response: %s %s", response.status, content_type)
+
+        if method == 'HEAD' or response.status in (204, 304):
+            # No body: forward the headers only
+            response.read()
+            self.send_response(response.status)
+            for header, value in response.getheaders():
+                if header.lower() not in HOP_BY_HOP_HEADERS:
+                    self.send_header(header, value)
+            self.end_headers()
+            return
+
+        rewriter = make_rewriter(response.status, response.msg, self.headers)
+        if rewriter is not None:
+            self._relay_rewritten(response, rewriter)
+            return
+
+        # Everything else (assets, downloads, backups) is relayed untouched
+        self._relay_passthrough(response)
+
+    def _request_body(self):
+        """Return (body, length) for forwarding the client request body.
+
+        Small bodies (Livewire calls, forms) are read into memory so they can
+        be replayed on a pooled connection. Larger and chunked bodies (file
+        uploads, mod archives, egg imports) are returned as a generator
+        copying PROXY_CHUNK_SIZE pieces from the client socket while they
+        are sent upstream; `length` is None for chunked bodies.
+        Raises RequestBodyTooLarge when MAX_REQUEST_BODY_SIZE is exceeded.
+        """
+        chunked, length = request_body_framing(self.headers)
+        if chunked:
+            return self._iter_chunked_body(), None
+        if length == 0:
+            return None, None
+        if length <= PROXY_CHUNK_SIZE:
+            body = self._read_client(self.rfile.read, length)
+            if len(body) != length:
+                raise ClientBodyError("client closed the connection mid-body")
+            return body, length
+        return self._iter_fixed_body(length), length
+
+    def _read_local_body(self):
+        """Read the whole body of a request to a local route (length or chunked)."""
+        body, _ = self._request_body()
+        if body is None or isinstance(body, bytes):
+            return body or b''
+        return b''.join(body)
+
+    def _read_client(self, read, size):
+        """Return `read(size)` from the client socket; errors become ClientBodyError."""
+        try:
+            return read(size)
+        except socket.timeout:
+            raise ClientBodyError(f"client sent no body data for {self.timeout}s", 408)
+        except OSError as e:
+            raise ClientBodyError(f"client connection failed mid-body: {e}")
+
+    def _iter_fixed_body(self, length):
+        remaining = length
+        while remaining > 0:
+            data = self._read_client(self.rfile.read, min(remaining, PROXY_CHUNK_SIZE))
+            if not data:
+                raise ClientBodyError("client closed the connection mid-body")
+            remaining -= len(data)
+            yield data
+
+    def _iter_chunked_body(self):
+        """Decode a `Transfer-Encoding: chunked` body from the client."""
+        total = 0
+        while True:
+            line = self._read_client(self.rfile.readline, 1024)
+            try:
+                size = int(line.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise ClientBodyError("malformed chunked request body")
+            if size == 0:
+                # Skip optional trailers up to the blank line
+                while self._read_client(self.rfile.readline, 8192) not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            total += size
+            if MAX_REQUEST_BODY_SIZE and total > MAX_REQUEST_BODY_SIZE:
+                raise RequestBodyTooLarge(f"chunked body > {MAX_REQUEST_BODY_SIZE}")
+            yield from self._iter_fixed_body(size)
+            self._read_client(self.rfile.readline, 1024)  # CRLF closing the chunk
+
+    def _send_request_too_large(self):
+        # The rest of the body is still unread on the socket
+        self.close_connection = True
+        error_msg = b'{"error": "Request body too large"}'
+        self._send_content(413, 'application/json', error_msg, cache_control=None)
+
+    def _send_client_body_error(self, error):
+        # The body can no longer be framed: answer if possible, then close
+        self.close_connection = True
+        if self.response_started:
+            return
+        error_msg = json.dumps({"error": f"Bad request body: {error}"}).encode('utf-8')
+        try:
+            self._send_content(error.status, 'application/json', error_msg, cache_control=None)
+        except OSError:
+            pass  # The client is gone
+
+    def _relay_rewritten(self, response, rewriter):
+        """Stream an upstream body to the client through `rewriter`.
+
+        The rewritten length is unknown up front, so the body is sent chunked
+        and the first bytes reach the browser before the page is complete.
+        """
+        self.send_response(response.status)
+        for header, value in rewriter.headers(response.getheaders()):
+            self.send_header(header, value)
+        self._begin_stream()
+
+        log_error_body = (response.status >= 400 and 'livewire' in self.path.lower()
+                          and log.isEnabledFor(logging.DEBUG))
+        while True:
+            data = response.read1(PROXY_CHUNK_SIZE)
+            if not data:
+                break
+            if log_error_body:
+                log.debug("Error body: %s", data[:500].decode('utf-8', errors='replace'))
+                log_error_body = False
+            self._write_stream(rewriter.feed(data))
+        self._write_stream(rewriter.flush())
+        self._end_stream()
+
+    def _relay_passthrough(self, response):
+        """Relay an upstream body untouched, PROXY_CHUNK_SIZE bytes at a time.
+
+        Memory per connection stays constant whatever the body size (multi-GB
+        backups): one buffer is reused and each chunk is written to the
+        client before the next is read, so a slow client slows the upstream
+        read down instead of piling data up. Range requests are forwarded
+        with the other headers, and 206 responses keep their Content-Range
+        and Content-Length.
+        """
+        self.send_response(response.status)
+        for header, value in response.getheaders():
+            if header.lower() not in HOP_BY_HOP_HEADERS:
+                self.send_header(header, value)
+        expected = response.length  # None when the upstream body is chunked
+        if expected is None:
+            self._begin_stream()
+        else:
+            self.stream_chunked = False
+            self.end_headers()
+
+        buffer = bytearray(PROXY_CHUNK_SIZE)
+        view = memoryview(buffer)
+        sent = 0
+        while True:
+            count = response.readinto(buffer)
+            if not count:
+                break
+            self._write_stream(view[:count])
+            sent += count
+        self._end_stream()
+
+        if expected is not None and sent != expected:
+            # Upstream closed early: the client saw a short body, don't reuse
+            log.warning("Truncated upstream body: %s/%s bytes", sent, expected)
+            self.close_connection = True
+
+    def _begin_stream(self):
+        """Finish the headers of a body whose length is not known in advance.
+
+        HTTP/1.1 clients get chunked encoding; HTTP/1.0 clients get a body
+        delimited by closing the connection.
+        """
+        self.stream_chunked = self.request_version != 'HTTP/1.0'
+        if self.stream_chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.close_connection = True
+        self.end_headers()
+
+    def _write_stream(self, data):
+        if not data:
+            return  # An empty chunk would end the body
+        if self.stream_chunked:
+            self.wfile.write(b''.join((b'%x\r\n' % len(data), data, b'\r\n')))
+        else:
+            self.wfile.write(data)
+
+    def _end_stream(self):
+        if self.stream_chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+
+SERVICE_UNAVAILABLE_BODY = b'{"error": "Server busy"}'
+SERVICE_UNAVAILABLE_RESPONSE = (
+    b'HTTP/1.1 503 Service Unavailable\r\n'
+    b'Content-Type: application/json\r\n'
+    b'Content-Length: %d\r\n'
+    b'Retry-After: %d\r\n'
+    b'Connection: close\r\n'
+    b'\r\n' % (len(SERVICE_UNAVAILABLE_BODY), RETRY_AFTER_SECONDS)
+) + SERVICE_UNAVAILABLE_BODY
+
+
+class ThreadedTCPServer(socketserver.TCPServer):
+    """TCP server handing connections to a fixed pool of worker threads.
+
+    Accepted connections wait in a bounded queue. When the queue is full,
+    or a connection waited more than WORKER_QUEUE_WAIT_LIMIT seconds for a
+    worker, the client gets an immediate 503 with Retry-After instead of
+    another thread.
+
+    The wait limit only covers the time in the queue. Once a worker serves
+    the connection there is no wall-clock deadline (backup downloads and
+    uploads legitimately stream for minutes); each read or write is bounded
+    instead, by KEEPALIVE_IDLE_TIMEOUT on the client socket and
+    UPSTREAM_TIMEOUT on the Panel connection.
+    """
+
+    allow_reuse_address = True
+    request_queue_size = WORKER_QUEUE_SIZE  # listen() backlog
+
+    def __init__(self, server_address, RequestHandlerClass,
+                 workers=WORKER_POOL_SIZE, queue_size=WORKER_QUEUE_SIZE):
+        super().__init__(server_address, RequestHandlerClass)
+        self.workers = workers
+        self._queue = queue.Queue(queue_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {"accepted": 0, "rejected": 0, "expired": 0, "busy": 0, "max_queue_depth": 0}
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"proxy-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def process_request(self, request, client_address):
+        try:
+            self._queue.put_nowait((request, client_address, time.monotonic()))
+        except queue.Full:
+            self._count("rejected")
+            self._reject(request)
+            return
+        with self._stats_lock:
+            self._stats["accepted"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            request, client_address, queued_at = item
+            if time.monotonic() - queued_at > WORKER_QUEUE_WAIT_LIMIT:
+                self._count("expired")
+                self._reject(request)
+                continue
+            self._count("busy")
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                self._count("busy", -1)
+
+    def _count(self, key, delta=1):
+        with self._stats_lock:
+            self._stats[key] += delta
+
+    def _reject(self, request):
+        """Answer 503 without reading the request and close the connection."""
+        record_request("rejected", "other", 503, 0)
+        try:
+            # Consume what the client already sent so close() doesn't reset the 503
+            request.setblocking(False)
+            try:
+                request.recv(PROXY_CHUNK_SIZE)
+            except BlockingIOError:
+                pass
+            request.setblocking(True)
+            request.sendall(SERVICE_UNAVAILABLE_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def is_saturated(self):
+        """True when connections are waiting for a free worker."""
+        return not self._queue.empty()
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["engine"] = "threaded"
+        stats["workers"] = self.workers
+        stats["queue_depth"] = self._queue.qsize()
+        stats["queue_size"] = self._queue.maxsize
+        return stats
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._threads:
+            self._queue.put(None)
+
+# ===========================================
+# asyncio serving engine (--engine asyncio)
+# ===========================================
+
+class AsyncUpstreamPool:
+    """UpstreamPool counterpart for the asyncio engine.
+
+    Keeps idle (reader, writer) stream pairs to Caddy. Only used from the
+    event loop thread, so no locking is needed.
+    """
 
-            # Replace placeholder with actual internal port
-            content = content.replace('{{INTERNAL_PORT}}', str(PANEL_INTERNAL_PORT))
+    def __init__(self, host, port, max_size=UPSTREAM_POOL_SIZE,
+                 idle_timeout=UPSTREAM_POOL_IDLE_TIMEOUT, timeout=UPSTREAM_TIMEOUT, breaker=None):
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.breaker = breaker
+        self._idle = []  # (reader, writer, last_used) - most recently used last
+        self._stats = {"hits": 0, "misses": 0, "retries": 0, "evictions": 0}
+
+    async def acquire(self, fresh=False):
+        """Return (reader, writer, reused), reusing an idle connection unless `fresh`."""
+        now = time.monotonic()
+        while self._idle and not fresh:
+            reader, writer, last_used = self._idle.pop()
+            if now - last_used < self.idle_timeout and not reader.at_eof():
+                self._stats["hits"] += 1
+                return reader, writer, True
+            self._stats["evictions"] += 1
+            writer.close()
+        self._stats["misses"] += 1
+        with metrics.timer("upstream_connect_seconds"):
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, limit=MAX_HEADER_SIZE),
+                min(UPSTREAM_CONNECT_TIMEOUT, self.timeout))
+        return reader, writer, False
+
+    def release(self, reader, writer, reusable):
+        if not reusable or len(self._idle) >= self.max_size:
+            writer.close()
+            return
+        self._idle.append((reader, writer, time.monotonic()))
+
+    def clear(self):
+        idle, self._idle = self._idle, []
+        for _, writer, _ in idle:
+            writer.close()
+
+    def snapshot(self):
+        stats = dict(self._stats)
+        stats["idle"] = len(self._idle)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+class AsyncRequest:
+    """A client request parsed by AsyncProxyServer."""
+
+    __slots__ = ('method', 'path', 'version', 'headers', 'keep_alive', 'client_ip', 'route', 'status')
+
+    def __init__(self, method, path, version, headers, client_ip):
+        self.route = 'unknown'
+        self.status = 0  # Set when the response head is written
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.client_ip = client_ip
+        connection = headers.get('Connection', '').lower()
+        if version == 'HTTP/1.0':
+            self.keep_alive = connection == 'keep-alive'
+        else:
+            self.keep_alive = connection != 'close'
 
-            content_bytes = content.encode('utf-8')
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.send_header('Content-Length', len(content_bytes))
-            self.send_header('Cache-Control', 'no-cache')
-            self.end_headers()
-            self.wfile.write(content_bytes)
 
-            # Mark that instructions were shown - create flag file
-            # This ensures instructions are shown only once
-            try:
-                with open(INSTALL_COMPLETE_FLAG, 'w') as f:
-                    f.write(str(int(time.time())))
-                print(f"[proxy] Instructions shown, created flag: {INSTALL_COMPLETE_FLAG}")
-            except Exception as e:
-                print(f"[proxy] Could not create install flag: {e}")
+async def _read_with_timeout(awaitable, timeout):
+    if timeout is None:
+        return await awaitable
+    return await asyncio.wait_for(awaitable, timeout)
 
-        except FileNotFoundError:
-            print(f"[proxy] Instructions file not found: {INSTRUCTIONS_HTML_PATH}")
-            # Fallback: proxy to installer instead of redirecting (avoid CSP issues)
-            self.path = '/installer'
-            self._proxy_to_panel('GET')
-        except Exception as e:
-            print(f"[proxy] Error serving instructions: {e}")
-            self._serve_loading_page()
 
-    def _serve_status_api(self):
-        """Serve current status as JSON."""
-        with state_lock:
-            status_data = dict(state)
-            status_data["elapsed_seconds"] = int(time.time() - state["start_time"])
-
-        content = json.dumps(status_data).encode('utf-8')
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Content-Length', len(content))
-        self.send_header('Cache-Control', 'no-cache')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(content)
+async def read_client_body_async(reader, length):
+    """Read a `length` bytes client request body; errors become ClientBodyError.
 
-    def _serve_wings_config_page(self):
-        """Serve the Wings configuration HTML page."""
-        try:
-            content = get_wings_config_html()
-            content_bytes = content.encode('utf-8')
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.send_header('Content-Length', len(content_bytes))
-            self.send_header('Cache-Control', 'no-cache')
-            self.end_headers()
-            self.wfile.write(content_bytes)
-        except Exception as e:
-            print(f"[proxy] Error serving wings config page: {e}")
-            self.send_error(500, str(e))
-
-    def _add_cors_headers(self):
-        """Add CORS headers to allow cross-origin requests from DSM."""
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-
-    def _serve_cors_preflight(self):
-        """Handle CORS preflight OPTIONS request."""
-        self.send_response(200)
-        self._add_cors_headers()
-        self.send_header('Content-Length', '0')
-        self.end_headers()
+    Like the threaded engine's socket timeout, a client sending nothing for
+    KEEPALIVE_IDLE_TIMEOUT seconds gets a 408 instead of holding its slot.
+    """
+    try:
+        return await asyncio.wait_for(reader.readexactly(length), KEEPALIVE_IDLE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise ClientBodyError(f"client sent no body data for {KEEPALIVE_IDLE_TIMEOUT}s", 408)
+    except (asyncio.IncompleteReadError, ConnectionError) as e:
+        raise ClientBodyError(str(e) or type(e).__name__)
 
-    def _serve_wings_status_api(self):
-        """Serve Wings status as JSON."""
-        status = check_wings_status()
-        status["success"] = True
-        content = json.dumps(status).encode('utf-8')
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Content-Length', len(content))
-        self.send_header('Cache-Control', 'no-cache')
-        self._add_cors_headers()
-        self.end_headers()
-        self.wfile.write(content)
-
-    def _serve_wings_config_api(self):
-        """Serve Wings configuration content as JSON."""
-        config = get_wings_config()
-        response = {"success": True, "config": config}
-        content = json.dumps(response).encode('utf-8')
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Content-Length', len(content))
-        self.send_header('Cache-Control', 'no-cache')
-        self._add_cors_headers()
-        self.end_headers()
-        self.wfile.write(content)
 
-    def _handle_wings_config_save(self):
-        """Handle POST request to save Wings configuration."""
-        try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            config_content = data.get('config', '')
+async def iter_client_body_async(reader, chunked, length, max_size=0):
+    """iter_body_async() over a client request body; errors become ClientBodyError."""
+    try:
+        async for data in iter_body_async(reader, chunked, length, KEEPALIVE_IDLE_TIMEOUT, max_size):
+            yield data
+    except asyncio.TimeoutError:
+        raise ClientBodyError(f"client sent no body data for {KEEPALIVE_IDLE_TIMEOUT}s", 408)
+    except (asyncio.IncompleteReadError, ConnectionError) as e:
+        raise ClientBodyError(str(e) or type(e).__name__)
 
-            if not config_content.strip():
-                response = {"success": False, "error": "Configuration vide"}
-            else:
-                success, message = save_wings_config(config_content)
-                response = {"success": success, "message": message if success else None, "error": message if not success else None}
 
-            content = json.dumps(response).encode('utf-8')
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Content-Length', len(content))
-            self._add_cors_headers()
-            self.end_headers()
-            self.wfile.write(content)
-        except Exception as e:
-            print(f"[proxy] Error saving wings config: {e}")
-            response = {"success": False, "error": str(e)}
-            content = json.dumps(response).encode('utf-8')
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Content-Length', len(content))
-            self._add_cors_headers()
-            self.end_headers()
-            self.wfile.write(content)
+async def iter_body_async(reader, chunked, length, timeout=None, max_size=0):
+    """Yield a message body framed by chunked encoding, a length or EOF.
 
-    def _serve_head_response(self):
-        """Serve HEAD response for health checks."""
-        self.send_response(503)
-        self.send_header('Content-Type', 'text/html')
-        self.send_header('Retry-After', '5')
-        self.end_headers()
+    `length` None without `chunked` reads until the peer closes. A chunked
+    body above `max_size` bytes (0 = no limit) raises RequestBodyTooLarge.
+    """
+    if chunked:
+        total = 0
+        while True:
+            line = await _read_with_timeout(reader.readline(), timeout)
+            try:
+                size = int(line.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise ConnectionAbortedError("malformed chunked body")
+            if size == 0:
+                # Skip optional trailers up to the blank line
+                while (await _read_with_timeout(reader.readline(), timeout)) not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            total += size
+            if max_size and total > max_size:
+                raise RequestBodyTooLarge(f"chunked body > {max_size}")
+            async for data in iter_body_async(reader, False, size, timeout):
+                yield data
+            await _read_with_timeout(reader.readline(), timeout)  # CRLF closing the chunk
+    elif length is not None:
+        remaining = length
+        while remaining > 0:
+            data = await _read_with_timeout(reader.read(min(remaining, PROXY_CHUNK_SIZE)), timeout)
+            if not data:
+                raise ConnectionAbortedError("connection closed mid-body")
+            remaining -= len(data)
+            yield data
+    else:
+        while True:
+            data = await _read_with_timeout(reader.read(PROXY_CHUNK_SIZE), timeout)
+            if not data:
+                return
+            yield data
 
-    def _serve_loading_page(self):
-        """Serve the loading page."""
-        try:
-            content = None
-            if os.path.exists(LOADING_HTML_PATH):
-                try:
-                    with open(LOADING_HTML_PATH, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                except Exception as e:
-                    print(f"[proxy] Error reading HTML: {e}")
-
-            if not content:
-                content = self._get_fallback_html()
-
-            content_bytes = content.encode('utf-8')
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.send_header('Content-Length', len(content_bytes))
-            self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-            self.end_headers()
-            self.wfile.write(content_bytes)
-        except BrokenPipeError:
-            pass
-        except Exception as e:
-            print(f"[proxy] Error serving page: {e}")
 
-    def _get_fallback_html(self):
-        """Fallback loading page if template not found."""
-        return '''<!DOCTYPE html>
-<html><head><meta charset="utf-8"><title>Pelican Panel</title>
-<style>
-body{background:#1a1a2e;color:#fff;font-family:system-ui,sans-serif;
-display:flex;justify-content:center;align-items:center;height:100vh;margin:0}
-.c{text-align:center;max-width:500px;padding:40px}
-.logo{font-size:2.5rem;font-weight:600;margin-bottom:40px;color:#4fc3f7}
-.bar-bg{height:6px;background:rgba(255,255,255,0.1);border-radius:3px;margin-bottom:20px}
-.bar{height:100%;background:#4fc3f7;border-radius:3px;width:0%;transition:width 0.3s}
-.msg{font-size:1.1rem;margin:15px 0}
-.detail{color:rgba(255,255,255,0.6);font-size:0.9rem}
-.migration{color:#4fc3f7;font-size:0.85rem;margin-top:10px;font-family:monospace}
-</style></head>
-<body><div class="c">
-<div class="logo">PELICAN</div>
-<div class="bar-bg"><div class="bar" id="bar"></div></div>
-<div class="msg" id="msg">Chargement...</div>
-<div class="detail" id="detail"></div>
-<div class="migration" id="migration"></div>
-</div>
-<script>
-async function update(){
-try{
-const r=await fetch('/api/loading-status');
-const d=await r.json();
-document.getElementById('bar').style.width=d.progress+'%';
-document.getElementById('msg').textContent=d.message||'Chargement...';
-document.getElementById('detail').textContent=d.detail||'';
-document.getElementById('migration').textContent=d.current_migration?'→ '+d.current_migration:'';
-if(d.panel_ready){location.reload();}
-}catch(e){}}
-setInterval(update,1500);update();
-</script></body></html>'''
-
-    # JavaScript to inject into HTML pages for iframe navigation fix
-    # Note: Use regular string + encode() to support non-ASCII characters
-    IFRAME_FIX_SCRIPT = '''<script>
-(function(){
-    // Fix Livewire/Filament navigation in iframe for Pelican installer
-    var isInstaller = window.location.pathname.indexOf('/installer') !== -1;
+async def buffer_body_async(chunks, limit):
+    """Read `chunks` until more than `limit` bytes; return (body, complete)."""
+    parts, size = [], 0
+    async for data in chunks:
+        parts.append(data)
+        size += len(data)
+        if size > limit:
+            return b''.join(parts), False
+    return b''.join(parts), True
 
-    if(isInstaller){
-        console.log('[Pelican] Installer page detected, watching for completion...');
 
-        // Watch for clicks on Finish/Terminer buttons
-        document.addEventListener('click', function(e){
-            var btn = e.target.closest('button');
-            if(!btn) return;
+async def _chain_body(prefix, chunks):
+    """Yield `prefix`, then the rest of `chunks` (an async iterator or None)."""
+    if prefix:
+        yield prefix
+    if chunks is not None:
+        async for data in chunks:
+            yield data
 
-            var text = btn.textContent || btn.innerText || '';
-            // Match: Finish, Terminé, Terminer, Complete, Done
-            if(text.match(/finish|termin|complete|done/i)){
-                console.log('[Pelican] Finish button clicked: ' + text);
 
-                // Force redirect after delay (give Livewire time to process)
-                setTimeout(function(){
-                    console.log('[Pelican] Forcing redirect to admin panel...');
-                    window.location.href = './';
-                }, 2500);
-            }
-        }, true);
+def response_body_framing(headers):
+    """Return (chunked, length) of an upstream response body (length None if unknown)."""
+    chunked = 'chunked' in headers.get('Transfer-Encoding', '').lower()
+    length = headers.get('Content-Length')
+    return chunked, int(length) if length is not None and not chunked else None
 
-        // Also monitor for wizard disappearing (backup detection)
-        var wizardGone = false;
-        setInterval(function(){
-            var wizardForm = document.querySelector('.fi-wizard, [x-data*="wizard"], form[wire\\:submit]');
-            var successMsg = document.body.innerHTML.match(/success|completed|bienvenue|welcome/i);
 
-            if(!wizardGone && !wizardForm && successMsg){
-                wizardGone = true;
-                console.log('[Pelican] Wizard completed (form gone + success detected)');
-                setTimeout(function(){ window.location.href = './'; }, 1000);
-            }
-        }, 1000);
-    }
+def _frame_chunk(data):
+    return b''.join((b'%x\r\n' % len(data), data, b'\r\n'))
 
-    // Intercept absolute URL redirects and make them relative (for CGI proxy)
-    var origHref = Object.getOwnPropertyDescriptor(window.location.__proto__, 'href');
-    if(origHref && origHref.set){
-        Object.defineProperty(window.location, 'href', {
-            set: function(url){
-                if(typeof url === 'string' && url.charAt(0) === '/'){
-                    url = '.' + url;
-                    console.log('[Pelican] Rewriting redirect to: ' + url);
-                }
-                return origHref.set.call(this, url);
-            },
-            get: origHref.get
-        });
-    }
-})();
-</script>'''.encode('utf-8')
 
-    def _proxy_to_panel(self, method):
-        """Proxy request to the Panel, preserving all headers including Content-Type.
+class AsyncProxyServer:
+    """asyncio serving engine, selected with --engine asyncio.
 
-        IMPORTANT: Caddy requires the Host header to match APP_URL configuration.
-        Without the correct Host header, Caddy may return errors or wrong responses.
-        """
-        try:
-            target_url = f"http://127.0.0.1:{PANEL_INTERNAL_PORT}{self.path}"
+    Serves the same routes as ProxyHandler (see route_request) from one
+    event loop thread instead of one OS thread per connection. Client and
+    upstream sockets are non-blocking, at most `max_concurrency` requests
+    are processed at once (status long-polls wait outside that limit),
+    and local routes that call docker or read files run in the default
+    executor.
+    """
 
-            content_length = self.headers.get('Content-Length')
-            content_type = self.headers.get('Content-Type', '')
-            body = None
-            if content_length:
+    # Cheap local routes answered directly on the event loop
+    INLINE_ROUTES = ("status", "metrics", "log_level", "log_level_set", "cors_preflight", "method_not_allowed", "loading_head")
+
+    def __init__(self, host, port, max_concurrency=ASYNC_MAX_CONCURRENCY):
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.active_connections = 0
+        self.long_polls = 0
+        self._semaphore = None  # Created in the event loop (Python 3.8 binds it at creation)
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def snapshot(self):
+        return {"engine": "asyncio", "max_concurrency": self.max_concurrency,
+                "connections": self.active_connections, "long_polls": self.long_polls}
+
+    async def _serve(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                            reuse_address=True, limit=MAX_HEADER_SIZE)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        reader, writer = CountingStreamReader(reader), CountingStreamWriter(writer)
+        self.active_connections += 1
+        peer = writer.get_extra_info('peername')
+        client_ip = peer[0] if peer else '127.0.0.1'
+        served = 0
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_IDLE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break  # Idle timeout or client gone
+                except asyncio.LimitOverrunError:
+                    writer.write(b'HTTP/1.1 431 Request Header Fields Too Large\r\n'
+                                 b'Content-Length: 0\r\nConnection: close\r\n\r\n')
+                    break
+                request = self._parse_request(head, client_ip)
+                if request is None:
+                    writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                    break
+                served += 1
+                if served >= KEEPALIVE_MAX_REQUESTS:
+                    request.keep_alive = False
+                started = time.perf_counter()
                 try:
-                    body = self.rfile.read(int(content_length))
-                    print(f"[proxy] Proxying {method} {self.path} -> {target_url}")
-                    print(f"[proxy]   Content-Type: {content_type}")
-                    print(f"[proxy]   Content-Length header: {content_length}, body read: {len(body) if body else 0} bytes")
-                    if body and 'livewire' in self.path.lower():
-                        # Log first 200 chars of body for Livewire debugging
-                        body_preview = body[:200].decode('utf-8', errors='replace')
-                        print(f"[proxy]   Body preview: {body_preview}...")
-                except Exception as e:
-                    print(f"[proxy] ERROR reading body: {e}")
-                    body = None
+                    keep_alive = await self._dispatch(request, reader, writer)
+                finally:
+                    record_request(request.route, request.method, request.status,
+                                   time.perf_counter() - started)
+                if not keep_alive:
+                    break
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            log.warning("Connection error: %s: %s", type(e).__name__, e)
+        finally:
+            self.active_connections -= 1
+            writer.close()
+
+    @staticmethod
+    def _parse_request(head, client_ip):
+        request_line, _, header_block = head.partition(b'\r\n')
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+            return None
+        headers = http.client.parse_headers(io.BytesIO(header_block))
+        return AsyncRequest(parts[0], parts[1], parts[2], headers, client_ip)
+
+    @staticmethod
+    def _response_head(request, status, headers):
+        request.status = status
+        reason = http.server.BaseHTTPRequestHandler.responses.get(status, ('',))[0]
+        lines = [f"HTTP/1.1 {status} {reason}",
+                 f"Server: {ProxyHandler.server_version} {ProxyHandler.sys_version}",
+                 f"Date: {email.utils.formatdate(usegmt=True)}"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        if request.keep_alive:
+            if request.version == 'HTTP/1.0':
+                lines.append("Connection: keep-alive")
+            lines.append(f"Keep-Alive: timeout={KEEPALIVE_IDLE_TIMEOUT}, max={KEEPALIVE_MAX_REQUESTS}")
+        else:
+            lines.append("Connection: close")
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def _send_local(self, request, writer, response):
+        response = conditional_response(response, request.headers)
+        headers = []
+        if response.content_type:
+            headers.append(('Content-Type', response.content_type))
+        if response.status != 304:
+            headers.append(('Content-Length', str(len(response.body))))
+        if response.cache_control:
+            headers.append(('Cache-Control', response.cache_control))
+        headers.extend(response.headers)
+        writer.write(self._response_head(request, response.status, headers))
+        if request.method != 'HEAD':
+            writer.write(response.body)
+        await writer.drain()
+
+    async def _read_local_body(self, request, reader):
+        """Read the whole body of a request to a local route (length or chunked)."""
+        chunked, length = request_body_framing(request.headers)
+        if not chunked:
+            return await read_client_body_async(reader, length)
+        return b''.join([data async for data in iter_client_body_async(reader, True, None,
+                                                                       max_size=MAX_REQUEST_BODY_SIZE)])
+
+    async def _drain_body(self, request, reader):
+        """Consume an unused request body; False if the connection must close."""
+        if request.headers.get('Transfer-Encoding'):
+            return False
+        try:
+            length = int(request.headers.get('Content-Length') or 0)
+        except ValueError:
+            return False
+        if length > MAX_DRAIN_BODY_SIZE:
+            return False
+        if length > 0:
+            try:
+                await asyncio.wait_for(reader.readexactly(length), KEEPALIVE_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def _dispatch(self, request, reader, writer):
+        """Serve one request; return whether the connection can be reused."""
+        with state_lock:
+            panel_ready = state["panel_ready"]
+        route = request.route = route_request(request.method, request.path, panel_ready)
+
+        if route == "status_feed":
+            # Parked long-polls hold no slot, so they cannot starve page requests
+            return await self._serve_status_feed(request, reader, writer)
+        async with self._semaphore:
+            return await self._serve_route(request, route, reader, writer)
+
+    async def _serve_status_feed(self, request, reader, writer):
+        if not await self._drain_body(request, reader):
+            request.keep_alive = False
+        since = status_since(request.path.partition('?')[2])
+        self.long_polls += 1
+        try:
+            await status_feed.wait_async(since, STATUS_LONG_POLL_TIMEOUT)
+        finally:
+            self.long_polls -= 1
+        await self._send_local(request, writer, build_status_feed_response(since))
+        return request.keep_alive
+
+    async def _serve_route(self, request, route, reader, writer):
+        if route == "panel":
+            return await self._serve_panel(request, reader, writer)
+
+        body = None
+        if route in BODY_ROUTES:
+            try:
+                body = await self._read_local_body(request, reader)
+            except RequestBodyTooLarge as e:
+                log.info("Rejecting %s %s: %s", request.method, request.path, e)
+                return await self._send_request_too_large(request, writer)
+            except ClientBodyError as e:
+                log.info("Dropping %s %s: %s", request.method, request.path, e)
+                return await self._send_client_body_error(request, writer, e)
+        elif not await self._drain_body(request, reader):
+            request.keep_alive = False
+
+        if route in self.INLINE_ROUTES:
+            response = build_local_response(route, body)
+        else:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(None, build_local_response, route, body)
+        await self._send_local(request, writer, response)
+        return request.keep_alive
+
+    async def _serve_panel(self, request, reader, writer):
+        if needs_instructions_page(request.path):
+            loop = asyncio.get_running_loop()
+            try:
+                response = await loop.run_in_executor(None, instructions_response)
+            except FileNotFoundError:
+                log.warning(f"Instructions file not found: {INSTRUCTIONS_HTML_PATH}")
+                # Fallback: proxy to installer instead of redirecting (avoid CSP issues)
+                request.method, request.path = 'GET', '/installer'
             else:
-                print(f"[proxy] Proxying {method} {self.path} -> {target_url} (no body)")
+                if not await self._drain_body(request, reader):
+                    request.keep_alive = False
+                await self._send_local(request, writer, response)
+                await loop.run_in_executor(None, mark_instructions_shown)
+                return request.keep_alive
+        return await self._proxy(request, reader, writer)
+
+    async def _proxy(self, request, reader, writer):
+        """Proxy a request to the Panel; mirrors ProxyHandler._proxy_to_panel."""
+        method, path = request.method, request.path
+        response_started = False
+        flight = None
+        try:
+            asset_key = asset_cache_key(method, path, request.headers)
+            entry = asset_cache.lookup(asset_key) if asset_key is not None else None
+            if entry is not None and entry.is_fresh() and not request_wants_revalidation(request.headers):
+                response_started = True
+                await self._relay_shared(request, writer,
+                                         cached_asset_response(entry, request.headers, 'HIT'))
+                return request.keep_alive
+
+            key = coalesce_key(method, path, request.headers)
+            if key is not None:
+                flight, leader = request_coalescer.join(key)
+                if not leader:
+                    shared = await request_coalescer.wait_async(flight, UPSTREAM_TIMEOUT)
+                    flight = None
+                    if shared is not None:
+                        log.debug("Coalesced %s %s (async)", method, path)
+                        response_started = True
+                        await self._relay_shared(request, writer, shared)
+                        return request.keep_alive
 
-            req = urllib.request.Request(target_url, data=body, method=method)
+            try:
+                chunked, length = request_body_framing(request.headers)
+            except RequestBodyTooLarge as e:
+                log.info("Rejecting %s %s: %s", method, path, e)
+                return await self._send_request_too_large(request, writer)
+
+            if request.headers.get('Expect', '').lower() == '100-continue' and (chunked or length):
+                writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+
+            # Small bodies are buffered so the request can be replayed on a
+            # stale pooled connection, larger ones are streamed
+            body = body_iter = None
+            if chunked or length > PROXY_CHUNK_SIZE:
+                body_iter = iter_client_body_async(reader, chunked, length, max_size=MAX_REQUEST_BODY_SIZE)
+            elif length:
+                body = await read_client_body_async(reader, length)
+            log.debug("Proxying %s %s (async)", method, path)
+
+            upstream_headers = build_upstream_headers(request.headers, request.client_ip)
+            if asset_key is not None:
+                upstream_headers = asset_request_headers(upstream_headers, entry)
+            try:
+                up_reader, up_writer, status, response_headers = await self._send_upstream(
+                    method, path, upstream_headers, body, body_iter, None if chunked else length)
+            except RequestBodyTooLarge as e:
+                log.info("Rejecting %s %s: %s", method, path, e)
+                return await self._send_request_too_large(request, writer)
+
+            # Upstream body framing
+            has_body = method != 'HEAD' and status not in (204, 304)
+            up_chunked, up_length = response_body_framing(response_headers)
+            reusable = (response_headers.get('Connection', '').lower() != 'close'
+                        and (not has_body or up_chunked or up_length is not None))
 
-            # Get client IP
-            client_ip = self.client_address[0] if self.client_address else '127.0.0.1'
+            try:
+                chunks = _chain_body(b'', None)
+                if has_body:
+                    chunks = iter_body_async(up_reader, up_chunked, up_length, UPSTREAM_TIMEOUT)
+                if asset_key is not None:
+                    cached = None
+                    if entry is not None and status == 304:
+                        asset_cache.refresh(entry, response_headers)
+                        cached = cached_asset_response(entry, request.headers, 'REVALIDATED')
+                    elif asset_cache.storable(status, response_headers, up_length):
+                        buffered, complete = await buffer_body_async(chunks, asset_cache.max_entry_size)
+                        chunks = _chain_body(buffered, None if complete else chunks)
+                        if complete:
+                            entry = asset_cache.store(asset_key, status, response_headers, buffered)
+                            cached = cached_asset_response(entry, request.headers, 'MISS')
+                    if cached is not None:
+                        # The upstream body (if any) was read: answer from the cache
+                        status, response_headers = cached.status, cached.headers
+                        has_body = status not in (204, 304)
+                        up_length = response_body_framing(response_headers)[1]
+                        chunks = _chain_body(cached.body, None)
+                if flight is not None:
+                    # Release the waiting followers before relaying to this client
+                    shared = None
+                    if coalescable_response(status, response_headers, up_length):
+                        buffered, complete = await buffer_body_async(chunks, COALESCE_MAX_BODY_SIZE)
+                        if complete:
+                            shared = SharedResponse(status, response_headers, buffered)
+                        chunks = _chain_body(buffered, None if complete else chunks)
+                    request_coalescer.complete(flight, shared)
+                    flight = None
+                response_started = True
+                with metrics.timer("upstream_transfer_seconds"):
+                    await self._relay(request, writer, status, response_headers, has_body,
+                                      up_length, chunks)
+            except BaseException:
+                up_writer.close()
+                raise
+            upstream_pool.release(up_reader, up_writer, reusable)
+            return request.keep_alive
+
+        except ClientBodyError as e:
+            # The client's fault, not the Panel's: no rearm, no 502
+            log.info("Dropping %s %s: %s", method, path, e)
+            if response_started:
+                return False
+            return await self._send_client_body_error(request, writer, e)
+        except Exception as e:
+            # Network errors, and malformed upstream replies (ValueError, UnicodeDecodeError...)
+            log.warning("Proxy error: %s: %s", type(e).__name__, e)
+            if response_started:
+                return False
+            monitor_schedule.rearm("proxy error")
+            error_msg = json.dumps({"error": f"Proxy error: {e}"}).encode('utf-8')
+            request.keep_alive = False
+            await self._send_local(request, writer, LocalResponse(
+                502, 'application/json', error_msg, None, ()))
+            return False
+        finally:
+            if flight is not None:
+                request_coalescer.complete(flight, None)
+
+    async def _send_request_too_large(self, request, writer):
+        # The rest of the body is still unread on the socket
+        request.keep_alive = False
+        await self._send_local(request, writer, LocalResponse(
+            413, 'application/json', b'{"error": "Request body too large"}', None, ()))
+        return False
 
-            # Add Host header for internal request
-            # Use localhost since Caddy listens on :8080 without host restriction
-            # Using APP_URL host would cause DSM nginx to intercept the request
-            req.add_header('Host', f'127.0.0.1:{PANEL_INTERNAL_PORT}')
+    async def _send_client_body_error(self, request, writer, error):
+        # The body can no longer be framed: answer, then close
+        request.keep_alive = False
+        error_msg = json.dumps({"error": f"Bad request body: {error}"}).encode('utf-8')
+        await self._send_local(request, writer, LocalResponse(
+            error.status, 'application/json', error_msg, None, ()))
+        return False
 
-            for header, value in self.headers.items():
-                if header.lower() not in ('host', 'content-length'):
-                    req.add_header(header, value)
+    async def _relay_shared(self, request, writer, shared):
+        """Send a SharedResponse (coalesced or cached) to the client."""
+        has_body = request.method != 'HEAD' and shared.status not in (204, 304)
+        await self._relay(request, writer, shared.status, shared.headers, has_body,
+                          response_body_framing(shared.headers)[1], _chain_body(shared.body, None))
 
-            # Add proxy headers so Laravel knows the original request details
-            fwd_host = self.headers.get('X-Forwarded-Host')
-            fwd_port = self.headers.get('X-Forwarded-Port')
-            fwd_proto = self.headers.get('X-Forwarded-Proto')
+    async def _relay(self, request, writer, status, response_headers, has_body, up_length, chunks):
+        """Send an upstream response whose body is read from `chunks`."""
+        content_type = response_headers.get('Content-Type', '')
+        log.debug("Response: %s %s", status, content_type)
 
-            if fwd_host:
-                req.add_header('X-Forwarded-Host', fwd_host)
-                req.add_header('X-Forwarded-Port', fwd_port or str(LISTEN_PORT))
-                req.add_header('X-Forwarded-Proto', fwd_proto or 'http')
+        rewriter = make_rewriter(status, response_headers, request.headers) if has_body else None
+        if rewriter is not None:
+            out_headers = rewriter.headers(response_headers.items())
+        else:
+            out_headers = [(name, value) for name, value in response_headers.items()
+                           if name.lower() not in HOP_BY_HOP_HEADERS]
+        client_chunked = has_body and (rewriter is not None or up_length is None)
+        if client_chunked:
+            if request.version == 'HTTP/1.0':
+                request.keep_alive = False
+                client_chunked = False
             else:
-                app_url = get_app_url_parts()
-                if app_url:
-                    req.add_header('X-Forwarded-Host', app_url['host'])
-                    req.add_header('X-Forwarded-Port', app_url['port'])
-                    req.add_header('X-Forwarded-Proto', app_url['proto'])
-                else:
-                    original_host = self.headers.get('Host', f'localhost:{LISTEN_PORT}')
-                    req.add_header('X-Forwarded-Host', original_host.split(':')[0])
-                    req.add_header('X-Forwarded-Port', str(LISTEN_PORT))
-                    req.add_header('X-Forwarded-Proto', 'http')
-
-            fwd_for = self.headers.get('X-Forwarded-For', client_ip)
-            real_ip = self.headers.get('X-Real-IP', client_ip)
-            req.add_header('X-Forwarded-For', fwd_for)
-            req.add_header('X-Real-IP', real_ip)
-
-            # IMPORTANT: Don't follow redirects automatically!
-            # Laravel generates redirects with APP_URL (https://...) which urllib would
-            # try to follow, causing "HTTP request sent to HTTPS port" errors.
-            # We must return the redirect to the client and let panel.cgi handle URL rewriting.
-            class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
-                def http_error_302(self, req, fp, code, msg, headers):
-                    return fp  # Return the response as-is, don't follow
-                http_error_301 = http_error_303 = http_error_307 = http_error_308 = http_error_302
-
-            opener = urllib.request.build_opener(NoRedirectHandler)
-            with opener.open(req, timeout=30) as response:
-                content_type = response.getheader('Content-Type', '')
-                print(f"[proxy]   Response: {response.status} {content_type}")
-
-                if method == 'HEAD':
-                    self.send_response(response.status)
-                    for header, value in response.getheaders():
-                        if header.lower() not in ('transfer-encoding', 'connection'):
-                            self.send_header(header, value)
-                    self.end_headers()
-                    return
-
-                response_body = response.read()
-
-                # Rewrite absolute URLs to relative paths for CGI proxy compatibility
-                # The container generates URLs like http://127.0.0.1:PORT/... which need to
-                # be converted to relative paths so they work through the CGI proxy
-                if 'text/html' in content_type:
-                    # Rewrite all localhost URLs with various ports to relative paths
-                    # Match http(s)://127.0.0.1:PORT/ or http(s)://localhost:PORT/
-                    response_body = re.sub(
-                        rb'https?://(?:127\.0\.0\.1|localhost)(?::\d+)?/',
-                        b'/',
-                        response_body
-                    )
-
-                # Inject script into HTML responses
-                if 'text/html' in content_type and b'</head>' in response_body:
-                    response_body = response_body.replace(b'</head>', self.IFRAME_FIX_SCRIPT + b'</head>')
-
-                self.send_response(response.status)
-                for header, value in response.getheaders():
-                    if header.lower() not in ('transfer-encoding', 'connection', 'content-length'):
-                        self.send_header(header, value)
-                self.send_header('Content-Length', len(response_body))
-                self.end_headers()
-                self.wfile.write(response_body)
-
-        except urllib.error.HTTPError as e:
-            error_body = e.read()
-            print(f"[proxy]   HTTP Error: {e.code}")
-            if 'livewire' in self.path.lower():
-                print(f"[proxy]   Error body: {error_body[:500].decode('utf-8', errors='replace')}")
-            self.send_response(e.code)
-            for header, value in e.headers.items():
-                if header.lower() not in ('transfer-encoding', 'connection'):
-                    self.send_header(header, value)
-            self.end_headers()
-            self.wfile.write(error_body)
-        except Exception as e:
-            print(f"[proxy] Proxy error: {type(e).__name__}: {e}")
-            error_msg = f'{{"error": "Proxy error: {str(e)}"}}'.encode('utf-8')
-            self.send_response(502)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Content-Length', len(error_msg))
-            self.end_headers()
-            self.wfile.write(error_msg)
-
-
-class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    allow_reuse_address = True
-    daemon_threads = True
+                out_headers.append(('Transfer-Encoding', 'chunked'))
+
+        writer.write(self._response_head(request, status, out_headers))
+        if has_body:
+            async for data in chunks:
+                if rewriter is not None:
+                    data = rewriter.feed(data)
+                if data:
+                    writer.write(_frame_chunk(data) if client_chunked else data)
+                    await writer.drain()  # Backpressure from slow clients
+            if rewriter is not None:
+                data = rewriter.flush()
+                if data:
+                    writer.write(_frame_chunk(data) if client_chunked else data)
+            if client_chunked:
+                writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def _send_upstream(self, method, path, headers, body, body_iter, body_length):
+        """Send a request to Caddy; return (reader, writer, status, headers).
+
+        Like UpstreamPool.request(): a stale pooled connection is retried once
+        on a fresh one, and streamed bodies always use a fresh connection.
+        """
+        streamed = body_iter is not None
+        retried = False
+        breaker = upstream_pool.breaker
+        while True:
+            try:
+                reader, writer, reused = await upstream_pool.acquire(fresh=retried or streamed)
+            except (OSError, asyncio.TimeoutError):
+                if breaker is not None:
+                    breaker.record_failure()
+                raise
+            try:
+                started = time.perf_counter()
+                lines = [f"{method} {path} HTTP/1.1"]
+                lines.extend(f"{name}: {value}" for name, value in headers)
+                if body is not None:
+                    lines.append(f"Content-Length: {len(body)}")
+                elif streamed and body_length is not None:
+                    lines.append(f"Content-Length: {body_length}")
+                elif streamed:
+                    lines.append("Transfer-Encoding: chunked")
+                writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+                if body is not None:
+                    writer.write(body)
+                elif streamed:
+                    async for data in body_iter:
+                        writer.write(data if body_length is not None else _frame_chunk(data))
+                        await writer.drain()
+                    if body_length is None:
+                        writer.write(b'0\r\n\r\n')
+                await writer.drain()
+
+                while True:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), UPSTREAM_TIMEOUT)
+                    status_line, _, header_block = head.partition(b'\r\n')
+                    status = int(status_line.split()[1])
+                    if status >= 200:
+                        break  # Skip interim 1xx responses
+                metrics.observe("upstream_ttfb_seconds", time.perf_counter() - started)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if not reused:
+                    raise
+                upstream_pool._stats["retries"] += 1
+                upstream_pool.clear()
+                retried = True
+                continue
+            except BaseException:
+                writer.close()
+                raise
+            if breaker is not None:
+                breaker.record_success()
+            return reader, writer, status, http.client.parse_headers(io.BytesIO(header_block))
 
 
 def signal_handler(signum, frame):
@@ -1203,13 +4899,7 @@ def check_wings_status():
 
     try:
         # Check if Wings container is running
-        result = subprocess.run(
-            ["docker", "inspect", "-f", "{{.State.Running}}", "pelican_panel-wings-1"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        running = result.stdout.strip().lower() == "true"
+        running = docker_client.is_running(WINGS_CONTAINER_NAME)
     except Exception:
         pass
 
@@ -1227,76 +4917,31 @@ def get_wings_config():
     return ""
 
 
-def save_wings_config(config_content):
-    """Save Wings configuration and restart the package.
-
-    Applies automatic fixes for Docker-in-Docker setup on Synology:
-    1. Fixes API port: Panel generates 8445 (external), but container needs 8080 (internal)
-    2. Fixes system paths: Uses host paths instead of container paths for bind mounts
-    3. Disables mount_passwd: The passwd_file path doesn't exist on host
-    4. Fixes tmp_directory: Must be host path for install scripts
-    """
-    try:
-        # Create directory if needed
-        os.makedirs(os.path.dirname(WINGS_CONFIG_PATH), exist_ok=True)
-
-        # === FIX 1: API Port ===
-        # The Panel generates config with external port (8445), but Wings inside
-        # the container must listen on internal port (8080) because Docker maps 8445:8080
-        config_content = re.sub(
-            r'(\n\s*port:\s*)8445(\s*\n)',
-            r'\g<1>8080\2',
-            config_content
-        )
-
-        # === FIX 2: System Paths for Docker-in-Docker ===
-        # Wings runs in a container but creates game server containers via mounted Docker socket.
-        # Those containers need HOST paths, not container paths.
-        # Replace /var/lib/pelican/* with actual Synology host paths.
-        path_mappings = [
-            (r'/var/lib/pelican/volumes', f'{DATA_ROOT}/servers'),
-            (r'/var/lib/pelican/backups', f'{DATA_ROOT}/backups'),
-            (r'/var/lib/pelican/archives', f'{DATA_ROOT}/archives'),
-            (r'/var/log/pelican', f'{DATA_ROOT}/wings-logs'),
-        ]
-        for old_path, new_path in path_mappings:
-            config_content = config_content.replace(old_path, new_path)
-
-        # Also fix root_directory if present
-        config_content = re.sub(
-            r'(\s*root_directory:\s*)/var/lib/pelican\s*\n',
-            f'\\g<1>{DATA_ROOT}\n',
-            config_content
-        )
-
-        # === FIX 3: Disable mount_passwd ===
-        # The passwd_file path /etc/pelican/passwd is inside the Wings container,
-        # but Docker tries to mount it from the HOST where it doesn't exist.
-        # Disabling mount_passwd avoids this issue.
-        config_content = re.sub(
-            r'(\s*mount_passwd:\s*)true',
-            r'\g<1>false',
-            config_content
-        )
-
-        # === FIX 4: tmp_directory ===
-        # The tmp_directory is used for install scripts. It must be a host path
-        # so Docker can mount it when creating install containers.
-        config_content = re.sub(
-            r'(\s*tmp_directory:\s*)/tmp/pelican\s*\n',
-            f'\\g<1>{DATA_ROOT}/tmp\n',
-            config_content
-        )
-
-        # Create tmp directory
-        os.makedirs(f'{DATA_ROOT}/tmp', exist_ok=True)
-        os.chmod(f'{DATA_ROOT}/tmp', 0o777)
-
-        # Auto-append Docker network config if not present
-        # This prevents "Pool overlaps" errors with default Docker network settings
-        # Uses 172.31.x.x to avoid conflict with pelican_network (172.30.x.x)
-        if 'docker:' not in config_content:
-            docker_config = """
+# Docker-in-Docker fixes of the Wings config, applied by transform_wings_config().
+# Wings runs in a container but creates game server containers through the
+# mounted Docker socket: those need HOST paths, not container paths.
+WINGS_PATH_MAPPINGS = (
+    ('/var/lib/pelican/volumes', f'{DATA_ROOT}/servers'),
+    ('/var/lib/pelican/backups', f'{DATA_ROOT}/backups'),
+    ('/var/lib/pelican/archives', f'{DATA_ROOT}/archives'),
+    ('/var/log/pelican', f'{DATA_ROOT}/wings-logs'),
+)
+# (key, value) -> fixed value; a tuple is written as a block list
+WINGS_VALUE_FIXES = {
+    # The Panel generates the external port (8445), Wings listens on 8080 in its container
+    ('port', '8445'): '8080',
+    ('root_directory', '/var/lib/pelican'): DATA_ROOT,
+    # /etc/pelican/passwd only exists inside the Wings container, not on the host
+    ('mount_passwd', 'true'): 'false',
+    # Install scripts are mounted from tmp_directory: it must be a host path
+    ('tmp_directory', '/tmp/pelican'): f'{DATA_ROOT}/tmp',
+    # Same fixes as wings-config-watcher.sh, so it finds nothing left to fix (and restart)
+    ('allowed_origins', '[]'): ('"*"',),
+    ('ignore_panel_config_updates', 'false'): 'true',
+}
+# Appended when the config has no docker section. Avoids "Pool overlaps" errors
+# with the default Docker network: 172.31.x.x does not clash with pelican_network (172.30.x.x)
+WINGS_DOCKER_CONFIG = """
 docker:
   network:
     interface: 172.31.0.1
@@ -1315,25 +4960,262 @@ docker:
         subnet: 172.31.0.0/16
         gateway: 172.31.0.1
 """
-            config_content = config_content.rstrip() + "\n" + docker_config
-
-        # Save config
-        with open(WINGS_CONFIG_PATH, 'w') as f:
-            f.write(config_content)
-        os.chmod(WINGS_CONFIG_PATH, 0o640)
-
-        # Restart Wings container
-        subprocess.Popen(
-            ["docker", "compose", "-f", "/var/packages/pelican_panel/target/share/docker/compose.yaml",
-             "--env-file", "/var/packages/pelican_panel/var/panel.env",
-             "restart", "wings"],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
+WINGS_DOCKER_KEY_RE = re.compile(r'^docker[ ]*:', re.MULTILINE)
+# One line of a block-style YAML document: "[- ][key:] [value] [# comment]"
+WINGS_YAML_LINE_RE = re.compile(
+    r'(?P<indent>[ ]*)(?P<dash>-(?:[ ]+|$))?'
+    r'(?:(?P<key>"[^"]*"|\'[^\']*\'|[^\s#"\'][^:#]*?)[ ]*:(?=[ ]|$))?'
+    r'[ ]*(?P<value>.*?)(?P<comment>[ ]+#.*)?$')
+
+
+def _yaml_scalar(value):
+    """Value of a YAML scalar without its quotes."""
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    return value
+
+
+def transform_wings_config(content):
+    """Apply the Docker-in-Docker fixes to a Wings config.yml in one pass.
+
+    The YAML is walked line by line, keeping the key path of each value
+    (Wings configs are plain block mappings and lists). Fixed values are
+    rewritten in place, other lines are kept as is. Returns (text, hash):
+    the hash covers key paths and values only, so comments, quoting,
+    blank lines and key order are not changes.
+    """
+    if not WINGS_DOCKER_KEY_RE.search(content):
+        content = content.rstrip() + "\n" + WINGS_DOCKER_CONFIG
+
+    lines = []
+    entries = []  # ("api/port", "8080") for each value, for the hash
+    stack = []  # (indent, path component) of the open mappings and list items
+    list_items = {}  # Path of a list -> items seen so far
+    block_indent = block_path = None  # Key owning a "|" or ">" block scalar
+    for raw in content.splitlines():
+        stripped = raw.strip()
+        indent = len(raw) - len(raw.lstrip(' '))
+        if block_indent is not None:
+            if not stripped or indent > block_indent:
+                entries.append((block_path, stripped))
+                lines.append(raw)
+                continue
+            block_indent = None
+        if not stripped or stripped.startswith('#'):
+            lines.append(raw)
+            continue
+
+        match = WINGS_YAML_LINE_RE.match(raw)
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        path = tuple(component for _, component in stack)
+        dash = match.group('dash')
+        if dash:
+            index = list_items.get(path, 0)
+            list_items[path] = index + 1
+            stack.append((indent, index))
+            path += (index,)
+            indent += len(dash)
+        value = match.group('value')
+        for old_path, new_path in WINGS_PATH_MAPPINGS:
+            if old_path in value:
+                value = value.replace(old_path, new_path)
+        key = match.group('key')
+        if key is not None:
+            key = _yaml_scalar(key)
+            path += (key,)
+            fix = WINGS_VALUE_FIXES.get((key, _yaml_scalar(value)))
+            if isinstance(fix, tuple):
+                lines.append(raw[:match.start('value')].rstrip())
+                entries.append(('/'.join(map(str, path)), ''))
+                for index, item in enumerate(fix):
+                    lines.append(f"{' ' * (indent + 2)}- {item}")
+                    entries.append(('/'.join(map(str, path + (index,))), _yaml_scalar(item)))
+                continue
+            if fix is not None:
+                value = fix
+            if not value:
+                stack.append((indent, key))  # Nested mapping or list (or null)
+            elif value[0] in '|>':
+                block_indent, block_path = indent, '/'.join(map(str, path))
+        if value != match.group('value'):
+            raw = raw[:match.start('value')] + value + raw[match.end('value'):]
+        lines.append(raw)
+        entries.append(('/'.join(map(str, path)), _yaml_scalar(value)))
+
+    semantic = json.dumps(sorted(entries), separators=(',', ':'))
+    return '\n'.join(lines) + '\n', hashlib.sha256(semantic.encode('utf-8')).hexdigest()
+
+
+class WingsConfigApplier:
+    """Writes Wings configs and restarts Wings only when they changed.
+
+    save() compares the semantic hash of the fixed config with the one Wings
+    was last (re)started with. Restarts run on a single worker thread once
+    `debounce` seconds passed without a new save, so a burst of saves
+    (double clicks...) costs one restart and restarts never overlap.
+    """
+
+    _UNKNOWN = object()
+
+    def __init__(self, path, debounce=WINGS_RESTART_DEBOUNCE, restart_timeout=WINGS_RESTART_TIMEOUT):
+        self.path = path
+        self.debounce = debounce
+        self.restart_timeout = restart_timeout
+        self._cond = threading.Condition()
+        self._applied_hash = self._UNKNOWN  # Config Wings runs with, read from disk on first save
+        self._target_hash = None  # Config last written
+        self._force = False  # Restart even if the config matches (Wings was stopped)
+        self._due_at = None
+        self._requested_at = None  # First save not applied yet, for the apply latency
+        self._worker = None
+        self._restarting = False
+        self._last_apply = None
+        self._stats = {"saves": 0, "unchanged": 0, "restarts": 0, "coalesced": 0, "failures": 0}
+
+    def _file_hash(self):
+        try:
+            with open(self.path, 'r') as f:
+                return transform_wings_config(f.read())[1]
+        except OSError:
+            return None
+
+    def _write(self, text):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.chmod(tmp_path, 0o640)
+        os.replace(tmp_path, self.path)
+
+    def save(self, content):
+        """Fix and write `content`; return True if Wings is going to restart.
+
+        OSError from writing the file propagates.
+        """
+        started = time.monotonic()
+        text, semantic_hash = transform_wings_config(content)
+        try:
+            running = docker_client.is_running(WINGS_CONTAINER_NAME)
+        except Exception:
+            running = False
+        with self._cond:
+            if self._applied_hash is self._UNKNOWN:
+                self._applied_hash = self._file_hash()
+            self._write(text)
+            self._stats["saves"] += 1
+            self._target_hash = semantic_hash
+            if self._requested_at is None:
+                self._requested_at = started
+            if semantic_hash == self._applied_hash and running:
+                self._stats["unchanged"] += 1
+                if self._worker is None:
+                    self._finish("unchanged")
+                return False  # A pending restart will find nothing to apply
+            self._force = self._force or not running
+            self._due_at = time.monotonic() + self.debounce
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="wings-restart", daemon=True)
+                self._worker.start()
+            else:
+                self._stats["coalesced"] += 1
+                self._cond.notify_all()
+            return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while time.monotonic() < self._due_at:
+                    self._cond.wait(self._due_at - time.monotonic())
+                target = self._target_hash
+                if target == self._applied_hash and not self._force:
+                    self._finish("unchanged")  # Later saves went back to the running config
+                    self._worker = None
+                    return
+                self._force = False
+                self._restarting = True
+            success = self._restart()
+            with self._cond:
+                self._restarting = False
+                if success:
+                    self._applied_hash = target
+                    self._stats["restarts"] += 1
+                else:
+                    self._stats["failures"] += 1
+                if self._target_hash != target or self._force:
+                    continue  # Saved again during the restart
+                self._finish("restarted" if success else "failed")
+                self._worker = None
+                return
+
+    def _restart(self):
+        log.info("Restarting Wings to apply its configuration")
+        try:
+            process = spawn(
+                ["docker", "compose", "-f", "/var/packages/pelican_panel/target/share/docker/compose.yaml",
+                 "--env-file", "/var/packages/pelican_panel/var/panel.env",
+                 "restart", "wings"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            returncode = process.wait(timeout=self.restart_timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            log.warning(f"Wings restart timed out after {self.restart_timeout}s")
+            return False
+        except OSError as e:
+            log.warning(f"Could not restart Wings: {e}")
+            return False
+        if returncode != 0:
+            log.warning(f"Wings restart failed with code {returncode}")
+            return False
+        return True
+
+    def _finish(self, outcome):
+        # Called with the lock held
+        seconds = time.monotonic() - self._requested_at
+        self._requested_at = None
+        self._last_apply = {"outcome": outcome, "seconds": round(seconds, 3), "at": int(time.time())}
+        metrics.observe("wings_apply_seconds", seconds, outcome=outcome)
+        log.info(f"Wings configuration applied ({outcome}) in {seconds:.1f}s")
+
+    def snapshot(self):
+        with self._cond:
+            snapshot = dict(self._stats)
+            if self._restarting:
+                snapshot["state"] = "restarting"
+            else:
+                snapshot["state"] = "pending" if self._worker is not None else "idle"
+            snapshot["last_apply"] = self._last_apply
+            return snapshot
+
+
+wings_applier = WingsConfigApplier(WINGS_CONFIG_PATH)
+
+
+def save_wings_config(config_content):
+    """Save Wings configuration and restart Wings if it changed.
+
+    transform_wings_config() applies automatic fixes for Docker-in-Docker setup on Synology:
+    1. Fixes API port: Panel generates 8445 (external), but container needs 8080 (internal)
+    2. Fixes system paths: Uses host paths instead of container paths for bind mounts
+    3. Disables mount_passwd: The passwd_file path doesn't exist on host
+    4. Fixes tmp_directory: Must be host path for install scripts
+    5. Adds the docker network section when missing
+
+    Returns (success, message, restart).
+    """
+    try:
+        # Create tmp directory
+        os.makedirs(f'{DATA_ROOT}/tmp', exist_ok=True)
+        os.chmod(f'{DATA_ROOT}/tmp', 0o777)
 
-        return True, "Configuration saved"
+        if wings_applier.save(config_content):
+            return True, "Configuration saved", True
+        return True, "Configuration unchanged", False
     except Exception as e:
-        return False, str(e)
+        return False, str(e), False
 
 
 def get_wings_config_html():
@@ -1611,7 +5493,9 @@ def get_wings_config_html():
             try {
                 const response = await apiCall('save-config', 'POST', { config: config });
                 const data = await response.json();
-                if (data.success) {
+                if (data.success && !data.restart) {
+                    showSuccess("Configuration enregistree, inchangee : Wings n'est pas redemarre");
+                } else if (data.success) {
                     showSuccess('Configuration enregistree ! Wings redemarre...');
                     setTimeout(checkStatus, 3000);
                 } else {
@@ -1673,31 +5557,55 @@ def get_wings_config_html():
 
 
 def main():
-    global LISTEN_PORT, PANEL_INTERNAL_PORT, LOADING_HTML_PATH
-
-    if len(sys.argv) >= 2:
-        LISTEN_PORT = int(sys.argv[1])
-    if len(sys.argv) >= 3:
-        PANEL_INTERNAL_PORT = int(sys.argv[2])
-    if len(sys.argv) >= 4:
-        LOADING_HTML_PATH = sys.argv[3]
+    global LISTEN_PORT, PANEL_INTERNAL_PORT, LOADING_HTML_PATH, upstream_pool, http_server
+
+    parser = argparse.ArgumentParser(description="Pelican Panel loading proxy")
+    parser.add_argument('listen_port', nargs='?', type=int, default=LISTEN_PORT)
+    parser.add_argument('panel_port', nargs='?', type=int, default=PANEL_INTERNAL_PORT)
+    parser.add_argument('loading_html', nargs='?', default=LOADING_HTML_PATH)
+    parser.add_argument('--engine', choices=('threaded', 'asyncio'), default='threaded',
+                        help="serving engine: one thread per connection, or a single asyncio event loop")
+    parser.add_argument('--log-level', type=str.upper, choices=LOG_LEVELS, default=LOG_LEVEL,
+                        help="initial log level (changed at runtime with POST /api/log-level)")
+    parser.add_argument('--log-file', help=f"write the log to this file, rotated at {LOG_MAX_BYTES} bytes "
+                                           "(default: stdout)")
+    args = parser.parse_args()
+    log_manager.start(args.log_level, args.log_file)
+    LISTEN_PORT = args.listen_port
+    PANEL_INTERNAL_PORT = args.panel_port
+    LOADING_HTML_PATH = args.loading_html
 
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
 
-    print(f"[proxy] Pelican Loading Proxy")
-    print(f"[proxy]   Port: {LISTEN_PORT} -> {PANEL_INTERNAL_PORT}")
-    print(f"[proxy]   HTML: {LOADING_HTML_PATH} (exists: {os.path.exists(LOADING_HTML_PATH)})")
+    log.info("Pelican Loading Proxy")
+    log.info(f"Port: {LISTEN_PORT} -> {PANEL_INTERNAL_PORT}")
+    log.info(f"HTML: {LOADING_HTML_PATH} (exists: {os.path.exists(LOADING_HTML_PATH)})")
+    log.info(f"Engine: {args.engine}")
+
+    if args.engine == 'asyncio':
+        upstream_pool = AsyncUpstreamPool("127.0.0.1", PANEL_INTERNAL_PORT, breaker=upstream_breaker)
+    else:
+        upstream_pool = UpstreamPool("127.0.0.1", PANEL_INTERNAL_PORT, breaker=upstream_breaker)
 
     # Start monitor thread
     monitor = threading.Thread(target=monitor_status, daemon=True)
     monitor.start()
 
-    print(f"[proxy] Server starting...")
+    log.info("Server starting...")
+
+    if args.engine == 'asyncio':
+        http_server = AsyncProxyServer("0.0.0.0", LISTEN_PORT)
+        try:
+            http_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
 
-    with ThreadedTCPServer(("0.0.0.0", LISTEN_PORT), ProxyHandler) as server:
+    with ThreadedTCPServer(("0.0.0.0", LISTEN_PORT), ProxyHandler) as http_server:
+        log.info(f"Workers: {http_server.workers}, queue: {WORKER_QUEUE_SIZE}")
         try:
-            server.serve_forever()
+            http_server.serve_forever()
         except KeyboardInterrupt:
             pass
 
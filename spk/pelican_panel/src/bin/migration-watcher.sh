@@ -41,7 +41,8 @@ write_status() {
         }')
     fi
 
-    cat > "$STATUS_FILE" << EOF
+    # Write then rename, so the proxy never reads a half-written file
+    cat > "${STATUS_FILE}.tmp" << EOF
 {
     "progress": ${progress},
     "message": "${message}",
@@ -53,6 +54,7 @@ write_status() {
     "timestamp": $(date +%s)
 }
 EOF
+    mv -f "${STATUS_FILE}.tmp" "$STATUS_FILE"
 }
 
 # Check if container is running
@@ -20,6 +20,7 @@ DATA_DIR="${VAR_DIR}/data"
 LOADING_PROXY="${INSTALL_DIR}/bin/loading-proxy.py"
 LOADING_HTML="${INSTALL_DIR}/share/loading.html"
 PROXY_PID_FILE="${VAR_DIR}/loading-proxy.pid"
+PROXY_LOG_FILE="${VAR_DIR}/loading-proxy.log"  # Rotated by the proxy itself
 
 # Wings config watcher
 WATCHER_SCRIPT="${INSTALL_DIR}/bin/wings-config-watcher.sh"
@@ -70,8 +71,9 @@ start_loading_proxy()
 
     log "Starting loading proxy on port ${PANEL_PORT} (forwarding to ${PANEL_INTERNAL_PORT})..."
 
-    # Start proxy in background
-    python3 "${LOADING_PROXY}" "${PANEL_PORT}" "${PANEL_INTERNAL_PORT}" "${LOADING_HTML}" >> "${LOG_FILE}" 2>&1 &
+    # Start proxy in background (crash tracebacks still go to the package log)
+    python3 "${LOADING_PROXY}" "${PANEL_PORT}" "${PANEL_INTERNAL_PORT}" "${LOADING_HTML}" \
+        --log-file "${PROXY_LOG_FILE}" >> "${LOG_FILE}" 2>&1 &
     PROXY_PID=$!
     echo "${PROXY_PID}" > "${PROXY_PID_FILE}"
 
@@ -636,7 +638,7 @@ case "$1" in
         $0 start
         ;;
     log)
-        tail -n 200 -f "${LOG_FILE}"
+        tail -n 200 -f "${LOG_FILE}" "${PROXY_LOG_FILE}"
         ;;
     *)
         echo "Usage: $0 {start|stop|restart|status|log}"
@@ -0,0 +1,127 @@
+"""
+Helpers shared by the loading-proxy tests.
+
+Each test loads its own copy of loading-proxy.py (it is a script, not a
+package), so module globals patched by one test do not leak into others.
+
+Run from spk/pelican_panel: python3 -m unittest discover -s tests
+"""
+
+import http.client
+import http.server
+import importlib.util
+import os
+import socket
+import socketserver
+import threading
+import time
+
+PROXY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "bin", "loading-proxy.py")
+
+
+def load_proxy():
+    """Import a fresh copy of loading-proxy.py."""
+    spec = importlib.util.spec_from_file_location("loading_proxy", PROXY_PATH)
+    proxy = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(proxy)
+    return proxy
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+class UpstreamHandler(http.server.BaseHTTPRequestHandler):
+    """Fake Panel: answers every GET with a small HTML page."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = b'<html><body>panel</body></html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class UpstreamServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_upstream(handler=UpstreamHandler):
+    """Serve `handler` on a free port in a daemon thread; return the server."""
+    server = UpstreamServer(("127.0.0.1", free_port()), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_async_proxy(proxy, upstream_port, max_concurrency=None):
+    """Run proxy.AsyncProxyServer, Panel marked ready, in a daemon thread; return (server, port)."""
+    proxy.PANEL_INTERNAL_PORT = upstream_port
+    proxy.state["panel_ready"] = True
+    proxy.INSTALL_COMPLETE_FLAG = __file__  # Any existing file skips the instructions page
+    proxy.upstream_pool = proxy.AsyncUpstreamPool("127.0.0.1", upstream_port)
+    port = free_port()
+    kwargs = {} if max_concurrency is None else {"max_concurrency": max_concurrency}
+    server = proxy.AsyncProxyServer("127.0.0.1", port, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    if not wait_for_port(port):
+        raise RuntimeError("asyncio proxy did not start")
+    return server, port
+
+
+def start_threaded_proxy(proxy, upstream_port):
+    """Run proxy.ThreadedTCPServer, Panel marked ready, in a daemon thread; return (server, port)."""
+    proxy.PANEL_INTERNAL_PORT = upstream_port
+    proxy.state["panel_ready"] = True
+    proxy.INSTALL_COMPLETE_FLAG = __file__
+    proxy.upstream_pool = proxy.UpstreamPool("127.0.0.1", upstream_port)
+    port = free_port()
+    server = proxy.ThreadedTCPServer(("127.0.0.1", port), proxy.ProxyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, port
+
+
+def raw_request(port, data, timeout=5):
+    """Send raw bytes and return everything the server answers until it closes or goes quiet."""
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as sock:
+        sock.sendall(data)
+        chunks = []
+        try:
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        except socket.timeout:
+            pass
+        return b''.join(chunks)
+
+
+def get(port, path, timeout=10):
+    """GET `path`; return (status, body)."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
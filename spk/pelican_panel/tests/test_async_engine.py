@@ -0,0 +1,47 @@
+"""Tests of the asyncio serving engine (AsyncProxyServer)."""
+
+import socket
+import time
+import unittest
+
+import support
+
+
+class LongPollTest(unittest.TestCase):
+
+    def setUp(self):
+        self.proxy = support.load_proxy()
+        self.proxy.STATUS_LONG_POLL_TIMEOUT = 30
+        self.upstream = support.start_upstream()
+        self.server, self.port = support.start_async_proxy(self.proxy, self.upstream.server_address[1],
+                                                           max_concurrency=2)
+        self.sockets = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+        self.upstream.shutdown()
+        self.upstream.server_close()
+
+    def test_page_served_while_long_polls_exceed_concurrency(self):
+        self.proxy.status_feed.publish()
+        since = self.proxy.status_feed.version
+        for _ in range(self.server.max_concurrency * 3):
+            sock = socket.create_connection(("127.0.0.1", self.port), timeout=5)
+            sock.sendall(f"GET /api/loading-status?since={since} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+            self.sockets.append(sock)
+        deadline = time.monotonic() + 5
+        while self.server.long_polls < len(self.sockets) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.server.long_polls, len(self.sockets))
+
+        started = time.monotonic()
+        status, body = support.get(self.port, "/admin", timeout=10)
+        self.assertEqual(status, 200)
+        self.assertIn(b'panel', body)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(self.server.long_polls, len(self.sockets))
+
+
+if __name__ == "__main__":
+    unittest.main()
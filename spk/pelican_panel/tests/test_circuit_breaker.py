@@ -0,0 +1,96 @@
+"""Circuit breaker accounting, checked on both serving engines."""
+
+import time
+import unittest
+
+import support
+
+THRESHOLD = 3
+
+
+class SlowHandler(support.UpstreamHandler):
+    """Fake Panel that answers after the proxy's read timeout."""
+
+    def do_GET(self):
+        time.sleep(1)
+        try:
+            super().do_GET()
+        except ConnectionError:
+            pass  # The proxy gave up already
+
+
+class DiscardHandler(support.UpstreamHandler):
+    """Fake Panel dropping POSTs, whose bodies the proxy never completes."""
+
+    def do_POST(self):
+        self.close_connection = True
+
+
+def bad_chunked_post(path):
+    return (f"POST {path} HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: chunked\r\n\r\n"
+            "zz\r\nabc\r\n").encode()
+
+
+class CircuitBreakerTests:
+    """Mixed into one TestCase per engine."""
+
+    def setUp(self):
+        self.proxy = support.load_proxy()
+        self.proxy.monitor_schedule.rearm = lambda reason: None
+        self.upstream = None
+
+    def tearDown(self):
+        if self.upstream is not None:
+            self.upstream.shutdown()
+            self.upstream.server_close()
+
+    def start(self, upstream_port):
+        self.port = self.start_proxy(upstream_port)
+        self.breaker = self.proxy.CircuitBreaker(threshold=THRESHOLD, probe_interval=60)
+        self.proxy.upstream_pool.breaker = self.breaker
+
+    def test_connect_failures_open_circuit(self):
+        self.start(support.free_port())  # Nothing listens there
+        for _ in range(THRESHOLD):
+            status, _ = support.get(self.port, "/admin")
+            self.assertEqual(status, 502)
+        self.assertEqual(self.breaker.snapshot()["state"], "open")
+        self.assertFalse(self.proxy.state["panel_ready"])
+
+    def test_read_timeouts_are_not_counted(self):
+        self.upstream = support.start_upstream(SlowHandler)
+        self.start(self.upstream.server_address[1])
+        self.proxy.UPSTREAM_TIMEOUT = self.proxy.upstream_pool.timeout = 0.3
+        for _ in range(THRESHOLD + 1):
+            status, _ = support.get(self.port, "/admin")
+            self.assertEqual(status, 502)
+        self.assertEqual(self.breaker.snapshot()["state"], "closed")
+        self.assertEqual(self.breaker.snapshot()["failures"], 0)
+        self.assertTrue(self.proxy.state["panel_ready"])
+
+    def test_client_body_errors_are_not_counted(self):
+        self.upstream = support.start_upstream(DiscardHandler)
+        self.start(self.upstream.server_address[1])
+        for _ in range(THRESHOLD + 1):
+            reply = support.raw_request(self.port, bad_chunked_post("/upload"))
+            self.assertTrue(reply.startswith(b"HTTP/1.1 400"), reply[:100])
+        self.assertEqual(self.breaker.snapshot()["failures"], 0)
+        self.assertTrue(self.proxy.state["panel_ready"])
+        status, _ = support.get(self.port, "/admin")
+        self.assertEqual(status, 200)
+
+
+class ThreadedCircuitBreakerTest(CircuitBreakerTests, unittest.TestCase):
+
+    def start_proxy(self, upstream_port):
+        return support.start_threaded_proxy(self.proxy, upstream_port)[1]
+
+
+class AsyncCircuitBreakerTest(CircuitBreakerTests, unittest.TestCase):
+
+    def start_proxy(self, upstream_port):
+        return support.start_async_proxy(self.proxy, upstream_port)[1]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+"""Tests of DockerClient and demux_stream against a fake Engine API on a unix socket."""
+
+import http.server
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+
+import support
+
+proxy = support.load_proxy()
+
+
+def frame(stream, payload):
+    """One frame of a multiplexed (non-TTY) Docker stream."""
+    return bytes([stream, 0, 0, 0]) + len(payload).to_bytes(4, 'big') + payload
+
+
+LOG_FRAMES = (frame(1, b"line one\nline t") + frame(2, b"wo\nerror line\n")
+              + frame(1, b"x" * 5000 + b"\n") + frame(1, b"last"))
+EXEC_FRAMES = frame(1, b"Migrating...\n") + frame(2, b"SQLSTATE[HY000] failed\n")
+
+
+class ChunkedResponse:
+    """Stand-in for an HTTPResponse whose read1() returns the given pieces."""
+
+    def __init__(self, pieces):
+        self.pieces = list(pieces)
+
+    def read1(self, size):
+        return self.pieces.pop(0) if self.pieces else b''
+
+
+class EngineHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        return "docker.sock"
+
+    def _json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, data, piece=7):
+        # Raw stream until the connection closes, written in small pieces so
+        # frames (and frame headers) arrive split across reads
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.docker.raw-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.flush()
+        for start in range(0, len(data), piece):
+            self.wfile.write(data[start:start + piece])
+            self.wfile.flush()
+            if start % (piece * 20) == 0:
+                time.sleep(0.001)
+        self.close_connection = True
+
+    def do_GET(self):
+        self.requests.append(('GET', self.path))
+        if self.path.startswith('/v1.41/containers/panel/logs'):
+            self._stream(LOG_FRAMES)
+        elif self.path == '/v1.41/containers/panel/json':
+            self._json(200, {"State": {"Running": True, "StartedAt": "2024-01-01T00:00:00Z"}})
+        elif self.path == '/v1.41/exec/exec1/json':
+            self._json(200, {"ExitCode": 3, "Running": False})
+        else:
+            self._json(404, {"message": "No such container: missing"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        self.requests.append(('POST', self.path, body))
+        if self.path == '/v1.41/containers/panel/exec':
+            self._json(201, {"Id": "exec1"})
+        elif self.path == '/v1.41/exec/exec1/start':
+            self._stream(EXEC_FRAMES)
+        else:
+            self._json(404, {"message": "not found"})
+
+
+class EngineServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class DemuxStreamTest(unittest.TestCase):
+
+    def test_frames_split_across_reads(self):
+        data = frame(1, b"hello ") + frame(2, b"world") + frame(1, b"!")
+        for size in (1, 3, 8, 9, len(data)):
+            pieces = [data[i:i + size] for i in range(0, len(data), size)]
+            self.assertEqual(b''.join(proxy.demux_stream(ChunkedResponse(pieces))), b"hello world!", size)
+
+    def test_frames_are_yielded_whole(self):
+        data = frame(1, b"abc") + frame(2, b"defg")
+        pieces = [data[:5], data[5:13], data[13:]]
+        self.assertEqual(list(proxy.demux_stream(ChunkedResponse(pieces))), [b"abc", b"defg"])
+
+    def test_tty_stream_is_passed_through(self):
+        pieces = [b"plain ", b"tty output\n"]
+        self.assertEqual(b''.join(proxy.demux_stream(ChunkedResponse(pieces))), b"plain tty output\n")
+
+    def test_short_tty_stream(self):
+        self.assertEqual(b''.join(proxy.demux_stream(ChunkedResponse([b"ok\n"]))), b"ok\n")
+
+
+class DockerClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmp, "docker.sock")
+        self.server = EngineServer(self.socket_path, EngineHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        EngineHandler.requests = []
+        self.client = proxy.DockerClient(self.socket_path, timeout=5)
+
+    def tearDown(self):
+        if self.client._connection is not None:
+            self.client._connection.close()  # Shared keep-alive connection
+        self.server.shutdown()
+        self.server.server_close()
+        os.unlink(self.socket_path)
+        os.rmdir(self.tmp)
+
+    def test_logs_demultiplexed(self):
+        logs = self.client.logs("panel", tail=100)
+        self.assertEqual(logs, "line one\nline two\nerror line\n" + "x" * 5000 + "\nlast")
+        self.assertIn("tail=100", EngineHandler.requests[0][1])
+
+    def test_stream_logs_lines(self):
+        lines = list(self.client.stream_logs("panel", follow=False, timeout=5))
+        self.assertEqual(lines, ["line one", "line two", "error line", "x" * 5000, "last"])
+
+    def test_exec_nonzero_exit_code(self):
+        code, output = self.client.exec_run("panel", ["php", "artisan", "migrate"], env=["DB_PASSWORD=secret"])
+        self.assertEqual(code, 3)
+        self.assertEqual(output, "Migrating...\nSQLSTATE[HY000] failed")
+        create = EngineHandler.requests[0]
+        self.assertEqual(create[2]["Cmd"], ["php", "artisan", "migrate"])
+        self.assertEqual(create[2]["Env"], ["DB_PASSWORD=secret"])
+
+    def test_inspect_and_missing_container(self):
+        self.assertTrue(self.client.is_running("panel"))
+        self.assertEqual(self.client.container_started_at("panel"), "2024-01-01T00:00:00Z")
+        self.assertIsNone(self.client.inspect_container("missing"))
+        with self.assertRaises(proxy.DockerError) as raised:
+            self.client.exec_create("missing", ["true"])
+        self.assertEqual(raised.exception.status, 404)
+
+    def test_missing_socket(self):
+        client = proxy.DockerClient(os.path.join(self.tmp, "absent.sock"), timeout=1)
+        with self.assertRaises(OSError):
+            client.is_running("panel")
+        with self.assertRaises(OSError):
+            client.logs("panel")
+        with self.assertRaises(OSError):
+            client.exec_run("panel", ["true"])
+        self.assertIsNone(client._connection)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""Tests of apply_init_status against the migration history estimate."""
+
+import os
+import tempfile
+import unittest
+
+import support
+
+
+class ApplyInitStatusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.proxy = support.load_proxy()
+        self.proxy.migration_history = self.proxy.MigrationHistory(os.path.join(self.tmp.name, "history.json"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def watcher_status(self, progress, done, total=222, current="create_users_table"):
+        return {"progress": progress, "message": "Migrations...", "migrations_done": done,
+                "migrations_total": total, "current_migration": current, "completed_migrations": []}
+
+    def test_migrations_use_history_estimate(self):
+        history = self.proxy.migration_history
+        for i in range(10):
+            history.record(f"2016_01_01_00000{i}_m{i}", 1.0)
+        history._known = set(f"2016_01_01_00000{i}_m{i}" for i in range(40))
+        estimate = history.estimate(10)
+
+        self.proxy.apply_init_status(self.watcher_status(40, 10), 0)
+        state = self.proxy.state
+        self.assertEqual(state["migrations_total"], estimate.total)
+        self.assertEqual(state["estimated_remaining_seconds"], estimate.eta_seconds)
+        self.assertEqual(state["progress"], min(10 + int(estimate.fraction * 80), 90))
+        self.assertEqual(state["detail"], f"Table 10/{estimate.total}")
+        self.assertEqual(state["completed_migrations"], [f"table_{i + 1}" for i in range(10)])
+
+    def test_progress_never_goes_back(self):
+        self.proxy.apply_init_status(self.watcher_status(30, 1), 50)
+        self.assertEqual(self.proxy.state["progress"], 50)
+
+    def test_other_phases_keep_watcher_values(self):
+        self.proxy.apply_init_status(self.watcher_status(95, 222, current=""), 0)
+        state = self.proxy.state
+        self.assertEqual(state["progress"], 95)
+        self.assertEqual(state["migrations_total"], 222)
+        self.assertEqual(state["detail"], "Migrations...")
+
+
+if __name__ == "__main__":
+    unittest.main()
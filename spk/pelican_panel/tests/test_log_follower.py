@@ -0,0 +1,62 @@
+"""Tests of follow_container_logs and the migration history it feeds."""
+
+import os
+import tempfile
+import unittest
+
+import support
+
+REPLAYED = ["  2016_01_23_195641_add_allocations_table .......... 120ms DONE",
+            "  2016_01_23_195851_add_api_keys .......... 3.5s DONE"]
+LIVE = ["  2016_01_23_195851_add_api_keys .......... 3.5s DONE",  # Same second as the replay
+        "  2016_01_23_200044_add_api_permissions .......... 40ms DONE"]
+
+
+class FakeDocker:
+    """stream_logs() serving a replayed tail, then live lines."""
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.calls = []
+
+    def stream_logs(self, name, tail=0, since=None, follow=True, timeout=None):
+        self.calls.append({"tail": tail, "since": since, "follow": follow})
+        if not follow:
+            yield from REPLAYED
+            return
+        yield from LIVE
+        self.proxy.shutdown_flag = True
+
+
+class FollowContainerLogsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.proxy = support.load_proxy()
+        self.proxy.PANEL_CHECK_INTERVAL = 0
+        self.proxy.docker_client = FakeDocker(self.proxy)
+        self.history = self.proxy.MigrationHistory(os.path.join(self.tmp.name, "history.json"))
+        self.proxy.migration_history = self.history
+        self.proxy.log_tracker = self.proxy.LogProgressTracker(on_migration=self.history.record)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_replayed_tail_stays_out_of_history(self):
+        self.proxy.follow_container_logs()
+        calls = self.proxy.docker_client.calls
+        self.assertEqual(calls[0]["follow"], False)
+        self.assertEqual(calls[0]["tail"], self.proxy.LOG_FOLLOW_TAIL)
+        self.assertIsNotNone(calls[1]["since"])
+
+        # All three count for progress, only the live one is recorded
+        self.assertEqual(self.proxy.log_tracker.migrations()[0], 3)
+        self.assertEqual(list(self.history._done), ["2016_01_23_200044_add_api_permissions"])
+        self.history.save()
+        self.history._durations = None
+        self.history._load()
+        self.assertEqual(sorted(self.history._durations), ["2016_01_23_200044_add_api_permissions"])
+
+
+if __name__ == "__main__":
+    unittest.main()
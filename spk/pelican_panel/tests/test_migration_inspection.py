@@ -0,0 +1,112 @@
+"""Tests of the direct migration check (inspect_migrations) on SQLite fixtures."""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import support
+
+proxy = support.load_proxy()
+
+SHIPPED = [
+    "2016_01_23_195641_add_allocations_table",
+    "2016_01_23_195851_add_api_keys",
+    "2016_01_23_200044_add_api_permissions",
+    "2016_01_23_200159_add_downloads",
+]
+
+
+class FakeDocker:
+    """Records exec_run calls and answers them like artisan migrate:status."""
+
+    def __init__(self, returncode=0, output=""):
+        self.calls = []
+        self.returncode = returncode
+        self.output = output
+
+    def exec_run(self, name, cmd, timeout=30, env=None):
+        self.calls.append(cmd)
+        return self.returncode, self.output
+
+
+class InspectMigrationsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.tmp.name, "database.sqlite")
+        self.env = {"DB_CONNECTION": "sqlite", "DB_DATABASE": self.database}
+        self.docker = FakeDocker(0, "\n".join(f"{name} .... Ran" for name in SHIPPED * 3))
+        self.saved = proxy.docker_client, proxy.PANEL_SQLITE_PATH
+        proxy.docker_client = self.docker
+        proxy.PANEL_SQLITE_PATH = os.path.join(self.tmp.name, "absent.sqlite")
+
+    def tearDown(self):
+        proxy.docker_client, proxy.PANEL_SQLITE_PATH = self.saved
+        self.tmp.cleanup()
+
+    def create_database(self, ran=None):
+        conn = sqlite3.connect(self.database)
+        if ran is not None:
+            conn.execute("CREATE TABLE migrations (id INTEGER PRIMARY KEY, migration TEXT, batch INTEGER)")
+            conn.executemany("INSERT INTO migrations (migration, batch) VALUES (?, 1)", [(n,) for n in ran])
+        else:
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+        conn.commit()
+        conn.close()
+
+    def test_pending_migrations(self):
+        self.create_database(ran=SHIPPED[:2])
+        inventory = proxy.inspect_migrations(self.env, shipped=SHIPPED)
+        self.assertEqual(inventory.source, "sqlite")
+        self.assertEqual(len(inventory.ran), 2)
+        self.assertEqual(inventory.pending, SHIPPED[2:])
+        self.assertFalse(proxy.check_tables_exist(inventory))
+        self.assertEqual(self.docker.calls, [])
+
+    def test_all_migrations_ran(self):
+        self.create_database(ran=SHIPPED)
+        inventory = proxy.inspect_migrations(self.env, shipped=SHIPPED)
+        self.assertEqual(inventory.pending, [])
+        self.assertTrue(proxy.check_tables_exist(inventory))
+        self.assertEqual(self.docker.calls, [])
+
+    def test_ran_migrations_no_longer_shipped(self):
+        self.create_database(ran=SHIPPED + ["2015_01_01_000000_removed_later"])
+        inventory = proxy.inspect_migrations(self.env, shipped=SHIPPED)
+        self.assertEqual(len(inventory.ran), len(SHIPPED) + 1)
+        self.assertEqual(inventory.pending, [])
+
+    def test_missing_migrations_table(self):
+        # Fresh database: every shipped migration is pending, artisan is not needed
+        self.create_database(ran=None)
+        inventory = proxy.inspect_migrations(self.env, shipped=SHIPPED)
+        self.assertEqual(inventory.ran, [])
+        self.assertEqual(inventory.pending, SHIPPED)
+        self.assertFalse(proxy.check_tables_exist(inventory))
+        self.assertEqual(self.docker.calls, [])
+
+    def test_missing_database_falls_back_to_artisan(self):
+        self.assertIsNone(proxy.inspect_migrations(self.env, shipped=SHIPPED))
+        self.assertTrue(proxy.check_tables_exist(None))
+        self.assertEqual(len(self.docker.calls), 1)
+        self.assertIn("migrate:status", self.docker.calls[0])
+
+    def test_artisan_fallback_reports_missing_table(self):
+        self.docker.output = "SQLSTATE[HY000]: General error: 1 no such table: migrations"
+        self.docker.returncode = 1
+        self.assertFalse(proxy.check_tables_exist(None))
+
+    def test_database_is_opened_read_only(self):
+        self.create_database(ran=SHIPPED[:1])
+        os.chmod(self.database, 0o444)
+        self.assertEqual(proxy.sqlite_ran_migrations(self.database), SHIPPED[:1])
+        self.assertFalse(os.path.exists(self.database + "-journal"))
+
+    def test_unsupported_driver(self):
+        env = {"DB_CONNECTION": "pgsql", "DB_HOST": "db.example.com"}
+        self.assertIsNone(proxy.inspect_migrations(env, shipped=SHIPPED))
+
+
+if __name__ == "__main__":
+    unittest.main()
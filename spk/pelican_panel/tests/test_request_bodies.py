@@ -0,0 +1,127 @@
+"""Request body handling, checked on both serving engines."""
+
+import http.client
+import time
+import unittest
+
+import support
+
+
+class EchoHandler(support.UpstreamHandler):
+    """Fake Panel answering POSTs with the size of the body it received."""
+
+    def do_POST(self):
+        if 'chunked' in self.headers.get('Transfer-Encoding', ''):
+            size = 0
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return  # The proxy gave up on the body
+                chunk_size = int(line.split(b';')[0], 16)
+                self.rfile.read(chunk_size + 2)
+                if not chunk_size:
+                    break
+                size += chunk_size
+        else:
+            size = len(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+        body = str(size).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def chunked(data, size=500):
+    """`data` in Transfer-Encoding: chunked framing."""
+    out = b''
+    for start in range(0, len(data), size):
+        piece = data[start:start + size]
+        out += f"{len(piece):x}\r\n".encode() + piece + b"\r\n"
+    return out + b"0\r\n\r\n"
+
+
+def post_chunked(path, data):
+    return (f"POST {path} HTTP/1.1\r\nHost: x\r\nConnection: close\r\nTransfer-Encoding: chunked\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n").encode() + chunked(data)
+
+
+class RequestBodyTests:
+    """Mixed into one TestCase per engine."""
+
+    def setUp(self):
+        self.proxy = support.load_proxy()
+        self.proxy.MAX_REQUEST_BODY_SIZE = 2000
+        self.upstream = support.start_upstream(EchoHandler)
+        self.port = self.start_proxy(self.upstream.server_address[1])
+
+    def tearDown(self):
+        self.upstream.shutdown()
+        self.upstream.server_close()
+
+    def post(self, path, data, headers=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        try:
+            conn.request('POST', path, body=data, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, response.read()
+        finally:
+            conn.close()
+
+    def test_chunked_body_under_limit(self):
+        reply = support.raw_request(self.port, post_chunked("/upload", b"a" * 1500))
+        self.assertTrue(reply.startswith(b"HTTP/1.1 200"), reply[:100])
+        self.assertTrue(reply.endswith(b"1500"), reply[-100:])
+
+    def test_chunked_body_over_limit(self):
+        reply = support.raw_request(self.port, post_chunked("/upload", b"a" * 5000))
+        self.assertTrue(reply.startswith(b"HTTP/1.1 413"), reply[:100])
+        self.assertIn(b"Connection: close", reply)
+
+    def test_content_length_over_limit(self):
+        status, _ = self.post("/upload", b"a" * 5000)
+        self.assertEqual(status, 413)
+
+    def test_chunked_body_to_local_route(self):
+        # The chunk data must be consumed, not parsed as the next request
+        body = chunked(b'{"level": "debug"}', size=5)
+        first = (b"POST /api/log-level HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: chunked\r\n"
+                 b"Content-Type: application/json\r\n\r\n" + body)
+        second = b"GET /api/log-level HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n"
+        reply = support.raw_request(self.port, first + second)
+        self.assertEqual(reply.count(b"HTTP/1.1 200"), 2, reply)
+        self.assertNotIn(b"HTTP/1.1 400", reply)
+        self.assertTrue(reply.endswith(b'{"success": true, "level": "DEBUG"}'), reply[-200:])
+
+    def test_chunked_body_to_local_route_over_limit(self):
+        body = chunked(b'{"level": "' + b"d" * 5000 + b'"}')
+        reply = support.raw_request(self.port, b"POST /api/log-level HTTP/1.1\r\nHost: x\r\n"
+                                               b"Transfer-Encoding: chunked\r\n\r\n" + body)
+        self.assertTrue(reply.startswith(b"HTTP/1.1 413"), reply[:100])
+
+    def test_stalled_body(self):
+        # Content-Length promises more than the client sends
+        self.proxy.KEEPALIVE_IDLE_TIMEOUT = self.proxy.ProxyHandler.timeout = 0.5
+        for path in ("/upload", "/api/log-level"):
+            started = time.monotonic()
+            reply = support.raw_request(self.port, (f"POST {path} HTTP/1.1\r\nHost: x\r\n"
+                                                    "Content-Length: 100\r\n\r\n{\"level\"").encode())
+            self.assertTrue(reply.startswith(b"HTTP/1.1 408"), (path, reply[:100]))
+            self.assertLess(time.monotonic() - started, 4)
+
+
+
+class ThreadedRequestBodyTest(RequestBodyTests, unittest.TestCase):
+
+    def start_proxy(self, upstream_port):
+        return support.start_threaded_proxy(self.proxy, upstream_port)[1]
+
+
+class AsyncRequestBodyTest(RequestBodyTests, unittest.TestCase):
+
+    def start_proxy(self, upstream_port):
+        return support.start_async_proxy(self.proxy, upstream_port)[1]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""Malformed Panel replies, checked on both serving engines."""
+
+import json
+import socketserver
+import threading
+import unittest
+
+import support
+
+
+class GarbageHandler(socketserver.StreamRequestHandler):
+    """Fake Panel answering every request with an unparsable status line."""
+
+    reply = b"HTTP/1.1 abc Broken\r\nContent-Length: 0\r\n\r\n"
+
+    def handle(self):
+        while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+            pass
+        self.wfile.write(self.reply)
+
+
+class GarbageServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class UpstreamErrorTests:
+    """Mixed into one TestCase per engine."""
+
+    def setUp(self):
+        self.proxy = support.load_proxy()
+        self.upstream = GarbageServer(("127.0.0.1", support.free_port()), GarbageHandler)
+        threading.Thread(target=self.upstream.serve_forever, daemon=True).start()
+        self.rearms = []
+        self.proxy.monitor_schedule.rearm = self.rearms.append
+        self.port = self.start_proxy(self.upstream.server_address[1])
+
+    def tearDown(self):
+        self.upstream.shutdown()
+        self.upstream.server_close()
+
+    def test_malformed_status_line(self):
+        status, body = support.get(self.port, "/admin")
+        self.assertEqual(status, 502)
+        self.assertIn("Proxy error", json.loads(body)["error"])
+        self.assertEqual(self.rearms, ["proxy error"])
+
+
+class ThreadedUpstreamErrorTest(UpstreamErrorTests, unittest.TestCase):
+
+    def start_proxy(self, upstream_port):
+        return support.start_threaded_proxy(self.proxy, upstream_port)[1]
+
+
+class AsyncUpstreamErrorTest(UpstreamErrorTests, unittest.TestCase):
+
+    def start_proxy(self, upstream_port):
+        return support.start_async_proxy(self.proxy, upstream_port)[1]
+
+
+if __name__ == "__main__":
+    unittest.main()